@@ -1,8 +1,10 @@
 # back/app/catalog/entities.py
 import os, json, sqlite3, threading
 from typing import List, Dict, Any, Optional
-from rapidfuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
 from ..rag.schema import slugify
+from ..utils.executors import run_io
 
 CATALOG_DB_PATH = os.environ.get("CATALOG_DB_PATH", "/app/data/xlsx/_catalog/catalog.db")
 
@@ -121,40 +123,131 @@ def upsert_from_records(records: List[Dict[str, Any]], bot_id: str):
                 """, (row["bot_id"], row["carrera_id"], row["nombre"], row["carrera_slug"],
                       row["facultad"], row["nivel"], new_periodos, new_aliases))
         cx.commit()
+    # el índice en memoria del bot quedó viejo; no se rearma acá (una ingesta llama esto
+    # una vez por batch) sino al terminar la ingesta (warmup) o en el próximo _get_index
+    global _indexes_mtime
+    _indexes.pop(bot_id, None)
+    _indexes_mtime = _db_mtime()
 
 
-def search_candidates(bot_id: str, q: str, limit: int = 5) -> List[Dict[str, Any]]:
-    ensure_schema()
-    qn = (q or "").strip()
-    if not qn:
-        return []
-    qn_low = qn.lower()
-    with _lock, _conn() as cx:
-        cur = cx.execute("SELECT carrera_id, nombre, carrera_slug, facultad, nivel, aliases FROM carreras WHERE bot_id=?", (bot_id,))
-        items = []
-        for row in cur.fetchall():
+class _CatalogIndex:
+    """
+    Índice en memoria del catálogo de un bot: un array plano de choices (nombres y
+    aliases en minúscula) con el índice de la carrera dueña de cada uno, más un
+    índice invertido de trigramas para prefiltrar cuando el catálogo es grande.
+    """
+    PREFILTER_MIN = 2000  # por debajo, cdist sobre todo el array es más barato que prefiltrar
+    # Fracción de los trigramas de un choice que tiene que aparecer en la consulta para
+    # pasar el prefiltro. Con partial_ratio >= 82 (umbral de resolve_carrera) cada
+    # edición rompe a lo sumo 3 trigramas, así que un tercio no deja afuera matches útiles
+    # y descarta los choices que sólo comparten trigramas sueltos (" de", "ia ", ...).
+    PREFILTER_SHARE = 1 / 3
+
+    def __init__(self, rows):
+        self.items: List[Dict[str, Any]] = []
+        self.choices: List[str] = []
+        owners: List[int] = []
+        for row in rows:
             nombre = row["nombre"] or ""
-            aliases = []
             try:
                 aliases = json.loads(row["aliases"] or "[]")
             except Exception:
                 aliases = [nombre]
-
-            # mejor score entre nombre y aliases
-            best = max([fuzz.partial_ratio(qn_low, (nombre or "").lower())] +
-                       [fuzz.partial_ratio(qn_low, (a or "").lower()) for a in aliases])
-
-            items.append({
+            idx = len(self.items)
+            self.items.append({
                 "carrera_id": row["carrera_id"],
                 "nombre": nombre,
                 "carrera_slug": row["carrera_slug"],
                 "facultad": row["facultad"],
                 "nivel": row["nivel"],
-                "score": int(best),
             })
+            for c in dict.fromkeys([nombre.lower()] + [(a or "").lower() for a in aliases]):
+                self.choices.append(c)
+                owners.append(idx)
+        self.owners = np.asarray(owners, dtype=np.int64)
+        self.grams: Dict[str, np.ndarray] = {}
+        self.min_hits: Optional[np.ndarray] = None
+        if len(self.choices) >= self.PREFILTER_MIN:
+            postings: Dict[str, List[int]] = {}
+            sizes = []
+            for j, c in enumerate(self.choices):
+                grams = _trigrams(c)
+                sizes.append(len(grams))
+                for g in grams:
+                    postings.setdefault(g, []).append(j)
+            self.grams = {g: np.asarray(js, dtype=np.int64) for g, js in postings.items()}
+            self.min_hits = np.maximum(1, np.ceil(np.asarray(sizes) * self.PREFILTER_SHARE)).astype(np.int64)
+
+    def _candidates(self, qn_low: str) -> Optional[np.ndarray]:
+        if self.min_hits is None:
+            return None
+        lists = [self.grams[g] for g in _trigrams(qn_low) if g in self.grams]
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        # trigramas de la consulta que comparte cada choice
+        hits = np.bincount(np.concatenate(lists), minlength=len(self.choices))
+        return np.flatnonzero(hits >= self.min_hits)
 
-        items.sort(key=lambda x: x["score"], reverse=True)
-        return items[:limit]
+    def search(self, qn_low: str, limit: int) -> List[Dict[str, Any]]:
+        if not self.items:
+            return []
+        sel = self._candidates(qn_low)
+        choices = self.choices if sel is None else [self.choices[j] for j in sel]
+        owners = self.owners if sel is None else self.owners[sel]
+        best = np.zeros(len(self.items), dtype=np.float64)
+        if choices:
+            scores = process.cdist([qn_low], choices, scorer=fuzz.partial_ratio, dtype=np.float64)[0]
+            # mejor score entre nombre y aliases de cada carrera
+            np.maximum.at(best, owners, scores)
+        order = np.argsort(-best, kind="stable")[:limit]
+        return [{**self.items[i], "score": int(best[i])} for i in order]
+
+def _trigrams(s: str):
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+_indexes: Dict[str, _CatalogIndex] = {}
+_indexes_mtime: Optional[float] = None
+
+def _db_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(CATALOG_DB_PATH)
+    except OSError:
+        return None
+
+def _load_index(bot_id: str) -> _CatalogIndex:
+    ensure_schema()
+    with _lock, _conn() as cx:
+        rows = cx.execute(
+            "SELECT carrera_id, nombre, carrera_slug, facultad, nivel, aliases FROM carreras WHERE bot_id=? ORDER BY id",
+            (bot_id,),
+        ).fetchall()
+    idx = _CatalogIndex(rows)
+    _indexes[bot_id] = idx
+    return idx
+
+def _get_index(bot_id: str) -> _CatalogIndex:
+    global _indexes_mtime
+    # Si otro proceso (u otra réplica) re-ingestó, el archivo cambió: descartamos los índices
+    mtime = _db_mtime()
+    if mtime != _indexes_mtime:
+        _indexes.clear()
+        _indexes_mtime = mtime
+    idx = _indexes.get(bot_id)
+    return idx if idx is not None else _load_index(bot_id)
+
+def warmup(bot_ids: List[str]):
+    """Precarga los índices en memoria de los bots indicados."""
+    global _indexes_mtime
+    _indexes_mtime = _db_mtime()
+    for bot_id in bot_ids:
+        _load_index(bot_id)
+
+def search_candidates(bot_id: str, q: str, limit: int = 5) -> List[Dict[str, Any]]:
+    qn = (q or "").strip()
+    if not qn:
+        return []
+    return _get_index(bot_id).search(qn.lower(), limit)
 
 def resolve_carrera(bot_id: str, q: str, threshold: int = 82) -> Optional[Dict[str, Any]]:
     cands = search_candidates(bot_id, q, limit=5)
@@ -162,3 +255,7 @@ def resolve_carrera(bot_id: str, q: str, threshold: int = 82) -> Optional[Dict[s
         return None
     best = cands[0]
     return best if best["score"] >= threshold else None
+
+
+async def resolve_carrera_async(bot_id: str, q: str, threshold: int = 82) -> Optional[Dict[str, Any]]:
+    return await run_io(resolve_carrera, bot_id, q, threshold)
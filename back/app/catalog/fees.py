@@ -0,0 +1,186 @@
+# back/app/catalog/fees.py
+import json, re, unicodedata
+from typing import Any, Dict, List, Optional, Set
+from ..rag.schema import slugify
+from ..utils.executors import run_io
+from .entities import _conn, _lock
+
+# Tabla de aranceles (bot_id, carrera, periodo) -> numbers, armada en la ingesta a partir
+# de los chunks de dominio "aranceles". Permite contestar "¿cuánto sale X?" sin pasar por
+# embeddings, búsqueda, rerank ni LLM (ver routes/chat.py).
+
+# Sólo preguntas de precio explícitas salen por la tabla; el resto ("¿cuándo cierran las
+# inscripciones?", "formas de pago") sigue por RAG. Sin tildes, al comienzo de palabra.
+PRICE_KWS = ["cuanto sale", "cuanto cuesta", "cuanto vale", "cuanto se paga", "cuanto hay que pagar", "cuanto pago",
+             "precio", "arancel", "costo", "coste", "cuota", "mensualidad", "importe"]
+# matrícula / inscripción cuentan sólo junto a una forma de preguntar el monto
+FEE_CONCEPT_KWS = ["matric", "inscrip"]
+AMOUNT_KWS = ["cuanto", "valor", "monto", "pagar", "sale", "cuesta"]
+
+def _kw_re(kws: List[str]) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(k) for k in kws) + ")")
+
+_PRICE_RE, _CONCEPT_RE, _AMOUNT_RE = _kw_re(PRICE_KWS), _kw_re(FEE_CONCEPT_KWS), _kw_re(AMOUNT_KWS)
+
+_LABELS = [
+    ("matricula_general", "Matrícula"),
+    ("matricula_ingresante", "Matrícula ingresantes"),
+    ("arancel_mensual", "Cuota mensual"),
+    ("arancel_total", "Arancel total"),
+    ("arancel_total_estimado", "Arancel total estimado"),
+]
+
+_schema_ready = False
+
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _lock, _conn() as cx:
+        cx.executescript("""
+        CREATE TABLE IF NOT EXISTS aranceles (
+          bot_id       TEXT NOT NULL,
+          chunk_id     TEXT NOT NULL,
+          carrera_id   TEXT NOT NULL DEFAULT '',
+          carrera_slug TEXT NOT NULL,
+          periodo      TEXT NOT NULL DEFAULT '',
+          numbers      TEXT NOT NULL,          -- JSON
+          source       TEXT NOT NULL,          -- JSON: titulo, modalidad, fuente_*, texto
+          PRIMARY KEY (bot_id, chunk_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_aranceles_id ON aranceles (bot_id, carrera_id, periodo);
+        CREATE INDEX IF NOT EXISTS idx_aranceles_slug ON aranceles (bot_id, carrera_slug, periodo);
+        """)
+        cx.commit()
+    _schema_ready = True
+
+def upsert_from_records(records: List[Dict[str, Any]], bot_id: str):
+    ensure_schema()
+    rows = []
+    for r in records:
+        md = r.get("metadata", {})
+        if md.get("domain") != "aranceles" or not md.get("numbers") or not md.get("chunk_id"):
+            continue
+        nombre = (md.get("carrera") or md.get("titulo") or "").strip()
+        if not nombre:
+            continue
+        source = {k: md.get(k) for k in ("titulo", "carrera", "modalidad", "fuente_archivo", "fuente_hoja", "fuente_fila")}
+        source["texto"] = r.get("texto", "")
+        rows.append((bot_id, md["chunk_id"], (md.get("carrera_id") or "").strip(), slugify(nombre),
+                     str(md.get("periodo") or ""), json.dumps(md["numbers"]), json.dumps(source, ensure_ascii=False)))
+    if not rows:
+        return
+    with _lock, _conn() as cx:
+        cx.executemany("""
+            INSERT OR REPLACE INTO aranceles (bot_id, chunk_id, carrera_id, carrera_slug, periodo, numbers, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        cx.commit()
+
+def delete_chunks(bot_id: str, chunk_ids: List[str], batch: int = 500):
+    ensure_schema()
+    with _lock, _conn() as cx:
+        for j in range(0, len(chunk_ids), batch):
+            part = chunk_ids[j:j + batch]
+            cx.execute(f"DELETE FROM aranceles WHERE bot_id=? AND chunk_id IN ({','.join('?' * len(part))})",
+                       (bot_id, *part))
+        cx.commit()
+
+def chunk_ids(bot_id: str) -> Set[str]:
+    ensure_schema()
+    with _conn() as cx:
+        return {r[0] for r in cx.execute("SELECT chunk_id FROM aranceles WHERE bot_id=?", (bot_id,))}
+
+def reset(bot_id: Optional[str] = None):
+    ensure_schema()
+    with _lock, _conn() as cx:
+        if bot_id:
+            cx.execute("DELETE FROM aranceles WHERE bot_id=?", (bot_id,))
+        else:
+            cx.execute("DELETE FROM aranceles")
+        cx.commit()
+
+def is_fee_question(text: str) -> bool:
+    t = unicodedata.normalize("NFKD", (text or "").lower()).encode("ascii", "ignore").decode()
+    return bool(_PRICE_RE.search(t) or (_CONCEPT_RE.search(t) and _AMOUNT_RE.search(t)))
+
+def _query(cx, bot_id: str, by: str, key: str, periodo: str | None, limit: int):
+    if periodo:
+        return cx.execute(f"SELECT * FROM aranceles WHERE bot_id=? AND {by}=? AND periodo=? LIMIT ?",
+                          (bot_id, key, str(periodo), limit)).fetchall()
+    # período más reciente por año (no MAX(periodo): como texto "general" > "2026");
+    # "general" o vacío sólo si la carrera no tiene ningún período con año
+    return cx.execute(f"""
+        SELECT * FROM aranceles WHERE bot_id=? AND {by}=? AND periodo = (
+          SELECT periodo FROM aranceles WHERE bot_id=? AND {by}=?
+          ORDER BY periodo GLOB '[0-9]*' DESC, CAST(periodo AS INTEGER) DESC, periodo DESC
+          LIMIT 1
+        ) LIMIT ?""", (bot_id, key, bot_id, key, limit)).fetchall()
+
+def lookup(bot_id: str, *, carrera_id: str | None, carrera: str | None, periodo: str | None, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Filas de aranceles de la carrera: por carrera_id y, si la planilla de aranceles no lo
+    trae, por slug del nombre. Con `periodo` sólo ese período; sin período, el año más
+    reciente que haya (las filas sin año, p.ej. "general", sólo si no hay ninguna con año).
+    """
+    keys = []
+    if carrera_id:
+        keys.append(("carrera_id", str(carrera_id)))
+    if carrera:
+        keys.append(("carrera_slug", slugify(carrera)))
+    if not keys:
+        return []
+    ensure_schema()
+    rows = []
+    with _conn() as cx:
+        for by, key in keys:
+            rows = _query(cx, bot_id, by, key, periodo, limit)
+            if rows:
+                break
+    return [{
+        "chunk_id": r["chunk_id"],
+        "carrera_id": r["carrera_id"],
+        "periodo": r["periodo"],
+        "numbers": json.loads(r["numbers"]),
+        **json.loads(r["source"]),
+    } for r in rows]
+
+async def lookup_async(bot_id: str, **kwargs) -> List[Dict[str, Any]]:
+    return await run_io(lookup, bot_id, **kwargs)
+
+def _money(v: float) -> str:
+    # formato local: $ 1.234.567 / $ 1.234,50
+    s = f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return "$ " + (s[:-3] if s.endswith(",00") else s)
+
+def format_answer(rows: List[Dict[str, Any]]) -> str:
+    """Respuesta armada con plantilla, sin LLM."""
+    first = rows[0]
+    nombre = first.get("carrera") or first.get("titulo") or "la carrera"
+    head = f"Aranceles de {nombre}" + (f" (período {first['periodo']})" if first.get("periodo") else "") + ":"
+    lines = [head]
+    for i, r in enumerate(rows, start=1):
+        nums = r["numbers"]
+        if len(rows) > 1:
+            lines.append(f"{r.get('titulo') or nombre}" + (f" – {r['modalidad']}" if r.get("modalidad") else "") + ":")
+        for key, label in _LABELS:
+            if nums.get(key) is not None:
+                lines.append(f"- {label}: {_money(nums[key])} [{i}]")
+        if nums.get("cant_cuotas_plan_pagos"):
+            lines.append(f"- Plan de pagos: {nums['cant_cuotas_plan_pagos']} cuotas [{i}]")
+        elif nums.get("tiene_plan_pagos"):
+            lines.append(f"- Tiene plan de pagos [{i}]")
+    return "\n".join(lines)
+
+def as_docs(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Las filas con la forma de los docs de retrieve/rerank (para fuentes, prompt y debug)."""
+    return [{
+        "texto": r.get("texto", ""),
+        "metadata": {
+            "chunk_id": r["chunk_id"], "domain": "aranceles", "tipo": "aranceles",
+            "titulo": r.get("titulo"), "periodo": r.get("periodo") or None,
+            "fuente_archivo": r.get("fuente_archivo"), "fuente_hoja": r.get("fuente_hoja"),
+            "fuente_fila": r.get("fuente_fila"),
+        },
+        "score": 1.0,
+    } for r in rows]
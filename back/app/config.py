@@ -12,13 +12,75 @@ class Settings(BaseSettings):
     GEMINI_EMBED_MODEL: str = "text-embedding-004"
     GEMINI_TIMEOUT: int = 30
 
+    EMBED_DIM: int = 0  # 0 = se detecta con una llamada al modelo (una vez por proceso)
+    EMBED_BATCH_SIZE: int = 100
+    EMBED_CONCURRENCY: int = 4
+    EMBED_MAX_RETRIES: int = 5
+    EMBED_BACKOFF_BASE: float = 1.0
+    EMBED_RPM: int = 0  # 0 = sin límite de requests/minuto
+
+    QUERY_CACHE_MAX_ENTRIES: int = 2048
+    QUERY_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    QUERY_CACHE_PERSIST: bool = True
+
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    ANSWER_CACHE_TTL: int = 3600
+
     QDRANT_URL: str = "http://qdrant:6333"
     QDRANT_COLLECTION: str = "admisiones"
     QDRANT_TIMEOUT: int = 5
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_POOL_SIZE: int = 100
+    QDRANT_KEEPALIVE: int = 20
+    QDRANT_ON_DISK: bool = False         # vectores y payload en disco (se aplica al crear la colección)
+    QDRANT_QUANTIZATION: str = "none"    # none | int8 (scalar, en RAM; se aplica al crear la colección)
+    QDRANT_SLIM_PAYLOAD: bool = True     # no guardar `extras` en el payload de los puntos
 
+    RETRIEVAL_BACKEND: str = "qdrant"  # qdrant | local (índice en proceso desde un snapshot; bots chicos)
+    LOCAL_INDEX_DIR: str = "/app/state/local_index"
     RAG_TOP_K: int = 30
+    RAG_HYBRID: bool = True        # fusionar la búsqueda densa con el índice léxico (BM25)
+    RAG_RRF_K: int = 60            # constante de reciprocal rank fusion
+    FEE_FASTPATH: bool = True      # preguntas de montos con carrera conocida: tabla de aranceles, sin RAG
+    FEE_FASTPATH_LLM: bool = False # redactar esa respuesta con una generación corta en vez de plantilla
     RAG_RERANK_K: int = 5
     ENABLE_RERANKER: bool = True
+    RERANK_MODEL: str = "BAAI/bge-reranker-base"
+    RERANK_BACKEND: str = "torch"  # torch | torch-int8 | onnx | onnx-int8
+    RERANK_ONNX_DIR: str = "/app/models/onnx"
+    RERANK_MAX_LENGTH: int = 384       # tokens de (query + doc) que ve el cross-encoder
+    RERANK_MAX_DOC_CHARS: int = 2000   # recorte previo barato, antes de tokenizar
+    RERANK_CACHE_MAX_ENTRIES: int = 50000
+
+    RERANK_BATCH_WINDOW_MS: float = 5.0
+    RERANK_MAX_BATCH_PAIRS: int = 128
+    RERANK_PREDICT_BATCH_SIZE: int = 32
+    RERANK_TORCH_THREADS: int = 0  # 0 = default de torch
+
+    IO_WORKERS: int = 64
+    INGEST_WORKERS: int = 0         # procesos para leer/chunkear archivos; 0 = os.cpu_count()
+    EXCEL_ENGINE: str = "auto"      # auto | calamine | openpyxl (auto: calamine si está instalado)
+    INGEST_BATCH_ROWS: int = 0      # filas por batch del pipeline de ingesta; 0 = EMBED_BATCH_SIZE * EMBED_CONCURRENCY
+    INGEST_QUEUE_DEPTH: int = 2     # batches en espera entre etapas (parse -> embed -> upsert)
+    INGEST_JOB_WORKERS: int = 2     # ingestas en segundo plano a la vez (una por bot como máximo)
+    INGEST_JOB_HISTORY: int = 50    # jobs terminados que se recuerdan para GET /ingest/jobs
+    WARMUP_ENABLED: bool = True
+    WARMUP_RETRY_BASE_S: float = 1.0   # backoff de los pasos del warm-up que fallan (x2 por intento)
+    WARMUP_RETRY_MAX_S: float = 60.0
+    WARMUP_MAX_ATTEMPTS: int = 0       # 0 = reintentar hasta que salga
+
+    SESSION_BACKEND: str = "sqlite"          # sqlite | redis (varios workers / nodos)
+    SESSION_REDIS_URL: str = "redis://redis:6379/0"
+    SESSION_REDIS_PREFIX: str = "chat:session:"
+    SESSION_REDIS_TIMEOUT: float = 2.0
+    SESSION_CACHE_MAX_ENTRIES: int = 10000   # sesiones calientes en memoria (sqlite)
+    SESSION_WRITE_BEHIND: bool = True        # save en memoria y flush a SQLite en batches (sqlite)
+    SESSION_FLUSH_INTERVAL_MS: int = 200
+    SESSION_FLUSH_MAX_BATCH: int = 500       # flush anticipado si se juntan tantas pendientes
+    SESSION_TTL_SECONDS: int = 30 * 86400    # sesiones sin actividad se borran; 0 = nunca
+    SESSION_PURGE_INTERVAL: int = 3600       # (sqlite; en redis el TTL va en cada clave)
 
     class Config:
         env_file = ".env"
@@ -1,9 +1,50 @@
+import httpx
 from fastapi import Depends, Header, HTTPException, status
 from .config import settings
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+# Clientes de vida de la aplicación: se crean en el startup (init_qdrant) y se
+# cierran en el shutdown, así el hot path reutiliza conexiones ya abiertas.
+_client: QdrantClient | None = None
+_aclient: AsyncQdrantClient | None = None
+
+def _client_kwargs() -> dict:
+    return dict(
+        url=settings.QDRANT_URL,
+        timeout=settings.QDRANT_TIMEOUT,
+        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        limits=httpx.Limits(
+            max_connections=settings.QDRANT_POOL_SIZE,
+            max_keepalive_connections=settings.QDRANT_KEEPALIVE,
+        ),
+    )
+
+def init_qdrant():
+    global _client, _aclient
+    if _client is None:
+        _client = QdrantClient(**_client_kwargs())
+    if _aclient is None:
+        _aclient = AsyncQdrantClient(**_client_kwargs())
+
+async def close_qdrant():
+    global _client, _aclient
+    if _aclient is not None:
+        await _aclient.close()
+        _aclient = None
+    if _client is not None:
+        _client.close()
+        _client = None
 
 def get_qdrant() -> QdrantClient:
-    return QdrantClient(url=settings.QDRANT_URL, timeout=settings.QDRANT_TIMEOUT)
+    if _client is None:
+        init_qdrant()
+    return _client
+
+def get_async_qdrant() -> AsyncQdrantClient:
+    if _aclient is None:
+        init_qdrant()
+    return _aclient
 
 def admin_key(x_api_key: str = Header(default="")):
     if x_api_key != settings.ADMIN_API_KEY:
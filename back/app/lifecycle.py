@@ -0,0 +1,97 @@
+import asyncio, time
+from .config import settings
+from .utils.executors import run_io
+from .utils.logging import logger
+
+# Estado del warm-up de arranque, expuesto en /health/ready.
+state = {"ready": False, "started_at": None, "finished_at": None, "steps": {}, "errors": {}, "attempts": {},
+         "failed": []}
+
+def _warm_reranker():
+    from .rag.reranker import warmup
+    warmup()
+
+def _warm_embedding_dim():
+    from .rag.embedder import get_embedding_dim
+    get_embedding_dim()
+
+def _warm_catalog():
+    from .bots.profiles import load_profiles
+    from .catalog.entities import warmup
+    warmup(list((load_profiles().get("bots") or {}).keys()))
+
+def _warm_payload_indexes():
+    # colecciones creadas antes de que existieran los índices de payload; con el índice
+    # local las búsquedas no van a Qdrant
+    if settings.RETRIEVAL_BACKEND == "local":
+        return
+    from .deps import get_qdrant
+    from .rag.retriever import ensure_payload_indexes
+    client = get_qdrant()
+    if settings.QDRANT_COLLECTION in [c.name for c in client.get_collections().collections]:
+        ensure_payload_indexes(client, settings.QDRANT_COLLECTION)
+
+def _warm_local_index():
+    if settings.RETRIEVAL_BACKEND != "local":
+        return
+    from .rag import local_index
+    try:
+        local_index.get_index(settings.QDRANT_COLLECTION)
+    except FileNotFoundError:
+        logger.warning("RETRIEVAL_BACKEND=local pero todavía no hay snapshot (se escribe al ingestar)")
+
+# (nombre, función, crítico). Sólo los críticos frenan /health/ready; el resto, si no
+# llega a precargarse, se carga de forma lazy en el primer request que lo use.
+STEPS = [
+    ("reranker", _warm_reranker, True),
+    ("embedding_dim", _warm_embedding_dim, False),
+    ("catalog", _warm_catalog, False),
+    ("payload_indexes", _warm_payload_indexes, True),
+    ("local_index", _warm_local_index, False),
+]
+
+def _update_ready():
+    state["ready"] = all(name in state["steps"] for name, _, critical in STEPS if critical)
+
+async def _step(name: str, fn, critical: bool):
+    # reintenta con backoff exponencial (p.ej. Qdrant todavía no levantó) hasta que
+    # salga o se agoten WARMUP_MAX_ATTEMPTS (0 = sin límite)
+    delay = settings.WARMUP_RETRY_BASE_S
+    attempt = 0
+    while True:
+        attempt += 1
+        state["attempts"][name] = attempt
+        t0 = time.perf_counter()
+        try:
+            await run_io(fn)
+        except Exception as e:
+            state["errors"][name] = f"{e.__class__.__name__}: {e}"
+            if settings.WARMUP_MAX_ATTEMPTS and attempt >= settings.WARMUP_MAX_ATTEMPTS:
+                logger.warning(f"warm-up {name} falló {attempt} veces, no se reintenta: {e}")
+                if critical:
+                    state["failed"].append(name)
+                return
+            logger.warning(f"warm-up {name} falló (intento {attempt}), reintento en {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.WARMUP_RETRY_MAX_S)
+            continue
+        state["steps"][name] = round((time.perf_counter() - t0) * 1000, 1)
+        state["errors"].pop(name, None)
+        _update_ready()
+        return
+
+async def warmup():
+    """
+    Precarga lo que de otro modo paga el primer usuario: modelo del reranker (+ una
+    inferencia), dimensión de embeddings, índices del catálogo, índices de payload en
+    Qdrant y, con RETRIEVAL_BACKEND=local, el índice vectorial en proceso. Los pasos
+    corren en paralelo y los que fallan se reintentan en segundo plano; el servicio
+    queda "ready" apenas terminan bien los pasos críticos.
+    """
+    state["started_at"] = time.time()
+    if settings.WARMUP_ENABLED:
+        await asyncio.gather(*[_step(name, fn, critical) for name, fn, critical in STEPS])
+    else:
+        state["ready"] = True
+    state["finished_at"] = time.time()
+    logger.info(f"warm-up terminado: steps={state['steps']} errors={state['errors']}")
@@ -1,10 +1,31 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 from .config import settings
+from .deps import init_qdrant, close_qdrant
+from .lifecycle import warmup
+from .rag import jobs as ingest_jobs
+from .session import store as session_store
 from .routes import health, chat, ingest
 
-app = FastAPI(title="Admisiones UCC – Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_qdrant()
+    session_store.init()
+    # el warm-up corre en segundo plano: /health/ responde enseguida y
+    # /health/ready recién da 200 cuando termina
+    task = asyncio.create_task(warmup())
+    try:
+        yield
+    finally:
+        task.cancel()
+        ingest_jobs.shutdown()
+        session_store.close()
+        await close_qdrant()
+
+app = FastAPI(title="Admisiones UCC – Backend", version="0.1.0", lifespan=lifespan)
 
 # CORS
 origins = [o.strip() for o in settings.ALLOWED_ORIGINS.split(",") if o.strip()]
@@ -0,0 +1,34 @@
+from typing import AsyncIterator, Callable
+import google.generativeai as genai
+from ..config import settings
+from ..rag.embedder import init_gemini
+
+# Backend de streaming: (prompt, system_instruction) -> iterador async de fragmentos de texto.
+StreamBackend = Callable[[str, str | None], AsyncIterator[str]]
+
+async def _gemini_stream(prompt: str, system_instruction: str | None = None) -> AsyncIterator[str]:
+    init_gemini()
+    model = genai.GenerativeModel(settings.GEMINI_MODEL, system_instruction=system_instruction)
+    resp = await model.generate_content_async(
+        prompt,
+        stream=True,
+        request_options={"timeout": settings.GEMINI_TIMEOUT},
+    )
+    async for chunk in resp:
+        try:
+            text = chunk.text
+        except ValueError:
+            # chunk sin partes de texto (p.ej. bloqueado por safety)
+            continue
+        if text:
+            yield text
+
+_backend: StreamBackend = _gemini_stream
+
+def set_stream_backend(backend: StreamBackend | None):
+    """Reemplaza el generador de streaming (p.ej. uno fake para pruebas). None vuelve a Gemini."""
+    global _backend
+    _backend = backend or _gemini_stream
+
+def stream_answer(prompt: str, system_instruction: str | None = None) -> AsyncIterator[str]:
+    return _backend(prompt, system_instruction)
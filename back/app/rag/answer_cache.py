@@ -0,0 +1,50 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .schema import slugify
+from ..config import settings
+from ..utils.lru import LRUCache
+from ..utils.metrics import ANSWER_CACHE_HITS, ANSWER_CACHE_MISSES, ANSWER_CACHE_SAVED_SECONDS
+
+# Caché de respuestas generadas. La clave combina:
+#   (bot_id, generación del bot, pregunta normalizada, chunk_ids rerankeados en orden, slots de contexto)
+# Si cambia el contexto recuperado o los slots, cambia la clave; al re-ingestar un bot
+# se incrementa su "generación" y todas sus entradas quedan inalcanzables (expiran por LRU/TTL).
+
+_cache = LRUCache(settings.ANSWER_CACHE_MAX_ENTRIES, ttl=settings.ANSWER_CACHE_TTL)
+_generations: Dict[str, int] = {}
+_gen_lock = threading.Lock()
+
+def _chunk_ids(docs: List[Dict[str, Any]]) -> Tuple[str, ...]:
+    ids = []
+    for d in docs:
+        m = d.get("metadata") or {}
+        ids.append(str(m.get("chunk_id") or m.get("point_uuid") or ""))
+    return tuple(ids)
+
+def make_key(bot_id: str, query: str, docs: List[Dict[str, Any]], slots: Dict[str, Any] | None = None) -> tuple:
+    slots_t = tuple(sorted((k, str(v)) for k, v in (slots or {}).items() if v))
+    return (bot_id, _generations.get(bot_id, 0), slugify(query), _chunk_ids(docs), slots_t)
+
+def get(key: tuple) -> Optional[str]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    hit = _cache.get(key)
+    if hit is None:
+        ANSWER_CACHE_MISSES.inc()
+        return None
+    answer, gen_seconds = hit
+    ANSWER_CACHE_HITS.inc()
+    ANSWER_CACHE_SAVED_SECONDS.inc(gen_seconds)
+    return answer
+
+def put(key: tuple, answer: str, gen_seconds: float):
+    if settings.ANSWER_CACHE_ENABLED and answer:
+        _cache.put(key, (answer, gen_seconds))
+
+def invalidate_bot(bot_id: str):
+    """Llamar después de re-ingestar: descarta (lógicamente) todas las respuestas del bot."""
+    with _gen_lock:
+        _generations[bot_id] = _generations.get(bot_id, 0) + 1
+
+def invalidate_all():
+    _cache.clear()
@@ -1,10 +1,18 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import multiprocessing as mp
+import numpy as np
 import pandas as pd
 import os, re, glob, unicodedata, json
 from datetime import datetime
+from ..config import settings
+from ..utils.logging import logger
 from .schema import (
     SCHEMA_VERSION, slugify, hash_str, make_doc_id, make_chunk_id,
-    parse_money_to_float, now_iso_utc
+    parse_money_to_float, now_iso_utc, _money_re, _thousands_re
 )
 
 # Heurísticas por nombre de archivo/hoja
@@ -90,6 +98,25 @@ def list_data_files(xlsx_dir: str) -> List[str]:
         files.extend(glob.glob(os.path.join(xlsx_dir, p)))
     return sorted(set(os.path.basename(f) for f in files))
 
+@lru_cache(maxsize=1)
+def excel_engine() -> Optional[str]:
+    """
+    Engine de pandas para Excel según EXCEL_ENGINE. None = el default de pandas (openpyxl).
+    calamine (python-calamine, pandas >= 2.2) parsea bastante más rápido; ojo que al
+    cambiar de engine algunos valores pueden leerse distinto (p.ej. fechas), lo que
+    cambia el row_hash y hace que la próxima ingesta incremental re-suba esas filas.
+    """
+    pref = (settings.EXCEL_ENGINE or "auto").lower()
+    if pref not in ("auto", "calamine"):
+        return None
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        if pref == "calamine":
+            logger.warning("EXCEL_ENGINE=calamine pero python-calamine no está instalado; uso openpyxl")
+        return None
+
 def _read_any(path: str) -> Dict[str, pd.DataFrame]:
     low = path.lower()
     if low.endswith((".csv", ".txt")):
@@ -107,8 +134,8 @@ def _read_any(path: str) -> Dict[str, pd.DataFrame]:
         return {"CSV": pd.read_csv(path, encoding="utf-8", sep=",", on_bad_lines="skip")}
     if low.endswith((".tsv",)):
         return {"TSV": pd.read_csv(path, sep="\t")}
-    xls = pd.ExcelFile(path)
-    return {sheet: xls.parse(sheet_name=sheet) for sheet in xls.sheet_names}
+    with pd.ExcelFile(path, engine=excel_engine()) as xls:
+        return {sheet: xls.parse(sheet_name=sheet) for sheet in xls.sheet_names}
 
 def _load_schema_map(xlsx_dir: str) -> Dict[str, Any]:
     cfg = {"aliases": {}, "defaults": {}}
@@ -137,12 +164,6 @@ def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = [slugify(c) for c in df.columns]
     return df
 
-def _first_nonempty(row: pd.Series, cols: List[str]) -> Optional[str]:
-    for c in cols:
-        if c in row and str(row[c]).strip():
-            return str(row[c]).strip()
-    return None
-
 def _guess_periodo_from_text(text: str) -> Optional[str]:
     m = re.search(r"(19|20)\d{2}", text)
     return m.group(0) if m else None
@@ -156,194 +177,373 @@ def row_to_text(row: pd.Series) -> str:
         parts.append(f"{col.upper()}: {sval}")
     return " | ".join(parts)
 
-def load_xlsx_dir(xlsx_dir: str, *, bot_id: str = "public-admisiones") -> List[Dict[str, Any]]:
+# ---------- helpers columnares ----------
+_PERIODO_RE = r"((?:19|20)\d{2})"
+_MONEY_EXTRACT_RE = f"({_money_re.pattern})"
+_TRUE_FLAGS = ("s","si","sí","true","1","y","yes")
+
+def _str_columns(df: pd.DataFrame) -> Tuple[Dict[str, pd.Series], Dict[str, pd.Series]]:
+    """
+    str(valor).strip() por columna, como object (sin la semántica de NaN de los
+    dtypes de string). Partimos de df.values (el mismo array que usa iterrows) para
+    respetar el tipo común de la fila, p.ej. cuando todas las columnas son numéricas.
+    Devuelve dos vistas: la cruda (NaT -> "NaT", como str(row[c])) y la que trata
+    los nulos como "" (como row_to_text); sólo difieren en columnas con nulos.
+    """
+    values = df.values
+    raw: Dict[str, pd.Series] = {}
+    clean: Dict[str, pd.Series] = {}
+    for j, c in enumerate(df.columns):
+        if c in raw:
+            continue
+        col = values[:, j]
+        raw[c] = pd.Series([str(v).strip() for v in col], index=df.index, dtype=object)
+        na = pd.isna(col)
+        clean[c] = raw[c].where(~na, "") if na.any() else raw[c]
+    return raw, clean
+
+def _nonempty(s: pd.Series) -> pd.Series:
+    return s.where(s != "")
+
+def _coalesce(series: List[pd.Series], index) -> pd.Series:
+    """Primer valor no nulo entre `series`, en orden (None si ninguno)."""
+    out = pd.Series(None, index=index, dtype=object)
+    for s in series:
+        out = out.where(out.notna(), s)
+    return out
+
+def _first_nonempty_col(S: Dict[str, pd.Series], cols: List[str], index) -> pd.Series:
+    return _coalesce([_nonempty(S[c]) for c in cols if c in S], index)
+
+def parse_money_series(s: pd.Series) -> pd.Series:
+    """
+    parse_money_to_float vectorizado sobre strings (NaN donde no hay número).
+    Las columnas de montos repiten mucho, así que se parsean sólo los valores únicos.
+    """
+    codes, uniques = pd.factorize(s)
+    u = pd.Series(uniques, dtype=object)
+    num = u.str.replace(" ", "", regex=False).str.extract(_MONEY_EXTRACT_RE, expand=True)[0]
+    # mismas reglas que _money_str_to_float: con coma o con miles "x.xxx" los puntos se van
+    comma = num.str.contains(",", regex=False, na=False)
+    thousands = num.str.fullmatch(_thousands_re.pattern, na=False)
+    num = num.where(~(comma | thousands), num.str.replace(".", "", regex=False))
+    num = num.where(~comma, num.str.replace(",", ".", regex=False))
+    vals = pd.to_numeric(num, errors="coerce").astype(float).to_numpy()
+    out = np.full(len(s), np.nan)
+    hit = codes >= 0
+    out[hit] = vals[codes[hit]]
+    return pd.Series(out, index=s.index)
+
+def _slug_map(values: pd.Series) -> Dict[Any, str]:
+    return {v: slugify(v) for v in values.dropna().unique()}
+
+def _to_int(v: str) -> Optional[int]:
+    try:
+        return int(str(v).strip() or "0")
+    except Exception:
+        return None
+
+def _sheet_records(fname: str, path: str, sheet_name: str, df: pd.DataFrame, *, bot_id: str,
+                   aliases: Dict[str, List[str]], defaults: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Records de una hoja. Los campos canónicos se resuelven columna a columna
+    (alias resueltos una vez por hoja, montos parseados con operaciones de strings
+    de pandas); sólo el armado final de cada metadata es por fila.
+    """
+    df = normalize_columns(df).dropna(how="all").fillna("")
+    domain = _domain_from_name_and_cols(fname, sheet_name, df)
+    doc_id = make_doc_id(path, sheet_name)
+    idx = df.index
+    S, N = _str_columns(df)  # S: str(valor) crudo; N: nulos como ""
+    cols = list(S)
+
+    # ---------- Texto ----------
+    texto = pd.Series("", index=idx, dtype=object)
+    for c in cols:
+        piece = (c.upper() + ": ") + N[c]
+        empty = N[c] == ""
+        joined = texto.where(texto == "", texto + " | ") + piece
+        texto = texto.where(empty, joined)
+    keep = texto != ""
+    if not keep.any():
+        return []
+
+    # ---------- Título ----------
+    # Preferimos 'titulo' canónico; si no, primera columna con texto
+    t_default = defaults.get("titulo")
+    titulo = _coalesce(
+        [_first_nonempty_col(S, aliases["titulo"], idx)]
+        + ([pd.Series(t_default, index=idx, dtype=object)] if t_default else [])
+        + [_first_nonempty_col(S, cols, idx)],
+        idx,
+    ).fillna(domain)
+
+    # ---------- Campos base ----------
+    facultad = _first_nonempty_col(S, aliases["facultad"], idx)
+    if defaults.get("facultad") is not None:
+        facultad = facultad.fillna(defaults["facultad"])
+    modalidad = _first_nonempty_col(S, aliases["modalidad"], idx).fillna(defaults.get("modalidad") or "general")
+
+    # Período: si no viene explícito, intenta del texto / nombre del archivo
+    periodo = _first_nonempty_col(S, aliases["periodo"], idx)
+    if defaults.get("periodo"):
+        periodo = periodo.fillna(defaults["periodo"])
+    periodo = periodo.where(periodo.notna(), texto.str.extract(_PERIODO_RE, expand=True)[0])
+    periodo = periodo.fillna(_guess_periodo_from_text(fname) or "general").astype(str)
+
+    # ---------- Carrera & Carrera ID ----------
+    # Regla: en 'carreras', 'oferta' y 'aranceles' usar CARRERA y si no ALIAS (nombre público);
+    #        en el resto, el primer alias canónico de carrera y si no ALIAS.
+    carrera_id = _first_nonempty_col(S, aliases["carrera_id"], idx).fillna("")
+    if domain in ("carreras", "oferta", "aranceles"):
+        carrera = _first_nonempty_col(N, ["carrera", "alias"], idx)
+    else:
+        carrera = _coalesce([_first_nonempty_col(S, aliases["carrera"], idx),
+                             _first_nonempty_col(N, ["alias"], idx)], idx)
+
+    # ---------- Números (aranceles) ----------
+    money: Dict[str, pd.Series] = {}
+    def parsed(c: str) -> pd.Series:
+        if c not in money:
+            money[c] = parse_money_series(N[c])
+        return money[c]
+
+    # 1) aliases canónicos
+    num_cols: Dict[str, pd.Series] = {}
+    for key in ("matricula_general", "matricula_ingresante", "arancel_mensual", "arancel_total"):
+        num_cols[key] = _coalesce([parsed(a) for a in NUM_ALIASES[key] if a in S], idx).astype(float)
+    found = pd.concat(num_cols.values(), axis=1).notna().any(axis=1) if num_cols else pd.Series(False, index=idx)
+
+    # 2) si no hubo ninguno, heurística: cualquier columna con KW de dinero
+    heur: Dict[str, List[pd.Series]] = {}
+    for col in cols:
+        if not any(kw in col for kw in MONEY_COL_KWS):
+            continue
+        if "mensual" in col or "cuota" in col:
+            key = "arancel_mensual"
+        elif "total" in col:
+            key = "arancel_total"
+        elif "matric" in col or "inscrip" in col:
+            key = "matricula_general"
+        else:
+            key = f"otra_cifra_{col[:18]}"
+        heur.setdefault(key, []).append(parsed(col))
+    for key, series in heur.items():
+        h = _coalesce(series, idx).astype(float).where(~found)
+        num_cols[key] = num_cols[key].where(found, h) if key in num_cols else h
+
+    # 3) cuotas y flags
+    cuotas = None
+    if "cant_cuotas_plan_pagos" in S:
+        c = N["cant_cuotas_plan_pagos"]
+        cuotas = _nonempty(c).map({v: _to_int(v) for v in c.unique()})
+    plan = None
+    if "tiene_plan_pagos" in N:
+        flag = N["tiene_plan_pagos"]
+        plan = flag.str.lower().isin(_TRUE_FLAGS).where(flag != "")
+
+    # 4) derivación (sólo aranceles): total estimado = mensual * cuotas si no hay total
+    estimado = None
+    if domain == "aranceles" and cuotas is not None:
+        mensual = num_cols["arancel_mensual"]
+        total = num_cols["arancel_total"]
+        q = pd.to_numeric(cuotas, errors="coerce")
+        ok = mensual.notna() & (mensual != 0) & q.notna() & (q != 0) & ~(total.notna() & (total != 0))
+        estimado = (mensual * q).where(ok)
+
+    # ---------- IDs y slugs ----------
+    row_titulo_slug = titulo.map(_slug_map(titulo))
+    pk = (domain + ":") + carrera_id.str.strip()
+    pk = pk.where(carrera_id.str.strip() != "", (domain + ":") + row_titulo_slug)
+    pk = pk + ":" + periodo.str.strip().where(periodo.str.strip() != "", "all")
+    carrera_slug = carrera.map(_slug_map(carrera))
+    facultad_slug = facultad.where(facultad.fillna("") != "").map(_slug_map(facultad))
+    extra_keys = [slugify(c) for c in cols]
+
+    # ---------- Armado por fila ----------
+    # pasamos todo a listas: indexar Series fila por fila es lo caro
+    def _list(ser):
+        return [None if v is None or v != v else v for v in ser.tolist()] if ser is not None else None
+    num_items = [(key, _list(ser)) for key, ser in num_cols.items()]
+    cuotas_l, plan_l, estimado_l = _list(cuotas), _list(plan), _list(estimado)
+    carrera_l, facultad_l = _list(carrera), _list(facultad)
+    carrera_slug_l, facultad_slug_l = _list(carrera_slug), _list(facultad_slug)
+    titulo_l, modalidad_l, periodo_l = titulo.tolist(), modalidad.tolist(), periodo.tolist()
+    carrera_id_l, pk_l, texto_l, keep_l = carrera_id.tolist(), pk.tolist(), texto.tolist(), keep.tolist()
+    col_vals = [S[c].tolist() for c in cols]
+    inserted_at = now_iso_utc()
+    source_path = os.path.normpath(path)
+
+    records: List[Dict[str, Any]] = []
+    for r, i in enumerate(idx):
+        if not keep_l[r]:
+            continue
+        t = texto_l[r]
+        numbers: Dict[str, Any] = {}
+        for key, vals in num_items:
+            if vals[r] is not None:
+                numbers[key] = float(vals[r])
+        if cuotas_l is not None and cuotas_l[r] is not None:
+            numbers["cant_cuotas_plan_pagos"] = int(cuotas_l[r])
+        if plan_l is not None and plan_l[r] is not None:
+            numbers["tiene_plan_pagos"] = bool(plan_l[r])
+        if estimado_l is not None and estimado_l[r] is not None:
+            numbers["arancel_total_estimado"] = round(float(estimado_l[r]), 2)
+
+        extras = {}
+        for k, vals in zip(extra_keys, col_vals):
+            if vals[r]:
+                extras[k] = vals[r]  # guarda claves normalizadas
+
+        metadata = {
+            "schema_version": SCHEMA_VERSION,
+            "bot_id": bot_id,
+            "domain": domain,
+            "tipo": domain,  # compat retro
+            "doc_id": doc_id,
+            "chunk_id": make_chunk_id(doc_id, pk_l[r]),
+            "row_hash": hash_str(t),
+            "inserted_at": inserted_at,
+            "source_path": source_path,
+            "fuente_archivo": fname,
+            "fuente_hoja": sheet_name,
+            "fuente_fila": int(i),
+
+            # canónicos
+            "titulo": titulo_l[r],
+            "facultad": facultad_l[r],
+            "modalidad": modalidad_l[r],
+            "periodo": periodo_l[r],
+
+            # unión / lookup
+            "carrera": carrera_l[r],               # None si no hay
+            "carrera_id": carrera_id_l[r],
+            "carrera_slug": carrera_slug_l[r] if carrera_l[r] else None,
+            "facultad_slug": facultad_slug_l[r] if facultad_l[r] else None,
+
+            # auxiliares
+            "numbers": numbers if numbers else None,
+            "extras": extras,
+            "texto": t,
+        }
+        # limpiar None
+        metadata = {k: v for k, v in metadata.items() if v is not None}
+        records.append({"texto": t, "metadata": metadata})
+    return records
+
+def load_schema_config(xlsx_dir: str) -> Dict[str, Any]:
+    """Aliases y defaults efectivos de la carpeta (DEFAULT_ALIASES + _schema_map.json)."""
     cfg = _load_schema_map(xlsx_dir)
-    aliases = _merge_aliases(cfg.get("aliases", {}))
-    defaults = { slugify(k): str(v) for k, v in cfg.get("defaults", {}).items() }
+    return {
+        "aliases": _merge_aliases(cfg.get("aliases", {})),
+        "defaults": { slugify(k): str(v) for k, v in cfg.get("defaults", {}).items() },
+    }
 
+def load_xlsx_dir(xlsx_dir: str, *, bot_id: str = "public-admisiones",
+                  errors: Optional[Dict[str, str]] = None, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Records de todos los archivos de la carpeta (ver load_xlsx_files). Los archivos que
+    no se pudieron abrir se saltean; si se pasa `errors`, se completa con {archivo: error}.
+    """
+    files = list_data_files(xlsx_dir)
+    by_file, errs = load_xlsx_files(xlsx_dir, files, bot_id=bot_id, workers=workers)
+    if errors is not None:
+        errors.update(errs)
     records: List[Dict[str, Any]] = []
-    for fname in list_data_files(xlsx_dir):
-        path = os.path.join(xlsx_dir, fname)
+    for fname in files:
+        records.extend(by_file.get(fname, []))
+    return records
+
+def _load_file_job(job: Tuple[str, str, str, Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]], Optional[str]]:
+    # top-level para poder mandarla a otro proceso
+    xlsx_dir, fname, bot_id, cfg = job
+    try:
+        return fname, load_xlsx_file(xlsx_dir, fname, bot_id=bot_id, cfg=cfg), None
+    except Exception as e:
+        return fname, [], f"{e.__class__.__name__}: {e}"
+
+def _ingest_workers(workers: Optional[int], n_files: int) -> int:
+    workers = workers if workers is not None else settings.INGEST_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_files))
+
+def load_xlsx_files(xlsx_dir: str, fnames: List[str], *, bot_id: str = "public-admisiones",
+                    cfg: Optional[Dict[str, Any]] = None, workers: Optional[int] = None
+                    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """
+    Lee y chunkea `fnames` en paralelo (ver iter_xlsx_files). Devuelve
+    ({archivo: records}, {archivo: error}); un archivo roto no frena al resto.
+    """
+    errors: Dict[str, str] = {}
+    by_file = dict(iter_xlsx_files(xlsx_dir, fnames, bot_id=bot_id, cfg=cfg, workers=workers, errors=errors))
+    return by_file, errors
+
+def iter_xlsx_files(xlsx_dir: str, fnames: List[str], *, bot_id: str = "public-admisiones",
+                    cfg: Optional[Dict[str, Any]] = None, workers: Optional[int] = None,
+                    errors: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Va devolviendo (archivo, records) a medida que cada archivo termina. Se leen con un
+    pool de procesos (parsear Excel es CPU puro, así que threads no alcanzan) y con a lo
+    sumo `workers` archivos en vuelo, así la memoria no crece con el tamaño de la carpeta.
+    Los archivos que fallan se saltean y se anotan en `errors`. Con un solo worker (o un
+    solo archivo) corre en el proceso actual.
+    """
+    cfg = cfg or load_schema_config(xlsx_dir)
+    # los más grandes primero, para que no quede uno pesado solo al final
+    def size(fname: str) -> int:
         try:
-            sheets = _read_any(path)
-        except Exception as e:
-            print(f"[WARN] No pude abrir {fname}: {e}")
-            continue
+            return os.path.getsize(os.path.join(xlsx_dir, fname))
+        except OSError:
+            return 0
+    jobs = deque((xlsx_dir, fname, bot_id, cfg) for fname in sorted(fnames, key=size, reverse=True))
+
+    def done(result):
+        fname, records, err = result
+        if err is None:
+            return True
+        logger.warning(f"No pude abrir {fname}: {err}")
+        if errors is not None:
+            errors[fname] = err
+        return False
+
+    n = _ingest_workers(workers, len(jobs))
+    if n > 1:
+        inflight: Dict[Future, tuple] = {}
+        try:
+            # spawn: el proceso del API tiene threads (executors, batcher del reranker)
+            # y fork con threads vivos puede colgarse
+            with ProcessPoolExecutor(max_workers=n, mp_context=mp.get_context("spawn")) as ex:
+                while jobs or inflight:
+                    while jobs and len(inflight) < n:
+                        job = jobs.popleft()
+                        inflight[ex.submit(_load_file_job, job)] = job
+                    finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        result = fut.result()
+                        del inflight[fut]
+                        if done(result):
+                            yield result[0], result[1]
+        except BrokenProcessPool as e:
+            logger.warning(f"Pool de ingesta caído ({e}); sigo en serie")
+            jobs.extendleft(inflight.values())
+    while jobs:
+        result = _load_file_job(jobs.popleft())
+        if done(result):
+            yield result[0], result[1]
+
+def load_xlsx_file(xlsx_dir: str, fname: str, *, bot_id: str = "public-admisiones", cfg: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Records de un solo archivo de la carpeta. Propaga el error si no se puede abrir."""
+    cfg = cfg or load_schema_config(xlsx_dir)
+    aliases = cfg["aliases"]
+    defaults = cfg["defaults"]
 
-        for sheet_name, df in sheets.items():
-            if df is None or df.empty:
-                continue
-            df = normalize_columns(df).dropna(how="all").fillna("")
-            domain = _domain_from_name_and_cols(fname, sheet_name, df)
-            doc_id = make_doc_id(path, sheet_name)
-
-            # candidatos por campo canónico
-            cand = {
-                "facultad": aliases["facultad"],
-                "carrera": aliases["carrera"],
-                "modalidad": aliases["modalidad"],
-                "periodo": aliases["periodo"],
-                "titulo": aliases["titulo"],
-                "carrera_id": aliases["carrera_id"],
-            }
-
-            for i, row in df.iterrows():
-                texto = row_to_text(row)
-                if not texto:
-                    continue
-
-                # Normalización por fila (acceso case-insensitive)
-                norm = {k: ("" if pd.isna(row[k]) else str(row[k]).strip()) for k in row.index}
-                def get(*keys):
-                    for k in keys:
-                        kk = slugify(k)
-                        # ya normalizaste columnas con normalize_columns -> están slugificadas
-                        if kk in norm and norm[kk]:
-                            return norm[kk]
-                    return None
-
-                # ---------- Título ----------
-                # Preferimos 'titulo' canónico; si no, primera columna con texto
-                titulo = _first_nonempty(row, cand["titulo"]) or defaults.get("titulo")
-                if not titulo:
-                    for c in row.index:
-                        if str(row[c]).strip():
-                            titulo = str(row[c]).strip()
-                            break
-                titulo = titulo or domain
-
-                # ---------- Campos base ----------
-                facultad  = _first_nonempty(row, cand["facultad"])  or defaults.get("facultad")
-                modalidad = _first_nonempty(row, cand["modalidad"]) or defaults.get("modalidad") or "general"
-
-                # Período: si no viene explícito, intenta del texto / nombre del archivo
-                periodo = _first_nonempty(row, cand["periodo"]) or defaults.get("periodo")
-                if not periodo:
-                    periodo = _guess_periodo_from_text(texto) or _guess_periodo_from_text(fname) or "general"
-
-                # ---------- Carrera & Carrera ID (clave del fix) ----------
-                # Regla: en 'carreras' u 'oferta' usar CARRERA; si no hay, usar ALIAS (nombre público).
-                #       en 'aranceles' también intentamos CARRERA y luego ALIAS.
-                carrera_id = _first_nonempty(row, cand["carrera_id"]) or ""
-                if domain in ("carreras", "oferta"):
-                    carrera = get("carrera") or get("alias")  # primero CARRERA, luego ALIAS
-                elif domain == "aranceles":
-                    carrera = get("carrera") or get("alias")
-                else:
-                    carrera = _first_nonempty(row, cand["carrera"]) or get("alias")
-
-                # ¡Importante!: si no hay nombre de carrera, NO pongas "general"
-                carrera = carrera if carrera and carrera.strip() else None
-
-                # ---------- IDs determinísticos ----------
-                primary_key = _primary_key_for_row(domain, (carrera_id or "").strip(), str(periodo), i, titulo)
-                chunk_id = make_chunk_id(doc_id, primary_key)
-                row_hash = hash_str(texto)
-
-                # ---------- Slugs ----------
-                carrera_slug = slugify(carrera) if carrera else None
-                facultad_slug = slugify(facultad) if facultad else None
-
-                # ---------- Números (aranceles) ----------
-                numbers: Dict[str, Any] = {}
-
-                # 0) Mapa "columna -> valor string" ya normalizado
-                #    (tenemos 'norm' arriba con columnas slugificadas)
-                # 1) Intenta por aliases canónicos
-                def _fill_if_present(target_key: str, alias_list: list[str]):
-                    for a in alias_list:
-                        if a in norm and norm[a]:
-                            val = parse_money_to_float(norm[a])
-                            if val is not None:
-                                numbers[target_key] = float(val)
-                                return True
-                    return False
-
-                _fill_if_present("matricula_general",    NUM_ALIASES["matricula_general"])
-                _fill_if_present("matricula_ingresante", NUM_ALIASES["matricula_ingresante"])
-                _fill_if_present("arancel_mensual",      NUM_ALIASES["arancel_mensual"])
-                _fill_if_present("arancel_total",        NUM_ALIASES["arancel_total"])
-
-                # 2) Si sigue vacío, heurística: cualquier columna con KW de dinero
-                if not numbers:
-                    for col, sval in norm.items():
-                        if not sval:
-                            continue
-                        if any(kw in col for kw in MONEY_COL_KWS):
-                            val = parse_money_to_float(sval)
-                            if val is not None:
-                                # mapeo heurístico del nombre
-                                if "mensual" in col or "cuota" in col:
-                                    numbers.setdefault("arancel_mensual", float(val))
-                                elif "total" in col:
-                                    numbers.setdefault("arancel_total", float(val))
-                                elif "matric" in col or "inscrip" in col:
-                                    numbers.setdefault("matricula_general", float(val))
-                                else:
-                                    # guarda como "otra_cifra_*" por si acaso
-                                    numbers.setdefault(f"otra_cifra_{col[:18]}", float(val))
-
-                # 3) Cuotas y flags
-                if "cant_cuotas_plan_pagos" in norm and norm["cant_cuotas_plan_pagos"]:
-                    try:
-                        numbers["cant_cuotas_plan_pagos"] = int(str(norm["cant_cuotas_plan_pagos"]).strip() or "0")
-                    except Exception:
-                        pass
-
-                if "tiene_plan_pagos" in norm and norm["tiene_plan_pagos"]:
-                    v = norm["tiene_plan_pagos"].strip().lower()
-                    numbers["tiene_plan_pagos"] = v in ("s","si","sí","true","1","y","yes")
-
-                # 4) Derivación (después de parsear)
-                if domain == "aranceles":
-                    mensual = numbers.get("arancel_mensual")
-                    cuotas = numbers.get("cant_cuotas_plan_pagos") or 0
-                    total = numbers.get("arancel_total")
-                    if mensual and cuotas and not total:
-                        numbers["arancel_total_estimado"] = round(float(mensual) * float(cuotas), 2)
-
-
-                # ---------- Proveniencia y extras ----------
-                extras = {}
-                for c in row.index:
-                    v = str(row[c]).strip()
-                    if v:
-                        extras[slugify(c)] = v  # guarda claves normalizadas
-
-                metadata = {
-                    "schema_version": SCHEMA_VERSION,
-                    "bot_id": bot_id,
-                    "domain": domain,
-                    "tipo": domain,  # compat retro
-                    "doc_id": doc_id,
-                    "chunk_id": chunk_id,
-                    "row_hash": row_hash,
-                    "inserted_at": now_iso_utc(),
-                    "source_path": os.path.normpath(path),
-                    "fuente_archivo": fname,
-                    "fuente_hoja": sheet_name,
-                    "fuente_fila": int(i),
-
-                    # canónicos
-                    "titulo": titulo,
-                    "facultad": facultad,
-                    "modalidad": modalidad,
-                    "periodo": str(periodo),
-
-                    # unión / lookup
-                    "carrera": carrera,               # ← ahora correcto (None si no hay)
-                    "carrera_id": carrera_id,         # ← si existe
-                    "carrera_slug": carrera_slug,     # ← solo si hay carrera
-                    "facultad_slug": facultad_slug,
-
-                    # auxiliares
-                    "numbers": numbers if numbers else None,
-                    "extras": extras,
-                    "texto": texto,
-                }
-                # limpiar None
-                metadata = {k: v for k, v in metadata.items() if v is not None}
-
-                records.append({"texto": texto, "metadata": metadata})
+    records: List[Dict[str, Any]] = []
+    path = os.path.join(xlsx_dir, fname)
+    sheets = _read_any(path)
+    for sheet_name, df in sheets.items():
+        if df is None or df.empty:
+            continue
+        records.extend(_sheet_records(fname, path, sheet_name, df, bot_id=bot_id, aliases=aliases, defaults=defaults))
 
     return records
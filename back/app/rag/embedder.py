@@ -1,26 +1,103 @@
-import hashlib, json, os, sqlite3, time
-from typing import List
+import hashlib, json, os, random, sqlite3, threading, time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List
 import google.generativeai as genai
 from ..config import settings
+from ..utils.logging import logger
+from ..utils.executors import run_io
+from ..utils.lru import LRUCache
+from ..utils.metrics import EMBED_QUERY_CACHE_HITS, EMBED_QUERY_CACHE_MISSES
 
 CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "storage", "cache")
 os.makedirs(CACHE_PATH, exist_ok=True)
 DB_PATH = os.path.join(CACHE_PATH, "embeddings.sqlite")
 
+_migrated = False
+_migrate_lock = threading.Lock()
+
 def _db():
     con = sqlite3.connect(DB_PATH)
-    con.execute("""CREATE TABLE IF NOT EXISTS cache (
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("""CREATE TABLE IF NOT EXISTS vectors (
         key TEXT PRIMARY KEY,
         model TEXT NOT NULL,
-        vec_json TEXT NOT NULL,
+        vec BLOB NOT NULL,          -- float32 little-endian
         created_at REAL NOT NULL
-    )""")
+    ) WITHOUT ROWID""")
+    _migrate_json_cache(con)
     return con
 
-def _key(text: str, model: str) -> str:
+def _pack(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+def _migrate_json_cache(con: sqlite3.Connection):
+    """
+    Migración única del formato viejo (tabla `cache` con vec_json) a `vectors`
+    con blobs float32. Al terminar se borra la tabla vieja y se compacta el archivo.
+    """
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            _migrate_locked(con)
+            _migrated = True
+
+def _migrate_locked(con: sqlite3.Connection):
+    # llamada con _migrate_lock tomado: threads que abren su conexión en paralelo (p.ej.
+    # el pool de embed_texts) esperan acá en vez de migrar dos veces
+    old = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='cache'").fetchone()
+    if old:
+        cur = con.execute("SELECT key, model, vec_json, created_at FROM cache")
+        with con:
+            while True:
+                rows = cur.fetchmany(1000)
+                if not rows:
+                    break
+                con.executemany(
+                    "INSERT OR IGNORE INTO vectors (key, model, vec, created_at) VALUES (?, ?, ?, ?)",
+                    [(k, m, _pack(json.loads(v)), ts) for k, m, v, ts in rows],
+                )
+            con.execute("DROP TABLE cache")
+        con.execute("VACUUM")
+        logger.info("embeddings: caché migrada de vec_json a blobs float32")
+
+_IN_CHUNK = 500  # por debajo del límite de variables de SQLite
+
+def _cache_get_many(con: sqlite3.Connection, keys: List[str], model: str) -> Dict[str, List[float]]:
+    found: Dict[str, List[float]] = {}
+    uniq = list(dict.fromkeys(keys))
+    for j in range(0, len(uniq), _IN_CHUNK):
+        part = uniq[j:j + _IN_CHUNK]
+        marks = ",".join("?" * len(part))
+        for k, blob in con.execute(
+            f"SELECT key, vec FROM vectors WHERE model=? AND key IN ({marks})", (model, *part)
+        ):
+            found[k] = _unpack(blob)
+    return found
+
+def _cache_put_many(con: sqlite3.Connection, items: List[tuple[str, List[float]]], model: str):
+    now = time.time()
+    with con:
+        con.executemany(
+            "INSERT OR REPLACE INTO vectors (key, model, vec, created_at) VALUES (?, ?, ?, ?)",
+            [(k, model, _pack(vec), now) for k, vec in items],
+        )
+
+def _key(text: str, model: str, task: str | None = None) -> str:
     h = hashlib.sha256()
     h.update(model.encode("utf-8"))
     h.update(b"\x1f")
+    if task:  # los documentos no llevan tag (compat con la caché existente)
+        h.update(task.encode("utf-8"))
+        h.update(b"\x1f")
     h.update(text.encode("utf-8"))
     return h.hexdigest()
 
@@ -62,63 +139,205 @@ def _extract_vec(resp) -> List[float]:
         pass
     raise ValueError("Formato de respuesta de embeddings desconocido")
 
-def embed_one(text: str, model: str | None = None) -> List[float]:
-    model = model or settings.GEMINI_EMBED_MODEL
+def _extract_vecs(resp, n: int) -> List[List[float]]:
+    """
+    Igual que _extract_vec pero para requests batch (content=[...]):
+    - {'embedding': [[...], [...]]}
+    - {'embeddings': [{'values': [...]}, ...]}
+    - objeto con .embeddings[i].values
+    """
+    vecs = None
+    if isinstance(resp, dict):
+        emb = resp.get("embedding")
+        if isinstance(emb, list) and emb and isinstance(emb[0], (list, tuple)):
+            vecs = [list(v) for v in emb]
+        elif resp.get("embeddings"):
+            vecs = [list(e["values"]) if isinstance(e, dict) else list(e) for e in resp["embeddings"]]
+    else:
+        embs = getattr(resp, "embeddings", None)
+        if embs is not None:
+            vecs = [list(getattr(e, "values", e)) for e in embs]
+    if vecs is None:
+        if n == 1:
+            return [_extract_vec(resp)]
+        raise ValueError("Formato de respuesta de embeddings (batch) desconocido")
+    if len(vecs) != n:
+        raise ValueError(f"El batch devolvió {len(vecs)} embeddings para {n} textos")
+    return vecs
+
+# Backend de embeddings: (textos, modelo, task_type) -> vectores, en el mismo orden.
+EmbedBackend = Callable[[List[str], str, str], List[List[float]]]
+
+def _gemini_backend(texts: List[str], model: str, task_type: str) -> List[List[float]]:
     init_gemini()
-    # Algunos clientes requieren el prefijo "models/"
-    model_name = model if model.startswith("models/") else model
     resp = genai.embed_content(
-        model=model_name,
-        content=text,
-        task_type="RETRIEVAL_DOCUMENT"
+        model=model,
+        content=texts if len(texts) > 1 else texts[0],
+        task_type=task_type,
     )
-    return _extract_vec(resp)
+    return _extract_vecs(resp, len(texts))
 
-def embed_texts(texts: List[str], model: str | None = None) -> List[List[float]]:
+_backend: EmbedBackend = _gemini_backend
+
+def set_embed_backend(backend: EmbedBackend | None):
     """
-    Embeddings con caché, uno por vez (más robusto que batch).
+    Reemplaza el backend de embeddings (p.ej. un fake local para pruebas).
+    Con None se vuelve a Gemini.
     """
+    global _backend
+    _backend = backend or _gemini_backend
+
+class _RateLimiter:
+    """Espaciado mínimo entre requests para respetar EMBED_RPM (0 = sin límite)."""
+    def __init__(self, rpm: int):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_limiter = _RateLimiter(settings.EMBED_RPM)
+
+# Errores transitorios (cuota, timeouts, 5xx) que vale la pena reintentar
+_RETRYABLE = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "DeadlineExceeded", "InternalServerError", "GatewayTimeout",
+}
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    return any(c.__name__ in _RETRYABLE for c in type(e).__mro__)
+
+def _embed_batch(texts: List[str], model: str, task_type: str) -> List[List[float]]:
+    """Un request al backend con rate-limit y backoff exponencial (con jitter) ante errores transitorios."""
+    attempt = 0
+    while True:
+        _limiter.wait()
+        try:
+            return _backend(texts, model, task_type)
+        except Exception as e:
+            attempt += 1
+            if attempt > settings.EMBED_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = settings.EMBED_BACKOFF_BASE * (2 ** (attempt - 1))
+            delay += random.uniform(0, delay / 2)
+            logger.warning(f"embeddings: {e.__class__.__name__}, reintento {attempt} en {delay:.1f}s")
+            time.sleep(delay)
+
+def embed_one(text: str, model: str | None = None) -> List[float]:
     model = model or settings.GEMINI_EMBED_MODEL
-    init_gemini()
+    return _embed_batch([text], model, "RETRIEVAL_DOCUMENT")[0]
+
+def embed_texts(
+    texts: List[str],
+    model: str | None = None,
+    *,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> List[List[float]]:
+    """
+    Embeddings con caché. Los misses se deduplican, se agrupan en batches de
+    `batch_size` textos y se embeben en paralelo con hasta `concurrency` requests
+    en vuelo; cada batch terminado se persiste en la caché de una sola vez.
+    """
+    model = model or settings.GEMINI_EMBED_MODEL
+    batch_size = max(1, batch_size or settings.EMBED_BATCH_SIZE)
+    concurrency = max(1, concurrency or settings.EMBED_CONCURRENCY)
     con = _db()
     out: List[List[float]] = [None] * len(texts)  # type: ignore
-    misses = []
+    misses: Dict[str, List[int]] = {}  # texto -> posiciones (dedupe de textos repetidos)
 
-    for i, t in enumerate(texts):
-        k = _key(t, model)
-        cur = con.execute("SELECT vec_json FROM cache WHERE key=? AND model=?", (k, model)).fetchone()
-        if cur:
-            out[i] = json.loads(cur[0])
+    keys = [_key(t, model) for t in texts]
+    cached = _cache_get_many(con, keys, model)
+    for i, (t, k) in enumerate(zip(texts, keys)):
+        if k in cached:
+            out[i] = cached[k]
         else:
-            misses.append(i)
-
-    now = time.time()
-    for i in misses:
-        t = texts[i]
-        vec = embed_one(t, model=model)
-        out[i] = vec
-        k = _key(t, model)
-        with con:
-            con.execute(
-                "INSERT OR REPLACE INTO cache (key, model, vec_json, created_at) VALUES (?, ?, ?, ?)",
-                (k, model, json.dumps(vec), now),
-            )
+            misses.setdefault(t, []).append(i)
 
-    con.close()
+    pending = list(misses)
+    batches = [pending[j:j + batch_size] for j in range(0, len(pending), batch_size)]
+    try:
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as ex:
+                futs = {ex.submit(_embed_batch, b, model, "RETRIEVAL_DOCUMENT"): b for b in batches}
+                for fut in as_completed(futs):
+                    batch = futs[fut]
+                    vecs = fut.result()
+                    for t, vec in zip(batch, vecs):
+                        for i in misses[t]:
+                            out[i] = vec
+                    _cache_put_many(con, [(_key(t, model), vec) for t, vec in zip(batch, vecs)], model)
+    finally:
+        con.close()
     return out  # type: ignore
 
+_dim: int | None = None
+
 def get_embedding_dim() -> int:
-    vec = embed_one("dim_check")
-    return len(vec)
+    global _dim
+    if _dim is None:
+        _dim = settings.EMBED_DIM or len(embed_one("dim_check"))
+    return _dim
+
+
+_query_cache = LRUCache(
+    settings.QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+)
 
+def _normalize_query(text: str) -> str:
+    return " ".join((text or "").split()).lower()
 
 def embed_query(text: str, model: str | None = None) -> List[float]:
+    """
+    Embedding de consulta con LRU en memoria y, si QUERY_CACHE_PERSIST, respaldo
+    en la caché SQLite (clave con tag RETRIEVAL_QUERY para no mezclar con documentos).
+    """
     model = model or settings.GEMINI_EMBED_MODEL
-    init_gemini()
-    model_name = model if model.startswith("models/") else model
-    resp = genai.embed_content(
-        model=model_name,
-        content=text,
-        task_type="RETRIEVAL_QUERY"
-    )
-    return _extract_vec(resp)
\ No newline at end of file
+    mkey = (model, _normalize_query(text))
+    vec = _query_cache.get(mkey)
+    if vec is not None:
+        EMBED_QUERY_CACHE_HITS.labels(layer="memory").inc()
+        return vec
+
+    dkey = _key(mkey[1], model, task="RETRIEVAL_QUERY")
+    if settings.QUERY_CACHE_PERSIST:
+        con = _db()
+        try:
+            vec = _cache_get_many(con, [dkey], model).get(dkey)
+        finally:
+            con.close()
+        if vec is not None:
+            EMBED_QUERY_CACHE_HITS.labels(layer="disk").inc()
+            _query_cache.put(mkey, vec)
+            return vec
+
+    EMBED_QUERY_CACHE_MISSES.inc()
+    vec = _embed_batch([text], model, "RETRIEVAL_QUERY")[0]
+    _query_cache.put(mkey, vec)
+    if settings.QUERY_CACHE_PERSIST:
+        con = _db()
+        try:
+            _cache_put_many(con, [(dkey, vec)], model)
+        finally:
+            con.close()
+    return vec
+
+async def embed_query_async(text: str, model: str | None = None) -> List[float]:
+    """Versión async de embed_query: los hits en memoria no saltan de hilo."""
+    model = model or settings.GEMINI_EMBED_MODEL
+    vec = _query_cache.get((model, _normalize_query(text)))
+    if vec is not None:
+        EMBED_QUERY_CACHE_HITS.labels(layer="memory").inc()
+        return vec
+    return await run_io(embed_query, text, model)
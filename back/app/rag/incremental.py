@@ -0,0 +1,117 @@
+import os, threading
+from typing import Any, Callable, Dict, Iterable, List
+from qdrant_client import QdrantClient
+from . import lexical, manifest
+from .chunking import list_data_files, load_schema_config, iter_xlsx_files
+from .retriever import IngestCancelled, delete_chunks, upsert_records
+from ..catalog import fees
+from ..catalog.entities import upsert_from_records
+
+def _rows_of(records: List[Dict[str, Any]]) -> Dict[str, str]:
+    # chunk_id -> row_hash; si un chunk_id se repite gana la última fila (igual que en Qdrant)
+    return {r["metadata"]["chunk_id"]: r["metadata"]["row_hash"] for r in records}
+
+def record_full_ingest(xlsx_dir: str, bot_id: str, rows_by_file: Dict[str, Dict[str, str]], failed: Iterable[str] = ()):
+    """
+    Deja el manifiesto al día después de una ingesta completa; `rows_by_file` es
+    {archivo: {chunk_id: row_hash}}. Los archivos en `failed` (no se pudieron leer)
+    no se registran, así la próxima incremental los reintenta.
+    """
+    cfg_hash = manifest.schema_map_hash(xlsx_dir)
+    manifest.reset(bot_id)
+    for fname in list_data_files(xlsx_dir):
+        if fname in failed:
+            continue
+        path = os.path.join(xlsx_dir, fname)
+        st = os.stat(path)
+        manifest.save_file(bot_id, fname, mtime=st.st_mtime, size=st.st_size,
+                           sha256=manifest.file_sha256(path), cfg_hash=cfg_hash,
+                           rows=rows_by_file.get(fname, {}))
+
+def ingest_incremental(client: QdrantClient, xlsx_dir: str, bot_id: str, collection: str | None = None, *,
+                       progress: Callable[[str, int], None] | None = None,
+                       cancel: threading.Event | None = None) -> Dict[str, Any]:
+    """
+    Ingesta incremental contra el manifiesto:
+    - archivos con mismo mtime/tamaño (o mismo sha256) y mismo _schema_map.json: se saltean
+    - archivos cambiados: sólo se upsertean las filas con row_hash nuevo o distinto y se
+      borran los puntos de las filas que desaparecieron
+    - si cambió _schema_map.json se re-upsertean todas las filas del archivo: los alias
+      cambian la metadata (carrera, período, montos) aunque el texto quede igual
+    - archivos que ya no están: se borran todos sus puntos
+    El manifiesto se guarda archivo por archivo, así que cancelar (`cancel`) deja
+    hecho lo que ya terminó y la próxima corrida sigue desde ahí.
+    """
+    cfg = load_schema_config(xlsx_dir)
+    cfg_hash = manifest.schema_map_hash(xlsx_dir)
+    known = manifest.get_files(bot_id)
+    files = list_data_files(xlsx_dir)
+    stats: Dict[str, Any] = {
+        "files_unchanged": [], "files_changed": [], "files_removed": [],
+        "rows_upserted": 0, "rows_deleted": 0, "rows_unchanged": 0, "errors": {},
+    }
+
+    to_load: Dict[str, tuple] = {}
+    for fname in files:
+        path = os.path.join(xlsx_dir, fname)
+        st = os.stat(path)
+        prev = known.get(fname)
+        same_cfg = prev is not None and prev["cfg_hash"] == cfg_hash
+        if same_cfg and prev["mtime"] == st.st_mtime and prev["size"] == st.st_size:
+            stats["files_unchanged"].append(fname)
+            continue
+        sha = manifest.file_sha256(path)
+        if same_cfg and prev["sha256"] == sha:
+            # tocado pero idéntico: sólo refrescamos la huella
+            manifest.save_file(bot_id, fname, mtime=st.st_mtime, size=st.st_size, sha256=sha, cfg_hash=cfg_hash)
+            stats["files_unchanged"].append(fname)
+            continue
+        to_load[fname] = (st, sha, same_cfg)
+
+    report = progress or (lambda stage, n: None)
+    report("files_total", len(to_load))
+    # los archivos cambiados se leen en paralelo y se procesan a medida que terminan
+    for fname, records in iter_xlsx_files(xlsx_dir, list(to_load), bot_id=bot_id, cfg=cfg, errors=stats["errors"]):
+        if cancel is not None and cancel.is_set():
+            raise IngestCancelled()
+        st, sha, same_cfg = to_load[fname]
+        new_rows = _rows_of(records)
+        old_rows = manifest.get_rows(bot_id, fname)
+        if same_cfg:
+            changed_ids = {ck for ck, rh in new_rows.items() if old_rows.get(ck) != rh}
+        else:
+            changed_ids = set(new_rows)
+        changed = [r for r in records if r["metadata"]["chunk_id"] in changed_ids]
+        removed = [ck for ck in old_rows if ck not in new_rows]
+
+        if changed:
+            upsert_from_records(changed, bot_id=bot_id)
+            fees.upsert_from_records(changed, bot_id=bot_id)
+            upsert_records(client, changed, collection=collection, progress=progress, cancel=cancel)
+            lexical.upsert_records(changed)
+        if removed:
+            delete_chunks(client, bot_id, removed, collection=collection)
+            lexical.delete_chunks(bot_id, removed)
+            fees.delete_chunks(bot_id, removed)
+        manifest.save_file(bot_id, fname, mtime=st.st_mtime, size=st.st_size, sha256=sha,
+                           cfg_hash=cfg_hash, rows=new_rows)
+
+        stats["files_changed"].append(fname)
+        stats["rows_upserted"] += len(changed_ids)
+        stats["rows_deleted"] += len(removed)
+        stats["rows_unchanged"] += len(new_rows) - len(changed_ids)
+        report("files_done", 1)
+
+    for fname in known:
+        if fname in files:
+            continue
+        old_rows = manifest.get_rows(bot_id, fname)
+        if old_rows:
+            delete_chunks(client, bot_id, list(old_rows), collection=collection)
+            lexical.delete_chunks(bot_id, list(old_rows))
+            fees.delete_chunks(bot_id, list(old_rows))
+        manifest.forget_file(bot_id, fname)
+        stats["files_removed"].append(fname)
+        stats["rows_deleted"] += len(old_rows)
+
+    return stats
@@ -0,0 +1,63 @@
+import threading
+from typing import Any, Callable, Dict, Set
+from qdrant_client import QdrantClient
+from .chunking import iter_xlsx_files, list_data_files, load_schema_config
+from .incremental import _rows_of, record_full_ingest
+from . import lexical, manifest
+from .retriever import rebatch, upsert_stream
+from ..catalog import fees
+from ..catalog.entities import upsert_from_records
+
+def _produced_chunk_ids(bot_id: str, rows_by_file: Dict[str, Dict[str, str]], errors: Dict[str, str]) -> Set[str]:
+    # los archivos que no se pudieron leer conservan lo que tenían según el manifiesto
+    keep = {ck for rows in rows_by_file.values() for ck in rows}
+    for fname in errors:
+        keep.update(manifest.get_rows(bot_id, fname))
+    return keep
+
+def _prune(store, bot_id: str, keep: Set[str]):
+    stale = list(store.chunk_ids(bot_id) - keep)
+    if stale:
+        store.delete_chunks(bot_id, stale)
+
+def ingest_full(client: QdrantClient, xlsx_dir: str, bot_id: str, collection: str | None = None, *,
+                progress: Callable[[str, int], None] | None = None,
+                cancel: threading.Event | None = None) -> Dict[str, Any]:
+    """
+    Ingesta completa de la carpeta en streaming: los archivos se leen en paralelo y sus
+    filas pasan por upsert_stream (embed + upsert por batches) sin juntar todo el corpus
+    en memoria. Del recorrido sólo se guarda {archivo: {chunk_id: row_hash}} para el
+    manifiesto. `progress`/`cancel` son los de upsert_stream; además se reporta
+    "files_total" y "files_done". Si se cancela o falla, el manifiesto no se toca. Al
+    terminar bien se borran de aranceles e índice léxico las filas que esta corrida ya
+    no produjo.
+    """
+    cfg = load_schema_config(xlsx_dir)
+    files = list_data_files(xlsx_dir)
+    errors: Dict[str, str] = {}
+    rows_by_file: Dict[str, Dict[str, str]] = {}
+    report = progress or (lambda stage, n: None)
+    report("files_total", len(files))
+
+    def records():
+        for fname, recs in iter_xlsx_files(xlsx_dir, files, bot_id=bot_id, cfg=cfg, errors=errors):
+            rows_by_file[fname] = _rows_of(recs)
+            report("files_done", 1)
+            yield from recs
+
+    def on_batch(batch):
+        upsert_from_records(batch, bot_id=bot_id)
+        fees.upsert_from_records(batch, bot_id=bot_id)
+        lexical.upsert_records(batch)
+
+    total = upsert_stream(client, rebatch(records()), collection, on_batch=on_batch,
+                          progress=progress, cancel=cancel)
+    if total:
+        # el manifiesto se reescribe entero, así que la incremental no borraría las filas
+        # de carreras/períodos dados de baja: se podan acá, recién con la corrida completa
+        # (una ingesta cancelada o fallida no borra nada)
+        keep = _produced_chunk_ids(bot_id, rows_by_file, errors)
+        _prune(fees, bot_id, keep)
+        _prune(lexical, bot_id, keep)
+        record_full_ingest(xlsx_dir, bot_id, rows_by_file, failed=errors)
+    return {"files": files, "found_rows": total, "errors": errors}
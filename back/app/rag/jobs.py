@@ -0,0 +1,143 @@
+import threading, time, traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+from ..config import settings
+from ..utils.logging import logger
+from .retriever import IngestCancelled
+
+# Ingestas en segundo plano: POST /ingest/xlsx encola un job y devuelve su id; el
+# progreso se consulta en GET /ingest/jobs/{id}. Vive en memoria del proceso (un job
+# no sobrevive a un reinicio) y hay como mucho un job activo por bot_id.
+
+ACTIVE = ("queued", "running")
+
+class IngestJob:
+    def __init__(self, bot_id: str, incremental: bool):
+        self.id = uuid4().hex
+        self.bot_id = bot_id
+        self.incremental = incremental
+        self.status = "queued"  # queued | running | succeeded | failed | cancelled
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.counts: Dict[str, int] = {"files_total": 0, "files_done": 0, "parsed": 0, "embedded": 0, "upserted": 0}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def progress(self, stage: str, n: int):
+        with self._lock:
+            self.counts[stage] = self.counts.get(stage, 0) + n
+
+    def _estimate_total(self, c: Dict[str, int]) -> Optional[int]:
+        # filas totales: exactas cuando ya se leyeron todos los archivos; antes, una
+        # extrapolación por archivos leídos
+        if c["files_total"] and c["files_done"] >= c["files_total"]:
+            return c["parsed"]
+        if c["files_done"]:
+            return max(c["parsed"], round(c["parsed"] * c["files_total"] / c["files_done"]))
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self.counts)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        rate = c["upserted"] / elapsed if elapsed > 0 else 0.0
+        total = self._estimate_total(c)
+        eta = None
+        if self.status == "running" and total is not None and rate > 0:
+            eta = round(max(0, total - c["upserted"]) / rate, 1)
+        return {
+            "job_id": self.id,
+            "bot_id": self.bot_id,
+            "incremental": self.incremental,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": round(elapsed, 1),
+            "files_total": c["files_total"],
+            "files_done": c["files_done"],
+            "rows_parsed": c["parsed"],
+            "rows_embedded": c["embedded"],
+            "rows_upserted": c["upserted"],
+            "rows_total_estimate": total,
+            "rows_per_s": round(rate, 1),
+            "eta_s": eta,
+            "cancel_requested": self.cancel.is_set(),
+            "result": self.result,
+            "error": self.error,
+        }
+
+_executor = ThreadPoolExecutor(max_workers=max(1, settings.INGEST_JOB_WORKERS), thread_name_prefix="ingest-job")
+_jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+_lock = threading.Lock()
+
+def _prune():
+    # se queda con los activos y los últimos INGEST_JOB_HISTORY terminados
+    done = [jid for jid, j in _jobs.items() if j.status not in ACTIVE]
+    for jid in done[:max(0, len(done) - settings.INGEST_JOB_HISTORY)]:
+        del _jobs[jid]
+
+def _run(job: IngestJob, fn: Callable[[IngestJob], Dict[str, Any]]):
+    if job.cancel.is_set():
+        job.done.set()
+        return  # cancelado mientras esperaba en la cola
+    job.status, job.started_at = "running", time.time()
+    try:
+        job.result = fn(job)
+        job.status = "succeeded"
+    except IngestCancelled:
+        job.status = "cancelled"
+    except Exception as e:
+        job.error = f"{e.__class__.__name__}: {e}"
+        job.status = "failed"
+        logger.warning(f"ingest job {job.id} ({job.bot_id}) falló: {traceback.format_exc(limit=2)}")
+    finally:
+        job.finished_at = time.time()
+        job.done.set()
+        logger.info(f"ingest job {job.id} ({job.bot_id}) {job.status} en {job.finished_at - job.started_at:.1f}s")
+
+def submit(bot_id: str, incremental: bool, fn: Callable[[IngestJob], Dict[str, Any]]) -> Tuple[IngestJob, bool]:
+    """
+    Encola `fn(job)` en el pool de ingesta. Si ya hay un job activo para `bot_id`
+    devuelve ese en vez de crear otro: (job, False).
+    """
+    with _lock:
+        for job in _jobs.values():
+            if job.bot_id == bot_id and job.status in ACTIVE:
+                return job, False
+        job = IngestJob(bot_id, incremental)
+        _jobs[job.id] = job
+        _prune()
+    _executor.submit(_run, job, fn)
+    return job, True
+
+def get(job_id: str) -> Optional[IngestJob]:
+    with _lock:
+        return _jobs.get(job_id)
+
+def list_jobs(bot_id: str | None = None) -> List[IngestJob]:
+    with _lock:
+        return [j for j in reversed(_jobs.values()) if bot_id is None or j.bot_id == bot_id]
+
+def cancel(job_id: str) -> Optional[IngestJob]:
+    """Pide cancelar el job; el pipeline corta en el próximo batch."""
+    job = get(job_id)
+    if job is not None and job.status in ACTIVE:
+        job.cancel.set()
+        if job.status == "queued":
+            job.status, job.finished_at = "cancelled", time.time()
+            job.done.set()
+    return job
+
+def shutdown():
+    """Cancela lo que esté corriendo o encolado (shutdown de la app)."""
+    for job in list_jobs():
+        cancel(job.id)
+    _executor.shutdown(wait=False, cancel_futures=True)
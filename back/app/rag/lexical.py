@@ -0,0 +1,153 @@
+import os, re, sqlite3, threading, json
+from typing import Any, Dict, Iterable, List, Optional, Set
+from qdrant_client.http.models import FieldCondition, Filter, MatchAny, MatchValue
+from .schema import INDEXED_FIELDS, SEARCH_PAYLOAD_FIELDS
+
+# Índice léxico (BM25 vía SQLite FTS5) sobre los mismos textos que van a Qdrant. Se
+# mantiene en la ingesta (completa e incremental) y se consulta junto con la búsqueda
+# densa: códigos de carrera, años, siglas o "matrícula" matchean por token exacto.
+LEXICAL_DB_PATH = os.environ.get("LEXICAL_DB_PATH", "/app/state/lexical.db")
+
+_lock = threading.Lock()
+_schema_ready = False
+
+# palabras vacías que matchean casi todo y sólo agregan costo a la consulta OR
+_STOPWORDS = {
+    "a", "al", "como", "con", "cual", "cuales", "cuanto", "cuanta", "de", "del", "el", "en",
+    "es", "esta", "este", "hay", "la", "las", "lo", "los", "me", "mi", "para", "por", "que",
+    "quiero", "saber", "se", "si", "sobre", "su", "sus", "tiene", "un", "una", "y", "o",
+}
+_token_re = re.compile(r"\w+", re.UNICODE)
+_MAX_TERMS = 16
+
+def _conn():
+    os.makedirs(os.path.dirname(LEXICAL_DB_PATH), exist_ok=True)
+    cx = sqlite3.connect(LEXICAL_DB_PATH)
+    cx.row_factory = sqlite3.Row
+    return cx
+
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    cols = ", ".join(f"{f} TEXT" for f in INDEXED_FIELDS if f != "bot_id")
+    with _lock, _conn() as cx:
+        cx.executescript(f"""
+        CREATE TABLE IF NOT EXISTS chunks (
+          id       INTEGER PRIMARY KEY,
+          bot_id   TEXT NOT NULL,
+          chunk_id TEXT NOT NULL,
+          texto    TEXT NOT NULL,
+          payload  TEXT NOT NULL,
+          {cols},
+          UNIQUE (bot_id, chunk_id)
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+          texto, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+          INSERT INTO chunks_fts(rowid, texto) VALUES (new.id, new.texto);
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+          INSERT INTO chunks_fts(chunks_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+          INSERT INTO chunks_fts(chunks_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+          INSERT INTO chunks_fts(rowid, texto) VALUES (new.id, new.texto);
+        END;
+        """)
+    _schema_ready = True
+
+def upsert_records(records: Iterable[Dict[str, Any]]):
+    """Indexa (o reemplaza por bot_id + chunk_id) los records de la ingesta."""
+    ensure_schema()
+    fields = [f for f in INDEXED_FIELDS if f != "bot_id"]
+    rows = []
+    for r in records:
+        meta = r["metadata"]
+        if not meta.get("chunk_id"):
+            continue
+        payload = {k: meta[k] for k in SEARCH_PAYLOAD_FIELDS if k in meta}
+        rows.append((meta.get("bot_id", "default"), meta["chunk_id"], r["texto"],
+                     json.dumps(payload, ensure_ascii=False),
+                     *[None if meta.get(f) is None else str(meta[f]) for f in fields]))
+    if not rows:
+        return
+    cols = ", ".join(fields)
+    marks = ", ".join("?" * (4 + len(fields)))
+    updates = ", ".join(f"{c}=excluded.{c}" for c in ["texto", "payload", *fields])
+    with _lock, _conn() as cx:
+        cx.executemany(
+            f"INSERT INTO chunks (bot_id, chunk_id, texto, payload, {cols}) VALUES ({marks}) "
+            f"ON CONFLICT (bot_id, chunk_id) DO UPDATE SET {updates}",
+            rows,
+        )
+        cx.commit()
+
+def delete_chunks(bot_id: str, chunk_ids: List[str], batch: int = 500):
+    ensure_schema()
+    with _lock, _conn() as cx:
+        for j in range(0, len(chunk_ids), batch):
+            part = chunk_ids[j:j + batch]
+            cx.execute(f"DELETE FROM chunks WHERE bot_id=? AND chunk_id IN ({','.join('?' * len(part))})",
+                       (bot_id, *part))
+        cx.commit()
+
+def chunk_ids(bot_id: str) -> Set[str]:
+    ensure_schema()
+    with _conn() as cx:
+        return {r[0] for r in cx.execute("SELECT chunk_id FROM chunks WHERE bot_id=?", (bot_id,))}
+
+def reset(bot_id: Optional[str] = None):
+    ensure_schema()
+    with _lock, _conn() as cx:
+        if bot_id:
+            cx.execute("DELETE FROM chunks WHERE bot_id=?", (bot_id,))
+        else:
+            cx.execute("DELETE FROM chunks")
+        cx.commit()
+
+def _match_query(query: str) -> str:
+    terms: List[str] = []
+    for tok in _token_re.findall((query or "").lower()):
+        if tok in _STOPWORDS or (len(tok) < 2 and not tok.isdigit()) or tok in terms:
+            continue
+        terms.append(tok)
+    # cada término entre comillas: FTS5 no interpreta operadores del usuario
+    return " OR ".join(f'"{t}"' for t in terms[:_MAX_TERMS])
+
+def _where(flt: Filter):
+    """Traduce los `must` (MatchValue / MatchAny) de _build_filter a SQL."""
+    sql, args = [], []
+    for c in flt.must or []:
+        if not isinstance(c, FieldCondition) or c.key not in INDEXED_FIELDS:
+            raise ValueError(f"Condición no soportada por el índice léxico: {c}")
+        if isinstance(c.match, MatchValue):
+            sql.append(f"c.{c.key} = ?")
+            args.append(str(c.match.value))
+        elif isinstance(c.match, MatchAny):
+            sql.append(f"c.{c.key} IN ({','.join('?' * len(c.match.any))})")
+            args.extend(str(v) for v in c.match.any)
+        else:
+            raise ValueError(f"Match no soportado por el índice léxico: {c.match}")
+    return sql, args
+
+def search(query: str, flt: Filter, limit: int) -> List[Dict[str, Any]]:
+    """
+    Top `limit` por BM25 entre los chunks que cumplen `flt`. Mismo formato de salida
+    que retriever.search ({texto, metadata, score}); score = -bm25 (más alto, mejor).
+    """
+    match = _match_query(query)
+    if not match or limit <= 0:
+        return []
+    ensure_schema()
+    conds, args = _where(flt)
+    where = " AND ".join(["chunks_fts MATCH ?", *conds])
+    with _conn() as cx:
+        cur = cx.execute(
+            f"SELECT c.texto, c.payload, bm25(chunks_fts) AS rank FROM chunks_fts "
+            f"JOIN chunks c ON c.id = chunks_fts.rowid WHERE {where} ORDER BY rank LIMIT ?",
+            (match, *args, limit),
+        )
+        rows = cur.fetchall()
+    return [{"texto": r["texto"], "metadata": json.loads(r["payload"]), "score": -float(r["rank"])} for r in rows]
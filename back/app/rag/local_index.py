@@ -0,0 +1,185 @@
+import json, os, shutil, threading, time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import FieldCondition, Filter, MatchAny, MatchValue, NearestQuery, QueryRequest, ScoredPoint
+from ..config import settings
+from ..utils.logging import logger
+from .schema import INDEXED_FIELDS, SEARCH_PAYLOAD_FIELDS
+
+# Índice vectorial en proceso (RETRIEVAL_BACKEND=local) para bots chicos: una matriz
+# float32 normalizada (mmap de un snapshot que se escribe al terminar cada ingesta) y,
+# por cada campo de _build_filter, un bitmap por valor. Una búsqueda filtrada es un AND
+# de bitmaps, un producto matriz-vector y un argpartition, sin ir hasta Qdrant.
+#
+# En disco: LOCAL_INDEX_DIR/<colección>/<versión>/{vectors.f32,meta.json} y un archivo
+# CURRENT con el nombre de la versión vigente. Cada snapshot va a un directorio nuevo y
+# se publica reemplazando CURRENT de forma atómica: un lector nunca mezcla vectores de
+# una versión con ids/payloads de otra.
+
+def _coll_dir(collection: str) -> str:
+    return os.path.join(settings.LOCAL_INDEX_DIR, collection)
+
+def _pointer(collection: str) -> str:
+    return os.path.join(_coll_dir(collection), "CURRENT")
+
+def _paths(collection: str, version: str):
+    base = os.path.join(_coll_dir(collection), version)
+    return os.path.join(base, "vectors.f32"), os.path.join(base, "meta.json")
+
+def _prune_versions(collection: str, keep: List[str]):
+    # la versión anterior se conserva: un lector puede haber leído CURRENT justo antes del swap
+    for name in os.listdir(_coll_dir(collection)):
+        path = os.path.join(_coll_dir(collection), name)
+        if name not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def write_snapshot(client: QdrantClient, collection: str | None = None, batch: int = 1024) -> int:
+    """
+    Vuelca la colección (vectores + payload que usa `search`) a un directorio de versión
+    nuevo y lo publica en CURRENT. Los vectores se escriben a medida que se scrollean.
+    Devuelve la cantidad de puntos.
+    """
+    coll = collection or settings.QDRANT_COLLECTION
+    version = f"{time.time_ns()}-{os.getpid()}"
+    vec_path, meta_path = _paths(coll, version)
+    os.makedirs(os.path.dirname(vec_path), exist_ok=True)
+    payloads: List[Dict[str, Any]] = []
+    dim = 0
+    offset = None
+    with open(vec_path, "wb") as f:
+        while True:
+            points, offset = client.scroll(collection_name=coll, limit=batch, offset=offset,
+                                           with_payload=SEARCH_PAYLOAD_FIELDS, with_vectors=True)
+            if points:
+                vecs = np.asarray([p.vector for p in points], dtype=np.float32)
+                # Qdrant ya los guarda normalizados con COSINE; por las dudas
+                norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+                vecs /= np.where(norms > 0, norms, 1)
+                dim = vecs.shape[1]
+                f.write(vecs.tobytes())
+                payloads.extend(p.payload or {} for p in points)
+            if offset is None:
+                break
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "count": len(payloads), "payloads": payloads}, f, ensure_ascii=False)
+    previous = _current_version(coll)
+    with open(_pointer(coll) + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(_pointer(coll) + ".tmp", _pointer(coll))
+    _prune_versions(coll, keep=[version, previous])
+    logger.info(f"snapshot local de {coll}: {len(payloads)} puntos, dim={dim} (versión {version})")
+    return len(payloads)
+
+def _current_version(collection: str) -> str | None:
+    try:
+        with open(_pointer(collection), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def delete_snapshot(collection: str | None = None):
+    coll = collection or settings.QDRANT_COLLECTION
+    shutil.rmtree(_coll_dir(coll), ignore_errors=True)
+    with _lock:
+        _indexes.pop(coll, None)
+
+class LocalIndex:
+    def __init__(self, vec_path: str, meta_path: str):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.payloads: List[Dict[str, Any]] = meta["payloads"]
+        n, dim = meta["count"], meta["dim"]
+        self.matrix = (np.memmap(vec_path, dtype=np.float32, mode="r", shape=(n, dim))
+                       if n and dim else np.zeros((0, dim), dtype=np.float32))
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        for field in INDEXED_FIELDS:
+            by_value: Dict[str, List[int]] = {}
+            for i, p in enumerate(self.payloads):
+                if p.get(field) is not None:
+                    by_value.setdefault(str(p[field]), []).append(i)
+            maps = {}
+            for value, rows in by_value.items():
+                bm = np.zeros(n, dtype=bool)
+                bm[rows] = True
+                maps[value] = bm
+            self.bitmaps[field] = maps
+        self._empty = np.zeros(n, dtype=bool)
+
+    def _mask(self, flt: Optional[Filter]) -> np.ndarray:
+        mask = np.ones(len(self.payloads), dtype=bool)
+        for c in (flt.must if flt else None) or []:
+            if not isinstance(c, FieldCondition) or c.key not in self.bitmaps:
+                raise ValueError(f"Condición no soportada por el índice local: {c}")
+            maps = self.bitmaps[c.key]
+            if isinstance(c.match, MatchValue):
+                mask &= maps.get(str(c.match.value), self._empty)
+            elif isinstance(c.match, MatchAny):
+                any_of = np.zeros_like(mask)
+                for v in c.match.any:
+                    any_of |= maps.get(str(v), self._empty)
+                mask &= any_of
+            else:
+                raise ValueError(f"Match no soportado por el índice local: {c.match}")
+        return mask
+
+    def search(self, req: QueryRequest) -> List[ScoredPoint]:
+        mask = self._mask(req.filter)
+        k = min(req.limit, int(mask.sum()))
+        if k <= 0:
+            return []
+        vec = req.query.nearest if isinstance(req.query, NearestQuery) else req.query
+        q = np.asarray(vec, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scores = self.matrix @ q
+        scores[~mask] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        fields = req.with_payload if isinstance(req.with_payload, list) else None
+        out = []
+        for i in top:
+            p = self.payloads[i]
+            if fields is not None:
+                p = {f: p[f] for f in fields if f in p}
+            out.append(ScoredPoint(id=p.get("point_uuid") or int(i), version=0, score=float(scores[i]), payload=p))
+        return out
+
+_indexes: Dict[str, tuple] = {}
+_lock = threading.Lock()
+
+def _stamp(collection: str):
+    # CURRENT se reemplaza con os.replace: cada publicación es un inodo nuevo
+    st = os.stat(_pointer(collection))  # FileNotFoundError si todavía no hay snapshot
+    return st.st_ino, st.st_mtime_ns
+
+def needs_reload(collection: str | None = None) -> bool:
+    """True si get_index va a tener que leer un snapshot de disco (o no hay ninguno)."""
+    coll = collection or settings.QDRANT_COLLECTION
+    cached = _indexes.get(coll)
+    try:
+        return not cached or cached[0] != _stamp(coll)
+    except FileNotFoundError:
+        return True
+
+def get_index(collection: str | None = None) -> LocalIndex:
+    """Índice de la colección, recargado si se publicó otro snapshot (otra ingesta u otro proceso)."""
+    coll = collection or settings.QDRANT_COLLECTION
+    stamp = _stamp(coll)
+    cached = _indexes.get(coll)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with _lock:
+        cached = _indexes.get(coll)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        version = _current_version(coll)
+        if version is None:
+            raise FileNotFoundError(_pointer(coll))
+        idx = LocalIndex(*_paths(coll, version))
+        _indexes[coll] = (stamp, idx)
+        return idx
+
+def search_batch(collection_name: str, requests: List[QueryRequest]) -> List[List[ScoredPoint]]:
+    """Como QdrantClient.query_batch_points (sólo búsqueda densa), con los puntos de cada respuesta."""
+    idx = get_index(collection_name)
+    return [idx.search(r) for r in requests]
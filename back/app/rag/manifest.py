@@ -0,0 +1,94 @@
+import os, sqlite3, threading, hashlib
+from typing import Dict, Optional
+
+# Manifiesto de ingesta por bot: huella de cada archivo y row_hash de cada chunk
+# indexado, para que la ingesta incremental sepa qué cambió.
+MANIFEST_DB_PATH = os.environ.get("INGEST_MANIFEST_PATH", "/app/state/ingest_manifest.db")
+
+_lock = threading.Lock()
+
+def _conn():
+    os.makedirs(os.path.dirname(MANIFEST_DB_PATH), exist_ok=True)
+    cx = sqlite3.connect(MANIFEST_DB_PATH)
+    cx.row_factory = sqlite3.Row
+    return cx
+
+def ensure_schema():
+    with _lock, _conn() as cx:
+        cx.executescript("""
+        CREATE TABLE IF NOT EXISTS files (
+          bot_id  TEXT NOT NULL,
+          fname   TEXT NOT NULL,
+          mtime   REAL NOT NULL,
+          size    INTEGER NOT NULL,
+          sha256  TEXT NOT NULL,
+          cfg_hash TEXT NOT NULL,               -- hash de _schema_map.json al momento de ingestar
+          PRIMARY KEY (bot_id, fname)
+        );
+        CREATE TABLE IF NOT EXISTS rows (
+          bot_id   TEXT NOT NULL,
+          fname    TEXT NOT NULL,
+          chunk_id TEXT NOT NULL,
+          row_hash TEXT NOT NULL,
+          PRIMARY KEY (bot_id, chunk_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_rows_file ON rows (bot_id, fname);
+        """)
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def schema_map_hash(xlsx_dir: str) -> str:
+    p = os.path.join(xlsx_dir, "_schema_map.json")
+    return file_sha256(p) if os.path.isfile(p) else ""
+
+def get_files(bot_id: str) -> Dict[str, sqlite3.Row]:
+    ensure_schema()
+    with _lock, _conn() as cx:
+        cur = cx.execute("SELECT fname, mtime, size, sha256, cfg_hash FROM files WHERE bot_id=?", (bot_id,))
+        return {r["fname"]: r for r in cur.fetchall()}
+
+def get_rows(bot_id: str, fname: str) -> Dict[str, str]:
+    ensure_schema()
+    with _lock, _conn() as cx:
+        cur = cx.execute("SELECT chunk_id, row_hash FROM rows WHERE bot_id=? AND fname=?", (bot_id, fname))
+        return {r["chunk_id"]: r["row_hash"] for r in cur.fetchall()}
+
+def save_file(bot_id: str, fname: str, *, mtime: float, size: int, sha256: str, cfg_hash: str,
+              rows: Optional[Dict[str, str]] = None):
+    """Registra la huella del archivo; si se pasan `rows` (chunk_id -> row_hash) reemplazan las anteriores."""
+    ensure_schema()
+    with _lock, _conn() as cx:
+        cx.execute(
+            "INSERT OR REPLACE INTO files (bot_id, fname, mtime, size, sha256, cfg_hash) VALUES (?,?,?,?,?,?)",
+            (bot_id, fname, mtime, size, sha256, cfg_hash),
+        )
+        if rows is not None:
+            cx.execute("DELETE FROM rows WHERE bot_id=? AND fname=?", (bot_id, fname))
+            cx.executemany(
+                "INSERT OR REPLACE INTO rows (bot_id, fname, chunk_id, row_hash) VALUES (?,?,?,?)",
+                [(bot_id, fname, ck, rh) for ck, rh in rows.items()],
+            )
+        cx.commit()
+
+def forget_file(bot_id: str, fname: str):
+    ensure_schema()
+    with _lock, _conn() as cx:
+        cx.execute("DELETE FROM files WHERE bot_id=? AND fname=?", (bot_id, fname))
+        cx.execute("DELETE FROM rows WHERE bot_id=? AND fname=?", (bot_id, fname))
+        cx.commit()
+
+def reset(bot_id: Optional[str] = None):
+    ensure_schema()
+    with _lock, _conn() as cx:
+        if bot_id:
+            cx.execute("DELETE FROM files WHERE bot_id=?", (bot_id,))
+            cx.execute("DELETE FROM rows WHERE bot_id=?", (bot_id,))
+        else:
+            cx.execute("DELETE FROM files")
+            cx.execute("DELETE FROM rows")
+        cx.commit()
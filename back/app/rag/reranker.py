@@ -1,29 +1,201 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from concurrent.futures import Future
 from sentence_transformers import CrossEncoder
-import threading, os
+import asyncio, queue, threading, time, os
 from ..config import settings
+from ..utils.logging import logger
+from ..utils.lru import LRUCache
+from .schema import hash_str
 
 _model = None
 _lock = threading.Lock()
 
-def _get_model() -> CrossEncoder:
+def _load_torch(quantize: bool) -> CrossEncoder:
+    # Forzamos tokenizer "slow" para evitar el conversor que pide tiktoken
+    model = CrossEncoder(
+        settings.RERANK_MODEL,
+        max_length=settings.RERANK_MAX_LENGTH,
+        tokenizer_args={"use_fast": False}
+    )
+    if quantize:
+        import torch
+        # cuantización dinámica int8 de las capas lineales (CPU)
+        model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+class _OnnxCrossEncoder:
+    """
+    CrossEncoder sobre ONNX Runtime (vía optimum). Exporta el modelo la primera vez
+    a RERANK_ONNX_DIR y, si `quantize`, guarda además una versión int8 dinámica.
+    predict() devuelve lo mismo que CrossEncoder.predict (sigmoide sobre el logit).
+    """
+    def __init__(self, name: str, quantize: bool, max_length: int = 512):
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError("RERANK_BACKEND=onnx requiere `optimum[onnxruntime]`") from e
+
+        base_dir = os.path.join(settings.RERANK_ONNX_DIR, name.replace("/", "__"))
+        if not os.path.isfile(os.path.join(base_dir, "model.onnx")):
+            logger.info(f"rerank: exportando {name} a ONNX en {base_dir}")
+            ORTModelForSequenceClassification.from_pretrained(name, export=True).save_pretrained(base_dir)
+            AutoTokenizer.from_pretrained(name, use_fast=False).save_pretrained(base_dir)
+        model_dir, file_name = base_dir, "model.onnx"
+        if quantize:
+            model_dir, file_name = base_dir + "-int8", "model_quantized.onnx"
+            if not os.path.isfile(os.path.join(model_dir, file_name)):
+                logger.info(f"rerank: cuantizando (int8 dinámico) en {model_dir}")
+                qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+                ORTQuantizer.from_pretrained(base_dir).quantize(save_dir=model_dir, quantization_config=qconfig)
+        self.model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(base_dir, use_fast=False)
+        self.max_length = max_length
+
+    def predict(self, pairs, batch_size: int = 32):
+        import numpy as np
+        out = []
+        for j in range(0, len(pairs), batch_size):
+            chunk = pairs[j:j + batch_size]
+            enc = self.tokenizer(
+                [q for q, _ in chunk], [d for _, d in chunk],
+                padding=True, truncation="only_second", max_length=self.max_length, return_tensors="np",
+            )
+            logits = self.model(**enc).logits
+            logits = np.asarray(logits, dtype=np.float32).reshape(len(chunk), -1)[:, 0]
+            out.append(1.0 / (1.0 + np.exp(-logits)))
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+def load_model(backend: str | None = None):
+    """Instancia el reranker según RERANK_BACKEND (o `backend`). No cachea."""
+    backend = (backend or settings.RERANK_BACKEND).lower()
+    if backend == "torch":
+        return _load_torch(quantize=False)
+    if backend == "torch-int8":
+        return _load_torch(quantize=True)
+    if backend in ("onnx", "onnx-int8"):
+        return _OnnxCrossEncoder(settings.RERANK_MODEL, quantize=backend == "onnx-int8",
+                                 max_length=settings.RERANK_MAX_LENGTH)
+    raise ValueError(f"RERANK_BACKEND desconocido: {backend}")
+
+def _get_model():
     global _model
     if _model is None:
         with _lock:
             if _model is None:
-                # Forzamos tokenizer "slow" para evitar el conversor que pide tiktoken
-                _model = CrossEncoder(
-                    "BAAI/bge-reranker-base",
-                    tokenizer_args={"use_fast": False}
-                )
+                _model = load_model()
     return _model
 
-def rerank(query: str, docs: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
-    if not settings.ENABLE_RERANKER or not docs:
-        return docs[:top_k]
-    model = _get_model()
-    pairs = [(query, d["texto"]) for d in docs]
-    scores = model.predict(pairs).tolist()
+class _RerankBatcher:
+    """
+    Worker único que junta los pares (query, doc) de requests concurrentes en
+    micro-batches: toma el primer pedido de la cola, espera hasta
+    RERANK_BATCH_WINDOW_MS (o hasta RERANK_MAX_BATCH_PAIRS pares) por más pedidos,
+    corre un solo predict y reparte los scores a cada Future.
+    """
+    def __init__(self):
+        self._q: "queue.Queue[Tuple[List[Tuple[str, str]], Future]]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="rerank-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, pairs: List[Tuple[str, str]]) -> Future:
+        fut: Future = Future()
+        self._ensure_started()
+        self._q.put((pairs, fut))
+        return fut
+
+    def _collect(self):
+        batch = [self._q.get()]
+        n = len(batch[0][0])
+        deadline = time.monotonic() + settings.RERANK_BATCH_WINDOW_MS / 1000.0
+        while n < settings.RERANK_MAX_BATCH_PAIRS:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n += len(item[0])
+        return batch
+
+    def _loop(self):
+        if settings.RERANK_TORCH_THREADS > 0:
+            import torch
+            torch.set_num_threads(settings.RERANK_TORCH_THREADS)
+        while True:
+            batch = self._collect()
+            batch = [(pairs, fut) for pairs, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                all_pairs = [p for pairs, _ in batch for p in pairs]
+                scores = _get_model().predict(all_pairs, batch_size=settings.RERANK_PREDICT_BATCH_SIZE).tolist()
+            except Exception as e:
+                logger.exception("rerank: falló el micro-batch")
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            off = 0
+            for pairs, fut in batch:
+                fut.set_result(scores[off:off + len(pairs)])
+                off += len(pairs)
+
+_batcher = _RerankBatcher()
+
+# Score por (hash de la query normalizada, chunk_id, row_hash): si la fila no cambió,
+# la misma pregunta sobre el mismo chunk da el mismo score.
+_score_cache = LRUCache(settings.RERANK_CACHE_MAX_ENTRIES)
+
+def _truncate(text: str) -> str:
+    """
+    Recorte barato por caracteres antes de tokenizar (filas anchas de planillas).
+    El presupuesto real en tokens lo aplica el tokenizer con RERANK_MAX_LENGTH.
+    """
+    limit = settings.RERANK_MAX_DOC_CHARS
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" | ", 0, limit)  # preferimos cortar entre columnas
+    return text[:cut if cut > limit // 2 else limit]
+
+def _cache_key(qhash: str, d: Dict[str, Any]):
+    m = d.get("metadata") or {}
+    if not m.get("chunk_id") or not m.get("row_hash"):
+        return None
+    return (qhash, m["chunk_id"], m["row_hash"])
+
+def _plan(query: str, docs: List[Dict[str, Any]]):
+    """Devuelve (scores con None en los misses, keys, índices a puntuar, pares a puntuar)."""
+    qhash = hash_str(" ".join(query.lower().split()))
+    scores: List[float | None] = []
+    keys, todo, pairs = [], [], []
+    for i, d in enumerate(docs):
+        k = _cache_key(qhash, d)
+        s = _score_cache.get(k) if k else None
+        scores.append(s)
+        keys.append(k)
+        if s is None:
+            todo.append(i)
+            pairs.append((query, _truncate(d["texto"])))
+    return scores, keys, todo, pairs
+
+def _fill(scores, keys, todo, new_scores):
+    for i, s in zip(todo, new_scores):
+        scores[i] = s
+        if keys[i]:
+            _score_cache.put(keys[i], s)
+    return scores
+
+def _apply_scores(docs: List[Dict[str, Any]], scores: List[float], top_k: int) -> List[Dict[str, Any]]:
     rescored = []
     for d, s in zip(docs, scores):
         x = dict(d)
@@ -31,3 +203,27 @@ def rerank(query: str, docs: List[Dict[str, Any]], top_k: int) -> List[Dict[str,
         rescored.append(x)
     rescored.sort(key=lambda x: x["rerank_score"], reverse=True)
     return rescored[:top_k]
+
+def rerank(query: str, docs: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    if not settings.ENABLE_RERANKER or not docs:
+        return docs[:top_k]
+    scores, keys, todo, pairs = _plan(query, docs)
+    if pairs:
+        _fill(scores, keys, todo, _batcher.submit(pairs).result())
+    return _apply_scores(docs, scores, top_k)
+
+async def rerank_async(query: str, docs: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Como rerank() pero esperando el micro-batch sin ocupar un hilo."""
+    if not settings.ENABLE_RERANKER or not docs:
+        return docs[:top_k]
+    scores, keys, todo, pairs = _plan(query, docs)
+    if pairs:
+        _fill(scores, keys, todo, await asyncio.wrap_future(_batcher.submit(pairs)))
+    return _apply_scores(docs, scores, top_k)
+
+def warmup():
+    """Carga el modelo y corre una inferencia de prueba a través del worker."""
+    if not settings.ENABLE_RERANKER:
+        return
+    _get_model()
+    _batcher.submit([("warmup", "warmup")]).result()
@@ -1,13 +1,19 @@
-from typing import List, Dict, Any, Optional
-from qdrant_client import QdrantClient
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional
+import asyncio, queue, threading
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
 from qdrant_client.http.models import Condition 
 from uuid import uuid4
-from .embedder import get_embedding_dim, embed_texts, embed_query
+from .embedder import get_embedding_dim, embed_texts, embed_query, embed_query_async
+from . import lexical, local_index
 from ..config import settings
+from ..utils.executors import run_io
+from ..utils.logging import logger
 from ..schemas.chat import ChatMeta
-from .schema import uuid_from_chunk
-from qdrant_client.http.models import MatchAny
+from .schema import INDEXED_FIELDS, SEARCH_PAYLOAD_FIELDS, SLIM_PAYLOAD_DROP, uuid_from_chunk
+from qdrant_client.http.models import MatchAny, PointIdsList, QueryRequest
+from qdrant_client.http.models import PayloadSchemaType, QuantizationSearchParams, ScalarQuantization
+from qdrant_client.http.models import ScalarQuantizationConfig, ScalarType, SearchParams
 
 MONETARY_KWS = [
     "matric", "arancel", "cuota", "mensual", "$", "pago", "plan",
@@ -15,24 +21,56 @@ MONETARY_KWS = [
     "valor", "precio", "costo", "coste", "importe"
 ]
 
+def _quantization_config():
+    if settings.QDRANT_QUANTIZATION == "int8":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if settings.QDRANT_QUANTIZATION not in ("", "none"):
+        raise ValueError(f"QDRANT_QUANTIZATION desconocido: {settings.QDRANT_QUANTIZATION}")
+    return None
+
+def _search_params() -> SearchParams | None:
+    # con vectores cuantizados se re-puntúa el top con los originales
+    if _quantization_config() is None:
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True))
+
+def ensure_payload_indexes(client: QdrantClient, collection: str | None = None):
+    coll = collection or settings.QDRANT_COLLECTION
+    existing = client.get_collection(coll).payload_schema or {}
+    for field in INDEXED_FIELDS:
+        if field not in existing:
+            client.create_payload_index(collection_name=coll, field_name=field,
+                                        field_schema=PayloadSchemaType.KEYWORD)
+
 def ensure_collection(client: QdrantClient, collection: str | None = None):
+    """
+    Crea la colección si no existe (con vectores en disco / cuantizados según
+    QDRANT_ON_DISK / QDRANT_QUANTIZATION) y se asegura de que estén los índices de
+    payload; a colecciones ya creadas sólo se les agregan los índices que falten.
+    """
     coll = collection or settings.QDRANT_COLLECTION
     existing = client.get_collections()
     names = [c.name for c in existing.collections]
-    if coll in names:
-        return
-    dim = get_embedding_dim()
-    client.create_collection(
-        collection_name=coll,
-        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
-    )
+    if coll not in names:
+        dim = get_embedding_dim()
+        client.create_collection(
+            collection_name=coll,
+            vectors_config=VectorParams(size=dim, distance=Distance.COSINE, on_disk=settings.QDRANT_ON_DISK),
+            on_disk_payload=settings.QDRANT_ON_DISK,
+            quantization_config=_quantization_config(),
+        )
+    ensure_payload_indexes(client, coll)
+
+def point_id(bot_id: str, chunk_id: str) -> str:
+    return uuid_from_chunk(f"{bot_id}:{chunk_id}")
 
-def upsert_records(client: QdrantClient, records: List[Dict[str, Any]], collection: str | None = None, batch: int = 128):
+def delete_chunks(client: QdrantClient, bot_id: str, chunk_ids: List[str], collection: str | None = None, batch: int = 512):
     coll = collection or settings.QDRANT_COLLECTION
-    ensure_collection(client, coll)
-    texts = [r["texto"] for r in records]
-    vectors = embed_texts(texts, model=settings.GEMINI_EMBED_MODEL)
+    ids = [point_id(bot_id, ck) for ck in chunk_ids]
+    for j in range(0, len(ids), batch):
+        client.delete(collection_name=coll, points_selector=PointIdsList(points=ids[j:j + batch]))
 
+def _points(records: List[Dict[str, Any]], vectors: List[List[float]]) -> List[PointStruct]:
     points: List[PointStruct] = []
     for vec, rec in zip(vectors, records):
         meta = rec["metadata"]
@@ -40,20 +78,149 @@ def upsert_records(client: QdrantClient, records: List[Dict[str, Any]], collecti
         bot = meta.get("bot_id", "default")
         
         # Incluir bot en el ID deterministico para aislar colecciones logicas por bot
-        pid = uuid_from_chunk(f"{bot}:{chunk_id}") if chunk_id else str(uuid4())
+        pid = point_id(bot, chunk_id) if chunk_id else str(uuid4())
         
         meta.setdefault("point_uuid", pid)
+        payload = meta
+        if settings.QDRANT_SLIM_PAYLOAD:
+            # copia: el record original (con extras) lo sigue usando el catálogo
+            payload = {k: v for k, v in meta.items() if k not in SLIM_PAYLOAD_DROP}
         
         points.append(PointStruct(
             id=pid,
             vector=vec,
-            payload=meta
+            payload=payload
         ))
-        if len(points) >= batch:
-            client.upsert(collection_name=coll, points=points)
-            points = []
-    if points:
-        client.upsert(collection_name=coll, points=points)
+    return points
+
+def rebatch(records: Iterable[Dict[str, Any]], size: int | None = None) -> Iterator[List[Dict[str, Any]]]:
+    """Agrupa un stream de records en listas de `size` (default INGEST_BATCH_ROWS)."""
+    size = size or settings.INGEST_BATCH_ROWS or settings.EMBED_BATCH_SIZE * settings.EMBED_CONCURRENCY
+    buf: List[Dict[str, Any]] = []
+    for r in records:
+        buf.append(r)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+_DONE = object()
+
+class IngestCancelled(Exception):
+    """Se pidió cancelar la ingesta (ver upsert_stream(cancel=...))."""
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _drain(q: queue.Queue, stop: threading.Event) -> Iterator[Any]:
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+def _pump(source: Iterable[Any], dst: queue.Queue, stop: threading.Event, failed: list, fn=None):
+    """Una etapa del pipeline: consume `source`, aplica `fn` y encola el resultado en `dst`."""
+    try:
+        for item in source:
+            if not _put(dst, fn(item) if fn else item, stop):
+                return
+        _put(dst, _DONE, stop)
+    except BaseException as e:
+        failed.append(e)
+        stop.set()
+    finally:
+        close = getattr(source, "close", None)
+        if close:
+            close()  # cierra el generador (y el pool de lectura que tenga abierto)
+
+def upsert_stream(
+    client: QdrantClient,
+    batches: Iterable[List[Dict[str, Any]]],
+    collection: str | None = None,
+    *,
+    batch: int = 128,
+    on_batch=None,
+    depth: int | None = None,
+    progress: Callable[[str, int], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> int:
+    """
+    Pipeline de ingesta por etapas: leer/chunkear (lo que produzca `batches`) -> embeber
+    -> upsert, cada etapa en su thread y con colas acotadas (`depth`, default
+    INGEST_QUEUE_DEPTH) entre medio. Mientras se embebe el batch N se parsea el N+1 y se
+    upsertea el N-1, y como mucho hay ~2*depth+3 batches vivos: la memoria no depende del
+    tamaño del corpus. `on_batch(records)` se llama después de upsertear cada batch y
+    `progress(etapa, n)` cuando pasan n records por "parsed", "embedded" o "upserted".
+    Devuelve la cantidad de records upserteados; si una etapa falla, se corta todo y se
+    propaga el error. Si se setea `cancel`, el pipeline para en el próximo batch y
+    levanta IngestCancelled.
+    """
+    coll = collection or settings.QDRANT_COLLECTION
+    depth = max(1, depth or settings.INGEST_QUEUE_DEPTH)
+    parsed: queue.Queue = queue.Queue(maxsize=depth)
+    embedded: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    failed: list = []
+
+    def tick(stage: str, records: List[Dict[str, Any]]):
+        if cancel is not None and cancel.is_set():
+            raise IngestCancelled()
+        if progress:
+            progress(stage, len(records))
+
+    def parse():
+        for records in batches:
+            tick("parsed", records)
+            yield records
+
+    def embed(records):
+        vectors = embed_texts([r["texto"] for r in records], model=settings.GEMINI_EMBED_MODEL)
+        tick("embedded", records)
+        return records, vectors
+
+    stages = [
+        threading.Thread(target=_pump, args=(parse(), parsed, stop, failed), name="ingest-parse", daemon=True),
+        threading.Thread(target=_pump, args=(_drain(parsed, stop), embedded, stop, failed, embed), name="ingest-embed", daemon=True),
+    ]
+    for t in stages:
+        t.start()
+
+    total = 0
+    try:
+        ensured = False
+        for records, vectors in _drain(embedded, stop):
+            if not ensured:
+                ensure_collection(client, coll)
+                ensured = True
+            points = _points(records, vectors)
+            for j in range(0, len(points), batch):
+                client.upsert(collection_name=coll, points=points[j:j + batch])
+            total += len(records)
+            if on_batch:
+                on_batch(records)
+            tick("upserted", records)
+    finally:
+        stop.set()
+        for t in stages:
+            t.join()
+    if failed:
+        raise failed[0]
+    return total
+
+def upsert_records(client: QdrantClient, records: List[Dict[str, Any]], collection: str | None = None, batch: int = 128,
+                   progress: Callable[[str, int], None] | None = None, cancel: threading.Event | None = None):
+    upsert_stream(client, rebatch(records), collection, batch=batch, progress=progress, cancel=cancel)
 
 def count_points(client: QdrantClient, collection: str | None = None) -> int:
     coll = collection or settings.QDRANT_COLLECTION
@@ -94,43 +261,27 @@ def _build_filter(
 def _has_domain(results, dom: str) -> bool:
     return any((sp.payload or {}).get("domain") == dom for sp in results)
 
-def search(client: QdrantClient, query: str, meta, top_k: int, *, bot_id: str, allowed_domains: Optional[list[str]], ensure_domains: Optional[list[str]] = None) -> List[Dict[str, Any]]:
+def _with_money_domain(query: str, ensure_domains: Optional[list[str]]) -> list[str]:
     ensure_domains = ensure_domains or []
-    qvec = embed_query(query, model=settings.GEMINI_EMBED_MODEL)
-
-    # 1) pasada estricta (respeta periodo si viene)
-    f1 = _build_filter(meta, bot_id=bot_id, allowed_domains=allowed_domains or [], strict_period=True)
-    res1 = client.search(collection_name=settings.QDRANT_COLLECTION, query_vector=qvec, limit=top_k, with_payload=True, query_filter=f1)
-
-    # 2) detectar si la query es monetaria
     qlow = (query or "").lower()
     wants_money = any(k in qlow for k in MONETARY_KWS)
     if wants_money and "aranceles" not in ensure_domains:
         ensure_domains = ["aranceles"] + ensure_domains
+    return ensure_domains
 
-    # 3) para cualquier dominio "asegurado" que falte, buscamos una 2ª vez relajando período y exigiendo ese dominio
-    extra = []
-    for dom in ensure_domains:
-        if not _has_domain(res1, dom):
-            f2 = _build_filter(
-                meta,
-                bot_id=bot_id,
-                allowed_domains=allowed_domains or [],
-                strict_period=False,           # 🔓 período relajado
-                required_domain=dom,
-                include_facultad=False,        # ❌ sin facultad
-                include_modalidad=False        # ❌ sin modalidad
-            )
-            r2 = client.search(
-                collection_name=settings.QDRANT_COLLECTION,
-                query_vector=qvec,
-                limit=max(3, top_k // 2),
-                with_payload=True,
-                query_filter=f2
-            )
-            extra.extend(r2)
+def _relaxed_filter(meta, *, bot_id: str, allowed_domains: Optional[list[str]], dom: str):
+    return _build_filter(
+        meta,
+        bot_id=bot_id,
+        allowed_domains=allowed_domains or [],
+        strict_period=False,           # 🔓 período relajado
+        required_domain=dom,
+        include_facultad=False,        # ❌ sin facultad
+        include_modalidad=False        # ❌ sin modalidad
+    )
 
-    # 4) merge + dedupe por chunk_id/point_uuid
+def _merge_hits(res1, extra, top_k: int) -> List[Dict[str, Any]]:
+    # merge + dedupe por chunk_id/point_uuid
     seen = set()
     merged = []
     for sp in (res1 + extra):
@@ -141,7 +292,7 @@ def search(client: QdrantClient, query: str, meta, top_k: int, *, bot_id: str, a
         seen.add(ck)
         merged.append(sp)
 
-    # 5) salida (igual que antes)
+    # salida (igual que antes)
     out: List[Dict[str, Any]] = []
     for sp in merged[:top_k]:
         payload = sp.payload or {}
@@ -150,4 +301,132 @@ def search(client: QdrantClient, query: str, meta, top_k: int, *, bot_id: str, a
             "metadata": payload,
             "score": float(sp.score or 0.0),
         })
-    return out
\ No newline at end of file
+    return out
+
+def _batch_requests(query: str, meta, qvec: List[float], top_k: int, *, bot_id: str, allowed_domains: Optional[list[str]], ensure_domains: Optional[list[str]]):
+    """
+    Arma en un solo batch la pasada estricta y una pasada relajada por cada dominio
+    asegurado. Las relajadas se piden de forma especulativa: después sólo se usan
+    las de dominios que no aparecieron en la estricta (misma semántica que hacerlas
+    en serie, pero en un único round-trip).
+    """
+    f1 = _build_filter(meta, bot_id=bot_id, allowed_domains=allowed_domains or [], strict_period=True)
+    ensure_domains = _with_money_domain(query, ensure_domains)
+    params = _search_params()
+    requests = [QueryRequest(query=qvec, filter=f1, limit=top_k, with_payload=SEARCH_PAYLOAD_FIELDS, params=params)]
+    for dom in ensure_domains:
+        requests.append(QueryRequest(
+            query=qvec,
+            filter=_relaxed_filter(meta, bot_id=bot_id, allowed_domains=allowed_domains, dom=dom),
+            limit=max(3, top_k // 2),
+            with_payload=SEARCH_PAYLOAD_FIELDS,
+            params=params,
+        ))
+    return ensure_domains, requests
+
+def _merge_batch(ensure_domains: list[str], results, top_k: int) -> List[Dict[str, Any]]:
+    res1, passes = results[0], results[1:]
+    extra = []
+    for dom, r2 in zip(ensure_domains, passes):
+        if not _has_domain(res1, dom):
+            extra.extend(r2)
+    return _merge_hits(res1, extra, top_k)
+
+def _doc_key(d: Dict[str, Any]):
+    m = d.get("metadata") or {}
+    return m.get("chunk_id") or m.get("point_uuid")
+
+def _rrf(rankings: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion: score = sum(1 / (RAG_RRF_K + rank)) sobre cada lista."""
+    k = settings.RAG_RRF_K
+    scores: Dict[Any, float] = {}
+    docs: Dict[Any, Dict[str, Any]] = {}
+    for hits in rankings:
+        for rank, d in enumerate(hits, start=1):
+            key = _doc_key(d)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, d)
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [{**docs[key], "score": scores[key]} for key in best]
+
+def _lexical_search(query: str, meta, top_k: int, *, bot_id: str, allowed_domains: Optional[list[str]]) -> List[Dict[str, Any]]:
+    # mismo filtro que la pasada estricta; si el índice léxico falla seguimos sólo con densa
+    flt = _build_filter(meta, bot_id=bot_id, allowed_domains=allowed_domains or [], strict_period=True)
+    try:
+        return lexical.search(query, flt, top_k)
+    except Exception as e:
+        logger.warning(f"búsqueda léxica falló: {e}")
+        return []
+
+def _local_search_batch(requests: List[QueryRequest]):
+    # None si todavía no hay snapshot (p.ej. antes de la primera ingesta): se usa Qdrant
+    try:
+        return local_index.search_batch(settings.QDRANT_COLLECTION, requests)
+    except FileNotFoundError:
+        logger.warning("RETRIEVAL_BACKEND=local sin snapshot; busco en Qdrant")
+        return None
+
+def _search_batch(client: QdrantClient, requests: List[QueryRequest]):
+    # lista de ScoredPoint por request, venga del índice local o de query_batch_points
+    if settings.RETRIEVAL_BACKEND == "local":
+        results = _local_search_batch(requests)
+        if results is not None:
+            return results
+    responses = client.query_batch_points(collection_name=settings.QDRANT_COLLECTION, requests=requests)
+    return [r.points for r in responses]
+
+async def _search_batch_async(client: AsyncQdrantClient, requests: List[QueryRequest]):
+    if settings.RETRIEVAL_BACKEND == "local":
+        # un producto matriz-vector sobre unos miles de filas: más barato que un salto de
+        # thread; sólo si hay que (re)cargar el snapshot de disco se va a un thread
+        if local_index.needs_reload(settings.QDRANT_COLLECTION):
+            results = await run_io(_local_search_batch, requests)
+        else:
+            results = _local_search_batch(requests)
+        if results is not None:
+            return results
+    responses = await client.query_batch_points(collection_name=settings.QDRANT_COLLECTION, requests=requests)
+    return [r.points for r in responses]
+
+def search(client: QdrantClient, query: str, meta, top_k: int, *, bot_id: str, allowed_domains: Optional[list[str]], ensure_domains: Optional[list[str]] = None) -> List[Dict[str, Any]]:
+    qvec = embed_query(query, model=settings.GEMINI_EMBED_MODEL)
+
+    # 1) pasada estricta (respeta periodo si viene) + 2) dominios asegurados (p.ej. aranceles
+    #    si la query es monetaria) con período relajado, todo en un solo query_batch_points
+    ensure_domains, requests = _batch_requests(query, meta, qvec, top_k, bot_id=bot_id,
+                                               allowed_domains=allowed_domains, ensure_domains=ensure_domains)
+    results = _search_batch(client, requests)
+
+    # 3) sólo sumamos las pasadas de dominios que faltaban, 4) merge + dedupe, 5) salida
+    dense = _merge_batch(ensure_domains, results, top_k)
+    if not settings.RAG_HYBRID:
+        return dense
+    # 6) fusión con BM25
+    lex = _lexical_search(query, meta, top_k, bot_id=bot_id, allowed_domains=allowed_domains)
+    return _rrf([dense, lex], top_k)
+
+async def search_async(client: AsyncQdrantClient, query: str, meta, top_k: int, *, bot_id: str, allowed_domains: Optional[list[str]], ensure_domains: Optional[list[str]] = None, qvec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+    """
+    Igual que `search` pero sobre AsyncQdrantClient. Acepta `qvec` ya calculado
+    (el handler lo embebe en paralelo con otras etapas). La búsqueda léxica corre en
+    paralelo con la densa.
+    """
+    lex_task = None
+    if settings.RAG_HYBRID:
+        lex_task = asyncio.ensure_future(run_io(_lexical_search, query, meta, top_k,
+                                                bot_id=bot_id, allowed_domains=allowed_domains))
+    try:
+        if qvec is None:
+            qvec = await embed_query_async(query, model=settings.GEMINI_EMBED_MODEL)
+
+        ensure_domains, requests = _batch_requests(query, meta, qvec, top_k, bot_id=bot_id,
+                                                   allowed_domains=allowed_domains, ensure_domains=ensure_domains)
+        results = await _search_batch_async(client, requests)
+    except BaseException:
+        if lex_task:
+            lex_task.cancel()
+        raise
+    dense = _merge_batch(ensure_domains, results, top_k)
+    if lex_task is None:
+        return dense
+    return _rrf([dense, await lex_task], top_k)
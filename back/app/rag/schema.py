@@ -2,7 +2,22 @@ import hashlib, unicodedata, re, time, os
 from typing import Optional
 import uuid
 
-SCHEMA_VERSION = 1
+SCHEMA_VERSION = 2  # 2: montos con miles "x.xxx" bien parseados (metadata.numbers)
+
+# Campos por los que filtra _build_filter: cada uno lleva índice keyword, así el
+# filtrado no recorre todos los puntos a medida que crece la colección.
+INDEXED_FIELDS = ("bot_id", "domain", "carrera_id", "carrera", "facultad", "modalidad", "periodo")
+
+# Lo único del payload que se usa después de `search` (prompt, rerank, caché, fuentes,
+# debug); el resto no viaja en la respuesta.
+SEARCH_PAYLOAD_FIELDS = [
+    "texto", "chunk_id", "point_uuid", "row_hash", "bot_id", "domain", "tipo", "titulo",
+    "carrera", "carrera_id", "facultad", "modalidad", "periodo",
+    "fuente_archivo", "fuente_hoja", "fuente_fila", "numbers",
+]
+
+# Metadata que queda fuera del payload con QDRANT_SLIM_PAYLOAD (sólo se usa al ingestar)
+SLIM_PAYLOAD_DROP = ("extras",)
 
 def slugify(s: str | None) -> str:
     if not s:
@@ -25,7 +40,18 @@ def make_chunk_id(doc_id: str, primary_key: str) -> str:
 def now_iso_utc() -> str:
     return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-_money_re = re.compile(r"[-+]?\d{1,3}(\.\d{3})*(,\d+)?|[-+]?\d+(\.\d+)?")
+# Montos en formato local: "$ 1.234.567,50", "$ 420.000", "62000,00", "120000". El
+# punto seguido de grupos de exactamente 3 dígitos es separador de miles; la coma, decimal.
+_money_re = re.compile(r"[-+]?(?:\d{1,3}(?:\.\d{3})+(?!\d)(?:,\d+)?|\d+(?:[.,]\d+)?)")
+_thousands_re = re.compile(r"[-+]?\d{1,3}(?:\.\d{3})+")
+
+def _money_str_to_float(num: str) -> Optional[float]:
+    if "," in num or _thousands_re.fullmatch(num):
+        num = num.replace(".", "").replace(",", ".")
+    try:
+        return float(num)
+    except Exception:
+        return None
 
 def parse_money_to_float(v: Optional[str | float | int]) -> Optional[float]:
     if v is None:
@@ -35,20 +61,10 @@ def parse_money_to_float(v: Optional[str | float | int]) -> Optional[float]:
     s = str(v).strip()
     if not s:
         return None
-    # Buscar número “latino” $ 62.000,00 o similar
     m = _money_re.search(s.replace(" ", ""))
     if not m:
         return None
-    num = m.group(0)
-    # Si tiene miles con punto y decimales con coma → normalizar
-    if "," in num and "." in num:
-        num = num.replace(".", "").replace(",", ".")
-    elif "," in num and "." not in num:
-        num = num.replace(",", ".")
-    try:
-        return float(num)
-    except Exception:
-        return None
+    return _money_str_to_float(m.group(0))
 
 def uuid_from_chunk(chunk_id: str) -> str:
     """
@@ -1,14 +1,23 @@
+import asyncio, json, time
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from ..schemas.chat import ChatRequest, ChatResponse, ChatMeta
-from ..deps import get_qdrant
+from ..schemas.common import Source
+from ..deps import get_async_qdrant
 from ..bots.profiles import get_profile
-from ..catalog.entities import resolve_carrera
-from ..rag.retriever import search
-from ..rag.reranker import rerank
+from ..catalog.entities import resolve_carrera_async
+from ..catalog import fees
+from ..rag import answer_cache
+from ..rag.embedder import embed_query_async
+from ..rag.retriever import search_async
+from ..rag.reranker import rerank_async
 from ..rag.prompts import build_prompt
 from ..models.gemini_client import generate_answer
+from ..models.gemini_stream import stream_answer
 from ..config import settings
-from ..session.store import load as load_ctx, save as save_ctx
+from ..session.store import load_async as load_ctx, save_async as save_ctx
+from ..utils.executors import run_io
+from ..utils.logging import logger
 
 router = APIRouter()
 
@@ -17,14 +26,39 @@ def _infer_periodo_from_text(text: str) -> str | None:
     m = re.search(r"(19|20)\d{2}", text or "")
     return m.group(0) if m else None
 
-@router.post("/", response_model=ChatResponse)
-def chat(req: ChatRequest, client = Depends(get_qdrant)):
+async def _timed(name: str, aw, timings: dict):
+    t0 = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+async def _prepare_turn(req: ChatRequest, client) -> dict:
+    """
+    Pasos comunes a /chat/ y /chat/stream: contexto, enriquecimiento de meta,
+    retrieve + rerank y prompt. Devuelve el estado del turno como dict;
+    `final_docs` vacío significa que no hubo hits.
+    """
     bot_id, profile = get_profile(req.bot_id)
     session_id = req.session_id or "anon"
     allowed_domains = profile.get("allowed_domains", [])
+    user_text = req.message.strip()
+    timings: dict = {}
 
-    # 1) cargar contexto previo
-    ctx, history = load_ctx(session_id, bot_id)  # ctx: dict; history: list[{role,content}]
+    # 1) en paralelo: contexto previo, detección de carrera y embedding de la pregunta
+    #    (son independientes entre sí; el tiempo hasta el retrieve es el de la más lenta).
+    #    El embedding va como task aparte: si la pregunta sale por el fast-path de
+    #    aranceles no hace falta esperarlo.
+    t0 = time.perf_counter()
+    embed_task = asyncio.ensure_future(_timed("embed_query", embed_query_async(user_text), timings))
+    try:
+        (ctx, history), det = await asyncio.gather(
+            _timed("load_ctx", load_ctx(session_id, bot_id), timings),  # ctx: dict; history: list[{role,content}]
+            _timed("resolve_carrera", resolve_carrera_async(bot_id, user_text), timings),
+        )
+    except BaseException:
+        embed_task.cancel()
+        raise
     # slots conocidos
     slot_carrera_id   = ctx.get("carrera_id")
     slot_carrera_name = ctx.get("carrera_nombre")
@@ -33,10 +67,8 @@ def chat(req: ChatRequest, client = Depends(get_qdrant)):
 
     # 2) enriquecer meta con lo detectado y/o contexto
     meta = req.meta or ChatMeta()
-    user_text = req.message.strip()
 
-    # carrera: intentar detectar de la pregunta
-    det = resolve_carrera(bot_id, user_text)
+    # carrera: lo detectado en la pregunta tiene prioridad
     if det:
         if det.get("carrera_id"):  # preferimos ID si existe
             meta.carrera_id = det["carrera_id"]
@@ -56,52 +88,117 @@ def chat(req: ChatRequest, client = Depends(get_qdrant)):
     if not meta.facultad and slot_facultad:
         meta.facultad = slot_facultad
 
+    context_slots = {
+        "carrera_nombre": meta.carrera or slot_carrera_name,
+        "periodo": meta.periodo or slot_periodo,
+        "facultad": meta.facultad or slot_facultad,
+    }
+    turn = {
+        "bot_id": bot_id, "profile": profile, "session_id": session_id,
+        "user_text": user_text, "ctx": ctx, "history": history,
+        "det": det, "meta": meta, "timings": timings,
+        "final_docs": [], "prompt": None, "cache_key": None, "cache_hit": False,
+        "fast_answer": None, "fast_path": None,
+    }
+
+    # 3a) fast-path de aranceles: pregunta de montos + carrera conocida -> tabla estructurada
+    if await _fee_fast_path(turn, allowed_domains, context_slots):
+        embed_task.cancel()
+        return turn
+
+    qvec = await embed_task
+    timings["pre_retrieval"] = round((time.perf_counter() - t0) * 1000, 1)
+
     # 3) retrieve + rerank (con meta enriquecida)
-    raw_hits = search(client, user_text, meta=meta, top_k=settings.RAG_TOP_K,
-                      bot_id=bot_id, allowed_domains=allowed_domains)
+    raw_hits = await _timed("search", search_async(client, user_text, meta=meta, top_k=settings.RAG_TOP_K,
+                                                   bot_id=bot_id, allowed_domains=allowed_domains, qvec=qvec), timings)
     if not raw_hits:
-        contact = profile.get("contact", {}) or {}
-        fallback = "No encontré información suficiente en la base para responder con confianza."
-        if any(contact.values()):
-            fallback += f" Podés escribir a {contact.get('email') or contact.get('phone') or 'Admisiones'}."
-        # actualizamos historial igual
-        history.append({"role":"user", "content": user_text})
-        history.append({"role":"assistant", "content": fallback})
-        save_ctx(session_id, bot_id, ctx, history)
-        return ChatResponse(answer=fallback, sources=[])
+        return turn
 
-    final_docs = rerank(user_text, raw_hits, top_k=settings.RAG_RERANK_K)
+    final_docs = await _timed("rerank", rerank_async(user_text, raw_hits, top_k=settings.RAG_RERANK_K), timings)
 
     # 4) prompt (+historial/contexto opcional)
-    prompt = build_prompt(user_text, final_docs,
-                          chat_history=history[-4:],
-                          context_slots={
-                              "carrera_nombre": meta.carrera or slot_carrera_name,
-                              "periodo": meta.periodo or slot_periodo,
-                              "facultad": meta.facultad or slot_facultad,
-                          })
-    system_override = profile.get("system_instruction") or None
-    answer = generate_answer(prompt, system_instruction=system_override) or "No pude generar una respuesta. Intenta de nuevo."
-
-    # 5) actualizar contexto con lo detectado esta vez (si hubo detección)
-    if det:
-        ctx["carrera_id"] = det.get("carrera_id") or ctx.get("carrera_id")
-        ctx["carrera_nombre"] = det.get("nombre") or ctx.get("carrera_nombre")
-        if det.get("facultad"):
-            ctx["facultad"] = det["facultad"]
-    # refrescar periodo si el user lo dijo/lo inferimos
-    if meta.periodo:
-        ctx["periodo"] = meta.periodo
-    if meta.facultad:
-        ctx["facultad"] = meta.facultad
+    turn["final_docs"] = final_docs
+    turn["prompt"] = build_prompt(user_text, final_docs,
+                                  chat_history=history[-4:],
+                                  context_slots=context_slots)
+    turn["cache_key"] = answer_cache.make_key(bot_id, user_text, final_docs,
+                                              {**context_slots, "carrera_id": meta.carrera_id})
+    return turn
+
+async def _fee_fast_path(turn: dict, allowed_domains: list, context_slots: dict) -> bool:
+    """
+    Si la pregunta es de montos y la carrera está resuelta (en la pregunta o en el
+    contexto), contesta desde la tabla de aranceles sin embeddings, búsqueda ni rerank:
+    con plantilla, o con una generación corta si FEE_FASTPATH_LLM. Devuelve True si
+    el turno quedó resuelto.
+    """
+    meta = turn["meta"]
+    if not settings.FEE_FASTPATH or (allowed_domains and "aranceles" not in allowed_domains):
+        return False
+    if not fees.is_fee_question(turn["user_text"]) or not (meta.carrera_id or meta.carrera):
+        return False
+    try:
+        rows = await _timed("fee_lookup", fees.lookup_async(turn["bot_id"], carrera_id=meta.carrera_id,
+                                                            carrera=meta.carrera, periodo=meta.periodo), turn["timings"])
+    except Exception as e:
+        logger.warning(f"fast-path de aranceles falló, sigo con RAG: {e}")
+        return False
+    if not rows:
+        return False
+    turn["fast_path"] = "aranceles"
+    turn["final_docs"] = fees.as_docs(rows)
+    if settings.FEE_FASTPATH_LLM:
+        # sólo la(s) fila(s) del arancel como contexto: prompt corto, respuesta corta
+        turn["prompt"] = build_prompt(turn["user_text"], turn["final_docs"], context_slots=context_slots)
+        turn["cache_key"] = answer_cache.make_key(turn["bot_id"], turn["user_text"], turn["final_docs"],
+                                                  {**context_slots, "carrera_id": meta.carrera_id})
+    else:
+        turn["fast_answer"] = fees.format_answer(rows)
+    return True
+
+async def _generate(turn: dict) -> str:
+    """generate_answer con caché de respuestas delante."""
+    if turn["fast_answer"]:
+        return turn["fast_answer"]
+    cached = answer_cache.get(turn["cache_key"])
+    if cached is not None:
+        turn["cache_hit"] = True
+        return cached
+    system_override = turn["profile"].get("system_instruction") or None
+    t0 = time.perf_counter()
+    answer = await _timed("generate", run_io(generate_answer, turn["prompt"], system_instruction=system_override), turn["timings"])
+    answer_cache.put(turn["cache_key"], answer, time.perf_counter() - t0)
+    return answer
+
+def _no_hits_answer(profile: dict) -> str:
+    contact = profile.get("contact", {}) or {}
+    fallback = "No encontré información suficiente en la base para responder con confianza."
+    if any(contact.values()):
+        fallback += f" Podés escribir a {contact.get('email') or contact.get('phone') or 'Admisiones'}."
+    return fallback
+
+async def _save_turn(turn: dict, answer: str):
+    ctx, history, det, meta = turn["ctx"], turn["history"], turn["det"], turn["meta"]
+    if turn["final_docs"]:
+        # 5) actualizar contexto con lo detectado esta vez (si hubo detección)
+        if det:
+            ctx["carrera_id"] = det.get("carrera_id") or ctx.get("carrera_id")
+            ctx["carrera_nombre"] = det.get("nombre") or ctx.get("carrera_nombre")
+            if det.get("facultad"):
+                ctx["facultad"] = det["facultad"]
+        # refrescar periodo si el user lo dijo/lo inferimos
+        if meta.periodo:
+            ctx["periodo"] = meta.periodo
+        if meta.facultad:
+            ctx["facultad"] = meta.facultad
 
     # 6) guardar historial corto
-    history.append({"role":"user", "content": user_text})
+    history.append({"role":"user", "content": turn["user_text"]})
     history.append({"role":"assistant", "content": answer[:1200]})  # truncamos un poco
-    save_ctx(session_id, bot_id, ctx, history)
+    await save_ctx(turn["session_id"], turn["bot_id"], ctx, history)
 
-    # 7) construir sources como antes
-    from ..schemas.common import Source
+def _sources(final_docs: list) -> list[Source]:
     sources = []
     for d in final_docs:
         m = d.get("metadata", {})
@@ -113,13 +210,96 @@ def chat(req: ChatRequest, client = Depends(get_qdrant)):
             fuente_fila=m.get("fuente_fila"),
             periodo=m.get("periodo"),
         ))
+    return sources
+
+def _debug(turn: dict) -> dict:
+    final_docs = turn["final_docs"]
+    return {
+        "context_slots": turn["ctx"],
+        "used_meta": turn["meta"].dict(),
+        "domains": list({(h["metadata"] or {}).get("domain") for h in final_docs}),
+        "files": list({(h["metadata"] or {}).get("fuente_archivo") for h in final_docs}),
+        "timings_ms": turn["timings"],
+        "answer_cache": "hit" if turn["cache_hit"] else "miss",
+        "fast_path": turn["fast_path"],
+    }
+
+@router.post("/", response_model=ChatResponse)
+async def chat(req: ChatRequest, client = Depends(get_async_qdrant)):
+    turn = await _prepare_turn(req, client)
+    if not turn["final_docs"]:
+        # actualizamos historial igual
+        fallback = _no_hits_answer(turn["profile"])
+        await _save_turn(turn, fallback)
+        return ChatResponse(answer=fallback, sources=[])
 
-    payload = {"answer": answer, "sources": sources}
+    answer = await _generate(turn) or "No pude generar una respuesta. Intenta de nuevo."
+    await _save_turn(turn, answer)
+
+    # 7) construir sources como antes
+    payload = {"answer": answer, "sources": _sources(turn["final_docs"])}
     if req.debug:
-        payload["retrieval_debug"] = {
-            "context_slots": ctx,
-            "used_meta": meta.dict(),
-            "domains": list({(h["metadata"] or {}).get("domain") for h in final_docs}),
-            "files": list({(h["metadata"] or {}).get("fuente_archivo") for h in final_docs}),
-        }
+        payload["retrieval_debug"] = _debug(turn)
     return ChatResponse(**payload)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest, client = Depends(get_async_qdrant)):
+    """
+    Igual que /chat/ pero por Server-Sent Events:
+      event: sources  -> lista de fuentes (apenas termina el rerank)
+      event: token    -> {"text": ...} a medida que el modelo genera
+      event: done     -> {"answer": ..., "retrieval_debug"?: ...}
+      event: error    -> {"detail": ...}
+    El historial se guarda una vez que el stream termina.
+    """
+    async def events():
+        t0 = time.perf_counter()
+        try:
+            turn = await _prepare_turn(req, client)
+            yield _sse("sources", [s.dict() for s in _sources(turn["final_docs"])])
+
+            cached = answer_cache.get(turn["cache_key"]) if turn["final_docs"] else None
+            if not turn["final_docs"]:
+                answer = _no_hits_answer(turn["profile"])
+                yield _sse("token", {"text": answer})
+            elif turn["fast_answer"]:
+                answer = turn["fast_answer"]
+                yield _sse("token", {"text": answer})
+            elif cached is not None:
+                turn["cache_hit"] = True
+                answer = cached
+                yield _sse("token", {"text": answer})
+            else:
+                system_override = turn["profile"].get("system_instruction") or None
+                parts = []
+                t_gen = time.perf_counter()
+                async for piece in stream_answer(turn["prompt"], system_instruction=system_override):
+                    if not parts:
+                        turn["timings"]["first_token"] = round((time.perf_counter() - t0) * 1000, 1)
+                    parts.append(piece)
+                    yield _sse("token", {"text": piece})
+                answer = "".join(parts)
+                gen_seconds = time.perf_counter() - t_gen
+                turn["timings"]["generate"] = round(gen_seconds * 1000, 1)
+                if answer:
+                    answer_cache.put(turn["cache_key"], answer, gen_seconds)
+                else:
+                    answer = "No pude generar una respuesta. Intenta de nuevo."
+                    yield _sse("token", {"text": answer})
+
+            await _save_turn(turn, answer)
+            done = {"answer": answer}
+            if req.debug:
+                done["retrieval_debug"] = _debug(turn)
+            yield _sse("done", done)
+        except Exception as e:
+            yield _sse("error", {"detail": f"{e.__class__.__name__}: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
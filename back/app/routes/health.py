@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from ..deps import get_qdrant
+from ..lifecycle import state as lifecycle_state
 from ..rag.embedder import embed_one
 
 router = APIRouter()
@@ -8,6 +10,19 @@ router = APIRouter()
 def liveness():
     return {"status": "ok"}
 
+@router.get("/ready")
+def readiness():
+    body = {
+        "status": "ready" if lifecycle_state["ready"] else "warming_up",
+        "steps_ms": lifecycle_state["steps"],
+        "errors": lifecycle_state["errors"],
+        "attempts": lifecycle_state["attempts"],
+    }
+    if lifecycle_state["failed"]:
+        # un paso crítico agotó WARMUP_MAX_ATTEMPTS
+        body["status"] = "failed"
+    return JSONResponse(body, status_code=200 if lifecycle_state["ready"] else 503)
+
 @router.get("/qdrant")
 def check_qdrant(client = Depends(get_qdrant)):
     info = client.get_collections()
@@ -1,10 +1,16 @@
-import os, traceback
-from fastapi import APIRouter, Depends, Query
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from ..deps import admin_key, get_qdrant
 from ..config import settings
 from ..rag.chunking import load_xlsx_dir, list_data_files
-from ..rag.retriever import upsert_records, count_points
-from ..catalog.entities import upsert_from_records
+from ..rag.retriever import count_points
+from ..rag import answer_cache, lexical, local_index, manifest
+from ..rag import jobs as ingest_jobs
+from ..catalog import fees
+from ..catalog.entities import warmup as catalog_warmup
+from ..rag.incremental import ingest_incremental
+from ..rag.ingest import ingest_full
 
 router = APIRouter()
 
@@ -30,7 +36,8 @@ def ingest_preview(
         data_dir = base_dir
 
     files = list_data_files(data_dir)
-    records = load_xlsx_dir(data_dir, bot_id=bot_id) or []
+    errors: dict = {}
+    records = load_xlsx_dir(data_dir, bot_id=bot_id, errors=errors) or []
 
     counts_by_domain = {}
     for r in records:
@@ -51,6 +58,49 @@ def ingest_preview(
         "counts_by_domain": counts_by_domain,
         "sample": sample,
         "total_records": len(records),
+        "errors": errors,
+        "bot_id": bot_id,
+    }
+
+
+def _run_ingest(client, xlsx_dir: str, bot_id: str, files: list, incremental: bool, job: ingest_jobs.IngestJob) -> dict:
+    res = _ingest(client, xlsx_dir, bot_id, files, incremental, job)
+    catalog_warmup([bot_id])  # índice de carreras en memoria, rearmado una vez por ingesta
+    if settings.RETRIEVAL_BACKEND == "local":
+        local_index.write_snapshot(client, settings.QDRANT_COLLECTION)
+    return res
+
+def _ingest(client, xlsx_dir: str, bot_id: str, files: list, incremental: bool, job: ingest_jobs.IngestJob) -> dict:
+    if incremental:
+        stats = ingest_incremental(client, xlsx_dir, bot_id, collection=settings.QDRANT_COLLECTION,
+                                   progress=job.progress, cancel=job.cancel)
+        if stats["files_changed"] or stats["files_removed"]:
+            answer_cache.invalidate_bot(bot_id)
+        return {
+            "ok": not stats["errors"],
+            "msg": "Ingesta incremental completada",
+            **stats,
+            "collection": settings.QDRANT_COLLECTION,
+            "count_now": count_points(client, settings.QDRANT_COLLECTION),
+            "bot_id": bot_id,
+        }
+
+    res = ingest_full(client, xlsx_dir, bot_id, collection=settings.QDRANT_COLLECTION,
+                      progress=job.progress, cancel=job.cancel)
+    total, errors = res["found_rows"], res["errors"]
+    if total == 0:
+        return {"ok": True, "msg": "No se encontraron filas válidas en los archivos", "indexed": 0, "archivos": files, "errors": errors, "bot_id": bot_id}
+
+    answer_cache.invalidate_bot(bot_id)
+    cnt = count_points(client, settings.QDRANT_COLLECTION)
+    return {
+        "ok": True,
+        "msg": "Ingesta completada",
+        "found_rows": total,
+        "collection": settings.QDRANT_COLLECTION,
+        "count_now": cnt,
+        "archivos": files,
+        "errors": errors,
         "bot_id": bot_id,
     }
 
@@ -60,36 +110,56 @@ def ingest_xlsx(
     _: None = Depends(admin_key),
     client = Depends(get_qdrant),
     bot_id: str = Query("public-admisiones"),
+    incremental: bool = Query(False),
+    wait: bool = Query(False),
 ):
+    """
+    Encola la ingesta como job en segundo plano y devuelve su id (202); el progreso
+    se ve en GET /ingest/jobs/{id}. Con `wait=true` espera a que termine y devuelve el
+    resultado como antes. Si ya hay una ingesta en curso para el bot, 409 con ese job.
+    """
     xlsx_dir = os.path.join("/app", "data", "xlsx", bot_id)
     if not os.path.isdir(xlsx_dir):
         return {"ok": False, "msg": f"No existe {xlsx_dir}"}
 
     files = list_data_files(xlsx_dir)
-    if not files:
+    if not files and not incremental:
         return {"ok": True, "msg": f"No se encontraron archivos en {xlsx_dir}", "indexed": 0}
 
-    try:
-        records = load_xlsx_dir(xlsx_dir, bot_id=bot_id)
-        upsert_from_records(records, bot_id=bot_id)
-        total = len(records)
-        if total == 0:
-            return {"ok": True, "msg": "No se encontraron filas válidas en los archivos", "indexed": 0, "archivos": files, "bot_id": bot_id}
-
-        upsert_records(client, records, collection=settings.QDRANT_COLLECTION)
-        cnt = count_points(client, settings.QDRANT_COLLECTION)
-        return {
-            "ok": True,
-            "msg": "Ingesta completada",
-            "found_rows": total,
-            "collection": settings.QDRANT_COLLECTION,
-            "count_now": cnt,
-            "archivos": files,
-            "bot_id": bot_id,
-        }
-    except Exception as e:
-        tb = traceback.format_exc(limit=2)
-        return {"ok": False, "msg": f"Error en ingesta: {e.__class__.__name__}: {e}", "trace": tb}
+    job, created = ingest_jobs.submit(
+        bot_id, incremental, lambda job: _run_ingest(client, xlsx_dir, bot_id, files, incremental, job))
+    if not created:
+        return JSONResponse({"ok": False, "msg": f"Ya hay una ingesta en curso para {bot_id}", "job": job.to_dict()},
+                            status_code=409)
+    if not wait:
+        return JSONResponse({"ok": True, "msg": "Ingesta encolada", "job_id": job.id, "job": job.to_dict()},
+                            status_code=202)
+
+    job.done.wait()
+    if job.status == "succeeded":
+        return {**job.result, "job_id": job.id}
+    return {"ok": False, "msg": f"Error en ingesta: {job.error}" if job.error else f"Ingesta {job.status}", "job_id": job.id}
+
+
+@router.get("/jobs")
+def ingest_jobs_list(_: None = Depends(admin_key), bot_id: str | None = Query(None)):
+    return {"jobs": [j.to_dict() for j in ingest_jobs.list_jobs(bot_id)]}
+
+
+@router.get("/jobs/{job_id}")
+def ingest_job_status(job_id: str, _: None = Depends(admin_key)):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}")
+def ingest_job_cancel(job_id: str, _: None = Depends(admin_key)):
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job.to_dict()
 
 
 @router.delete("/reset")
@@ -99,4 +169,9 @@ def ingest_reset(_: None = Depends(admin_key), client = Depends(get_qdrant)):
         client.delete_collection(settings.QDRANT_COLLECTION)
     except Exception:
         pass
+    answer_cache.invalidate_all()
+    manifest.reset()
+    lexical.reset()
+    fees.reset()
+    local_index.delete_snapshot(settings.QDRANT_COLLECTION)
     return {"ok": True, "msg": f"Collection {settings.QDRANT_COLLECTION} eliminada"}
\ No newline at end of file
@@ -0,0 +1,60 @@
+import json, time
+from ..config import settings
+
+# Backend de sesiones en Redis (SESSION_BACKEND=redis, ver store.py), para correr varios
+# workers / nodos sin sticky sessions. Cada sesión es una clave JSON con TTL de
+# SESSION_TTL_SECONDS que se renueva con cada lectura y escritura. Sin caché local: otro
+# worker puede haber escrito la sesión entre dos requests.
+
+_client = None
+
+def _key(session_id: str, bot_id: str) -> str:
+    return f"{settings.SESSION_REDIS_PREFIX}{bot_id}:{session_id}"
+
+def init(client=None):
+    """
+    Startup. `client` permite inyectar un cliente compatible con redis-py (p.ej.
+    fakeredis.FakeRedis() en tests); si no, se conecta a SESSION_REDIS_URL.
+    """
+    global _client
+    if client is not None:
+        _client = client
+        return
+    if _client is None:
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_BACKEND=redis requiere el paquete `redis`") from e
+        _client = redis.Redis.from_url(settings.SESSION_REDIS_URL, socket_timeout=settings.SESSION_REDIS_TIMEOUT,
+                                       health_check_interval=30)
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+def _get_client():
+    if _client is None:
+        init()
+    return _client
+
+def load(session_id: str, bot_id: str):
+    key = _key(session_id, bot_id)
+    pipe = _get_client().pipeline(transaction=False)
+    pipe.get(key)
+    if settings.SESSION_TTL_SECONDS > 0:
+        pipe.expire(key, settings.SESSION_TTL_SECONDS)  # TTL por inactividad
+    raw = pipe.execute()[0]
+    if not raw:
+        return {}, []
+    data = json.loads(raw)
+    return data.get("ctx") or {}, data.get("history") or []
+
+def save(session_id: str, bot_id: str, ctx: dict, history: list):
+    value = json.dumps({
+        "ctx": ctx,
+        "history": history[-8:],  # guardamos últimas ~4 interacciones
+        "updated_at": int(time.time()),
+    }, ensure_ascii=False)
+    _get_client().set(_key(session_id, bot_id), value, ex=settings.SESSION_TTL_SECONDS or None)
@@ -0,0 +1,206 @@
+import os, sqlite3, json, threading, time
+from typing import Dict, Tuple
+from ..config import settings
+from ..utils.logging import logger
+from ..utils.lru import LRUCache
+
+DB_PATH = os.environ.get("CONV_DB_PATH", "/app/state/conversations.db")
+
+# Backend de sesiones por defecto (SESSION_BACKEND=sqlite, ver store.py): SQLite en
+# WAL, una conexión por thread, caché en memoria de las sesiones calientes y escritura
+# diferida: `save` deja la sesión en memoria y un thread la baja a disco en batches cada
+# SESSION_FLUSH_INTERVAL_MS. Ese mismo thread purga las sesiones sin actividad hace más
+# de SESSION_TTL_SECONDS.
+#
+# Un solo proceso por base: la caché responde sin mirar la DB y lo pendiente todavía no
+# está en disco, así que otro worker sobre el mismo archivo vería sesiones viejas. init()
+# toma un lock exclusivo sobre DB_PATH + ".lock" y falla si ya lo tiene otro proceso;
+# para varios workers está SESSION_BACKEND=redis.
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+# (session_id, bot_id) -> (ctx_json, history_json); se guarda serializado para que quien
+# hace load pueda mutar lo que recibe sin tocar la caché
+_cache = LRUCache(settings.SESSION_CACHE_MAX_ENTRIES)
+_dirty: Dict[Tuple[str, str], Tuple[str, str, int]] = {}
+_inflight: Dict[Tuple[str, str], Tuple[str, str, int]] = {}  # sacadas de _dirty, escribiéndose
+_dirty_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_flusher: threading.Thread | None = None
+_process_lock = None  # archivo con flock mientras el proceso es dueño de la base
+
+def _conn() -> sqlite3.Connection:
+    cx = getattr(_local, "cx", None)
+    if cx is None:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        cx = sqlite3.connect(DB_PATH, timeout=10)
+        cx.row_factory = sqlite3.Row
+        cx.execute("PRAGMA journal_mode=WAL")
+        cx.execute("PRAGMA synchronous=NORMAL")
+        _local.cx = cx
+    return cx
+
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        cx = _conn()
+        cx.executescript("""
+        CREATE TABLE IF NOT EXISTS conversations (
+          session_id TEXT NOT NULL,
+          bot_id     TEXT NOT NULL,
+          ctx_json   TEXT NOT NULL,
+          history_json TEXT NOT NULL,
+          updated_at INTEGER NOT NULL,
+          PRIMARY KEY (session_id, bot_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations (updated_at);
+        """)
+        cx.commit()
+        _schema_ready = True
+
+def _decode(ctx_s: str, hist_s: str):
+    return json.loads(ctx_s or "{}"), json.loads(hist_s or "[]")
+
+def load(session_id: str, bot_id: str):
+    key = (session_id, bot_id)
+    with _dirty_lock:
+        pending = _dirty.get(key) or _inflight.get(key)
+    if pending is not None:
+        return _decode(pending[0], pending[1])
+    hit = _cache.get(key)
+    if hit is not None:
+        return _decode(*hit)
+
+    ensure_schema()
+    row = _conn().execute(
+        "SELECT ctx_json, history_json FROM conversations WHERE session_id=? AND bot_id=?",
+        (session_id, bot_id),
+    ).fetchone()
+    if not row:
+        return {}, []
+    _cache.put(key, (row["ctx_json"], row["history_json"]))
+    return _decode(row["ctx_json"], row["history_json"])
+
+def save(session_id: str, bot_id: str, ctx: dict, history: list):
+    now = int(time.time())
+    ctx_s = json.dumps(ctx, ensure_ascii=False)
+    hist_s = json.dumps(history[-8:], ensure_ascii=False)  # guardamos últimas ~4 interacciones
+    key = (session_id, bot_id)
+    _cache.put(key, (ctx_s, hist_s))
+    if not settings.SESSION_WRITE_BEHIND or _flusher is None:
+        _write({key: (ctx_s, hist_s, now)})
+        return
+    with _dirty_lock:
+        _dirty[key] = (ctx_s, hist_s, now)
+        full = len(_dirty) >= settings.SESSION_FLUSH_MAX_BATCH
+    if full:
+        _wake.set()
+
+def _write(rows: Dict[Tuple[str, str], Tuple[str, str, int]]):
+    ensure_schema()
+    cx = _conn()
+    cx.executemany(
+        """INSERT INTO conversations(session_id, bot_id, ctx_json, history_json, updated_at) VALUES (?,?,?,?,?)
+           ON CONFLICT(session_id, bot_id) DO UPDATE SET
+             ctx_json=excluded.ctx_json, history_json=excluded.history_json, updated_at=excluded.updated_at""",
+        [(sid, bot, ctx_s, hist_s, ts) for (sid, bot), (ctx_s, hist_s, ts) in rows.items()],
+    )
+    cx.commit()
+
+def flush():
+    """Baja a disco las sesiones pendientes."""
+    global _dirty, _inflight
+    with _dirty_lock:
+        if not _dirty:
+            return
+        rows, _dirty = _dirty, {}
+        _inflight = rows
+    try:
+        _write(rows)
+    except Exception as e:
+        logger.warning(f"no pude guardar {len(rows)} sesiones, reintento en el próximo flush: {e}")
+        with _dirty_lock:
+            for k, v in rows.items():
+                _dirty.setdefault(k, v)  # si entretanto hubo un save más nuevo, gana ese
+    finally:
+        with _dirty_lock:
+            _inflight = {}
+
+def purge_expired(now: int | None = None) -> int:
+    """Borra las sesiones sin actividad hace más de SESSION_TTL_SECONDS."""
+    if settings.SESSION_TTL_SECONDS <= 0:
+        return 0
+    ensure_schema()
+    cutoff = (now or int(time.time())) - settings.SESSION_TTL_SECONDS
+    cx = _conn()
+    n = cx.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,)).rowcount
+    cx.commit()
+    if n:
+        _cache.clear()  # no sabemos cuáles eran; se vuelven a leer de disco
+    return n
+
+def _flush_loop():
+    next_purge = 0.0
+    while not _stop.is_set():
+        _wake.wait(settings.SESSION_FLUSH_INTERVAL_MS / 1000)
+        _wake.clear()
+        flush()
+        if time.monotonic() >= next_purge:
+            try:
+                n = purge_expired()
+                if n:
+                    logger.info(f"sesiones vencidas borradas: {n}")
+            except Exception as e:
+                logger.warning(f"purga de sesiones falló: {e}")
+            next_purge = time.monotonic() + settings.SESSION_PURGE_INTERVAL
+    flush()
+
+def _acquire_process_lock():
+    global _process_lock
+    if _process_lock is not None:
+        return
+    import fcntl
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    f = open(DB_PATH + ".lock", "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        raise RuntimeError(f"{DB_PATH} ya está en uso por otro proceso: SESSION_BACKEND=sqlite es de un solo "
+                           f"proceso; con varios workers usar SESSION_BACKEND=redis")
+    _process_lock = f
+
+def _release_process_lock():
+    global _process_lock
+    if _process_lock is not None:
+        _process_lock.close()  # cerrar el archivo suelta el flock
+        _process_lock = None
+
+def init():
+    """Startup: toma la base para este proceso, crea el schema y arranca el thread de escritura diferida."""
+    global _flusher
+    _acquire_process_lock()
+    ensure_schema()
+    if settings.SESSION_WRITE_BEHIND and _flusher is None:
+        _stop.clear()
+        _flusher = threading.Thread(target=_flush_loop, name="session-flush", daemon=True)
+        _flusher.start()
+
+def close():
+    """Shutdown: para el thread y baja lo pendiente."""
+    global _flusher
+    if _flusher is not None:
+        _stop.set()
+        _wake.set()
+        _flusher.join()
+        _flusher = None
+    flush()
+    _release_process_lock()
+
@@ -1,54 +1,46 @@
-import os, sqlite3, json, threading, time
-
-DB_PATH = os.environ.get("CONV_DB_PATH", "/app/state/conversations.db")
-_lock = threading.Lock()
-
-def _conn():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    cx = sqlite3.connect(DB_PATH)
-    cx.row_factory = sqlite3.Row
-    return cx
-
-def ensure_schema():
-    with _lock, _conn() as cx:
-        cx.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-          session_id TEXT NOT NULL,
-          bot_id     TEXT NOT NULL,
-          ctx_json   TEXT NOT NULL,
-          history_json TEXT NOT NULL,
-          updated_at INTEGER NOT NULL,
-          PRIMARY KEY (session_id, bot_id)
-        );""")
-        cx.commit()
+from ..config import settings
+from ..utils.executors import run_io
+
+# Fachada del store de sesiones: load/save (y sus versiones async) delegan en el backend
+# de SESSION_BACKEND. Un backend es un módulo con init(), close(), load() y save():
+#   sqlite -> sqlite_store (default; un solo nodo)
+#   redis  -> redis_store  (varios workers / nodos)
+
+_backend = None
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        if settings.SESSION_BACKEND == "sqlite":
+            from . import sqlite_store as backend
+        elif settings.SESSION_BACKEND == "redis":
+            from . import redis_store as backend
+        else:
+            raise ValueError(f"SESSION_BACKEND desconocido: {settings.SESSION_BACKEND}")
+        _backend = backend
+    return _backend
+
+def set_backend(backend):
+    """Reemplaza el backend (tests: p.ej. redis_store inicializado con fakeredis)."""
+    global _backend
+    _backend = backend
+
+def init():
+    _get_backend().init()
+
+def close():
+    if _backend is not None:
+        _backend.close()
 
 def load(session_id: str, bot_id: str):
-    ensure_schema()
-    with _lock, _conn() as cx:
-        cur = cx.execute(
-            "SELECT ctx_json, history_json FROM conversations WHERE session_id=? AND bot_id=?",
-            (session_id, bot_id),
-        )
-        row = cur.fetchone()
-        if not row:
-            return {}, []
-        ctx = json.loads(row["ctx_json"] or "{}")
-        hist = json.loads(row["history_json"] or "[]")
-        return ctx, hist
+    return _get_backend().load(session_id, bot_id)
 
 def save(session_id: str, bot_id: str, ctx: dict, history: list):
-    ensure_schema()
-    now = int(time.time())
-    ctx_s = json.dumps(ctx, ensure_ascii=False)
-    hist_s = json.dumps(history[-8:], ensure_ascii=False)  # guardamos últimas ~4 interacciones
-    with _lock, _conn() as cx:
-        cur = cx.execute(
-            "UPDATE conversations SET ctx_json=?, history_json=?, updated_at=? WHERE session_id=? AND bot_id=?",
-            (ctx_s, hist_s, now, session_id, bot_id),
-        )
-        if cur.rowcount == 0:
-            cx.execute(
-                "INSERT INTO conversations(session_id, bot_id, ctx_json, history_json, updated_at) VALUES (?,?,?,?,?)",
-                (session_id, bot_id, ctx_s, hist_s, now),
-            )
-        cx.commit()
+    _get_backend().save(session_id, bot_id, ctx, history)
+
+
+async def load_async(session_id: str, bot_id: str):
+    return await run_io(load, session_id, bot_id)
+
+async def save_async(session_id: str, bot_id: str, ctx: dict, history: list):
+    await run_io(save, session_id, bot_id, ctx, history)
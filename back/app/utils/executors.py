@@ -0,0 +1,16 @@
+import asyncio, functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from ..config import settings
+
+# Pool dedicado para llamadas bloqueantes cortas (SQLite, SDK de Gemini), para no
+# competir con el threadpool por defecto de Starlette. El CrossEncoder tiene su
+# propio worker (ver rag/reranker.py).
+io_executor = ThreadPoolExecutor(max_workers=settings.IO_WORKERS, thread_name_prefix="io")
+
+async def run_in(executor: ThreadPoolExecutor, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    return await run_in(io_executor, fn, *args, **kwargs)
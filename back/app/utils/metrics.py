@@ -0,0 +1,27 @@
+from prometheus_client import Counter
+
+# Se registran en el registry por defecto, así que salen en /metrics junto con
+# las métricas HTTP del Instrumentator.
+
+EMBED_QUERY_CACHE_HITS = Counter(
+    "embed_query_cache_hits_total",
+    "Embeddings de consulta servidos desde caché",
+    ["layer"],  # memory | disk
+)
+EMBED_QUERY_CACHE_MISSES = Counter(
+    "embed_query_cache_misses_total",
+    "Embeddings de consulta que requirieron llamar al modelo",
+)
+
+ANSWER_CACHE_HITS = Counter(
+    "answer_cache_hits_total",
+    "Respuestas servidas desde la caché (sin llamar al LLM)",
+)
+ANSWER_CACHE_MISSES = Counter(
+    "answer_cache_misses_total",
+    "Respuestas que requirieron generación",
+)
+ANSWER_CACHE_SAVED_SECONDS = Counter(
+    "answer_cache_saved_seconds_total",
+    "Latencia de generación ahorrada por hits (según lo que tardó la respuesta original)",
+)
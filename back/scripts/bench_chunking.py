@@ -0,0 +1,290 @@
+"""
+Benchmark y chequeo de equivalencia del armado de records en `chunking`.
+
+    cd back
+    python -m scripts.bench_chunking                 # hoja sintética de 100k filas
+    python -m scripts.bench_chunking --rows 20000
+    python -m scripts.bench_chunking --data-dir /app/data/xlsx/public-admisiones
+
+Compara la implementación columnar (`_sheet_records`) contra la versión fila a
+fila con `iterrows` que usábamos antes (copiada abajo como referencia) y falla
+si algún record difiere (ignorando `inserted_at`).
+"""
+import argparse, os, random, re, sys, time
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from app.rag.chunking import (
+    _read_any, _sheet_records, _domain_from_name_and_cols, _primary_key_for_row,
+    list_data_files, load_schema_config, normalize_columns, MONEY_COL_KWS, NUM_ALIASES,
+)
+from app.rag.schema import SCHEMA_VERSION, slugify, hash_str, make_doc_id, make_chunk_id, parse_money_to_float, now_iso_utc
+
+# ---------------------------------------------------------------------------
+# Implementación de referencia (fila a fila), tal como estaba antes del cambio
+# ---------------------------------------------------------------------------
+def _first_nonempty(row: pd.Series, cols: List[str]) -> Optional[str]:
+    for c in cols:
+        if c in row and str(row[c]).strip():
+            return str(row[c]).strip()
+    return None
+
+def _guess_periodo_from_text(text: str) -> Optional[str]:
+    m = re.search(r"(19|20)\d{2}", text)
+    return m.group(0) if m else None
+
+def row_to_text(row: pd.Series) -> str:
+    parts = []
+    for col, val in row.items():
+        sval = "" if pd.isna(val) else str(val).strip()
+        if not sval:
+            continue
+        parts.append(f"{col.upper()}: {sval}")
+    return " | ".join(parts)
+
+def legacy_sheet_records(fname: str, path: str, sheet_name: str, df: pd.DataFrame, *, bot_id: str,
+                         aliases: Dict[str, List[str]], defaults: Dict[str, str]) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    df = normalize_columns(df).dropna(how="all").fillna("")
+    domain = _domain_from_name_and_cols(fname, sheet_name, df)
+    doc_id = make_doc_id(path, sheet_name)
+
+    # candidatos por campo canónico
+    cand = {
+        "facultad": aliases["facultad"],
+        "carrera": aliases["carrera"],
+        "modalidad": aliases["modalidad"],
+        "periodo": aliases["periodo"],
+        "titulo": aliases["titulo"],
+        "carrera_id": aliases["carrera_id"],
+    }
+
+    for i, row in df.iterrows():
+        texto = row_to_text(row)
+        if not texto:
+            continue
+
+        # Normalización por fila (acceso case-insensitive)
+        norm = {k: ("" if pd.isna(row[k]) else str(row[k]).strip()) for k in row.index}
+        def get(*keys):
+            for k in keys:
+                kk = slugify(k)
+                # ya normalizaste columnas con normalize_columns -> están slugificadas
+                if kk in norm and norm[kk]:
+                    return norm[kk]
+            return None
+
+        # ---------- Título ----------
+        # Preferimos 'titulo' canónico; si no, primera columna con texto
+        titulo = _first_nonempty(row, cand["titulo"]) or defaults.get("titulo")
+        if not titulo:
+            for c in row.index:
+                if str(row[c]).strip():
+                    titulo = str(row[c]).strip()
+                    break
+        titulo = titulo or domain
+
+        # ---------- Campos base ----------
+        facultad  = _first_nonempty(row, cand["facultad"])  or defaults.get("facultad")
+        modalidad = _first_nonempty(row, cand["modalidad"]) or defaults.get("modalidad") or "general"
+
+        # Período: si no viene explícito, intenta del texto / nombre del archivo
+        periodo = _first_nonempty(row, cand["periodo"]) or defaults.get("periodo")
+        if not periodo:
+            periodo = _guess_periodo_from_text(texto) or _guess_periodo_from_text(fname) or "general"
+
+        # ---------- Carrera & Carrera ID (clave del fix) ----------
+        # Regla: en 'carreras' u 'oferta' usar CARRERA; si no hay, usar ALIAS (nombre público).
+        #       en 'aranceles' también intentamos CARRERA y luego ALIAS.
+        carrera_id = _first_nonempty(row, cand["carrera_id"]) or ""
+        if domain in ("carreras", "oferta"):
+            carrera = get("carrera") or get("alias")  # primero CARRERA, luego ALIAS
+        elif domain == "aranceles":
+            carrera = get("carrera") or get("alias")
+        else:
+            carrera = _first_nonempty(row, cand["carrera"]) or get("alias")
+
+        # ¡Importante!: si no hay nombre de carrera, NO pongas "general"
+        carrera = carrera if carrera and carrera.strip() else None
+
+        # ---------- IDs determinísticos ----------
+        primary_key = _primary_key_for_row(domain, (carrera_id or "").strip(), str(periodo), i, titulo)
+        chunk_id = make_chunk_id(doc_id, primary_key)
+        row_hash = hash_str(texto)
+
+        # ---------- Slugs ----------
+        carrera_slug = slugify(carrera) if carrera else None
+        facultad_slug = slugify(facultad) if facultad else None
+
+        # ---------- Números (aranceles) ----------
+        numbers: Dict[str, Any] = {}
+
+        # 0) Mapa "columna -> valor string" ya normalizado
+        #    (tenemos 'norm' arriba con columnas slugificadas)
+        # 1) Intenta por aliases canónicos
+        def _fill_if_present(target_key: str, alias_list: list[str]):
+            for a in alias_list:
+                if a in norm and norm[a]:
+                    val = parse_money_to_float(norm[a])
+                    if val is not None:
+                        numbers[target_key] = float(val)
+                        return True
+            return False
+
+        _fill_if_present("matricula_general",    NUM_ALIASES["matricula_general"])
+        _fill_if_present("matricula_ingresante", NUM_ALIASES["matricula_ingresante"])
+        _fill_if_present("arancel_mensual",      NUM_ALIASES["arancel_mensual"])
+        _fill_if_present("arancel_total",        NUM_ALIASES["arancel_total"])
+
+        # 2) Si sigue vacío, heurística: cualquier columna con KW de dinero
+        if not numbers:
+            for col, sval in norm.items():
+                if not sval:
+                    continue
+                if any(kw in col for kw in MONEY_COL_KWS):
+                    val = parse_money_to_float(sval)
+                    if val is not None:
+                        # mapeo heurístico del nombre
+                        if "mensual" in col or "cuota" in col:
+                            numbers.setdefault("arancel_mensual", float(val))
+                        elif "total" in col:
+                            numbers.setdefault("arancel_total", float(val))
+                        elif "matric" in col or "inscrip" in col:
+                            numbers.setdefault("matricula_general", float(val))
+                        else:
+                            # guarda como "otra_cifra_*" por si acaso
+                            numbers.setdefault(f"otra_cifra_{col[:18]}", float(val))
+
+        # 3) Cuotas y flags
+        if "cant_cuotas_plan_pagos" in norm and norm["cant_cuotas_plan_pagos"]:
+            try:
+                numbers["cant_cuotas_plan_pagos"] = int(str(norm["cant_cuotas_plan_pagos"]).strip() or "0")
+            except Exception:
+                pass
+
+        if "tiene_plan_pagos" in norm and norm["tiene_plan_pagos"]:
+            v = norm["tiene_plan_pagos"].strip().lower()
+            numbers["tiene_plan_pagos"] = v in ("s","si","sí","true","1","y","yes")
+
+        # 4) Derivación (después de parsear)
+        if domain == "aranceles":
+            mensual = numbers.get("arancel_mensual")
+            cuotas = numbers.get("cant_cuotas_plan_pagos") or 0
+            total = numbers.get("arancel_total")
+            if mensual and cuotas and not total:
+                numbers["arancel_total_estimado"] = round(float(mensual) * float(cuotas), 2)
+
+
+        # ---------- Proveniencia y extras ----------
+        extras = {}
+        for c in row.index:
+            v = str(row[c]).strip()
+            if v:
+                extras[slugify(c)] = v  # guarda claves normalizadas
+
+        metadata = {
+            "schema_version": SCHEMA_VERSION,
+            "bot_id": bot_id,
+            "domain": domain,
+            "tipo": domain,  # compat retro
+            "doc_id": doc_id,
+            "chunk_id": chunk_id,
+            "row_hash": row_hash,
+            "inserted_at": now_iso_utc(),
+            "source_path": os.path.normpath(path),
+            "fuente_archivo": fname,
+            "fuente_hoja": sheet_name,
+            "fuente_fila": int(i),
+
+            # canónicos
+            "titulo": titulo,
+            "facultad": facultad,
+            "modalidad": modalidad,
+            "periodo": str(periodo),
+
+            # unión / lookup
+            "carrera": carrera,               # ← ahora correcto (None si no hay)
+            "carrera_id": carrera_id,         # ← si existe
+            "carrera_slug": carrera_slug,     # ← solo si hay carrera
+            "facultad_slug": facultad_slug,
+
+            # auxiliares
+            "numbers": numbers if numbers else None,
+            "extras": extras,
+            "texto": texto,
+        }
+        # limpiar None
+        metadata = {k: v for k, v in metadata.items() if v is not None}
+
+        records.append({"texto": texto, "metadata": metadata})
+
+    return records
+
+# ---------------------------------------------------------------------------
+
+def _synthetic(rows: int) -> pd.DataFrame:
+    rnd = random.Random(7)
+    carreras = ["Medicina", "Abogacía", "Ingeniería en Sistemas", "Arquitectura", "Psicología", "Contador Público"]
+    data = {
+        "Facultad": [rnd.choice(["Ciencias de la Salud", "Derecho", "Ingeniería", ""]) for _ in range(rows)],
+        "Carrera": [rnd.choice(carreras + [""]) for _ in range(rows)],
+        "Identificador Carrera": [rnd.choice(["", f"C{rnd.randint(1, 500)}"]) for _ in range(rows)],
+        "Modalidad": [rnd.choice(["Presencial", "Distancia", None]) for _ in range(rows)],
+        "Año": [rnd.choice([2024, 2025, None]) for _ in range(rows)],
+        "Matrícula General": [rnd.choice(["$ 350.000,00", "120000", "", None, "62.000"]) for _ in range(rows)],
+        "Arancel Mensual": [rnd.choice(["$ 420.000", "1.234,5", "", "consultar"]) for _ in range(rows)],
+        "Cuota Extra": [rnd.choice(["$ 10.000", ""]) for _ in range(rows)],
+        "Cant Cuotas Plan Pagos": [rnd.choice(["10", "12", "", "x"]) for _ in range(rows)],
+        "Tiene Plan Pagos": [rnd.choice(["Si", "no", ""]) for _ in range(rows)],
+        "Observaciones": [rnd.choice(["", "Ingreso 2026", "Vigente"]) for _ in range(rows)],
+        "Fecha Inicio": [rnd.choice([pd.Timestamp("2025-03-10"), pd.NaT]) for _ in range(rows)],
+    }
+    return pd.DataFrame(data)
+
+def _strip(recs):
+    for r in recs:
+        m = dict(r["metadata"])
+        m.pop("inserted_at", None)
+        yield r["texto"], m
+
+def _compare(name: str, new, old) -> bool:
+    if len(new) != len(old):
+        print(f"  {name}: {len(new)} records vs {len(old)} (referencia)")
+        return False
+    for k, (a, b) in enumerate(zip(_strip(new), _strip(old))):
+        if a != b:
+            diff = {key for key in set(a[1]) | set(b[1]) if a[1].get(key) != b[1].get(key)}
+            print(f"  {name}: record {k} difiere en {sorted(diff) or ['texto']}")
+            return False
+    return True
+
+def _bench(name: str, fname: str, path: str, sheet: str, df: pd.DataFrame, cfg) -> bool:
+    kw = dict(bot_id="bench", aliases=cfg["aliases"], defaults=cfg["defaults"])
+    t = time.perf_counter(); new = _sheet_records(fname, path, sheet, df, **kw); t_new = time.perf_counter() - t
+    t = time.perf_counter(); old = legacy_sheet_records(fname, path, sheet, df, **kw); t_old = time.perf_counter() - t
+    ok = _compare(name, new, old)
+    print(f"{name:<40}{len(df):>9}{t_old:>10.2f}{t_new:>10.2f}{t_old / max(t_new, 1e-9):>9.1f}x  {'OK' if ok else 'DIFF'}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--data-dir", default=None)
+    args = ap.parse_args()
+
+    print(f"{'hoja':<40}{'filas':>9}{'iterrows':>10}{'columnar':>10}{'speedup':>10}")
+    ok = True
+    if args.data_dir:
+        cfg = load_schema_config(args.data_dir)
+        for fname in list_data_files(args.data_dir):
+            path = os.path.join(args.data_dir, fname)
+            for sheet, df in _read_any(path).items():
+                if df is not None and not df.empty:
+                    ok &= _bench(f"{fname}:{sheet}"[:39], fname, path, sheet, df, cfg)
+    else:
+        cfg = load_schema_config("/nonexistent")
+        ok &= _bench("sintética aranceles_2025.xlsx", "aranceles_2025.xlsx", "/tmp/aranceles_2025.xlsx",
+                     "Hoja1", _synthetic(args.rows), cfg)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark y chequeo de paridad de los backends del reranker.
+
+    cd back
+    python -m scripts.bench_reranker --backends torch torch-int8 onnx-int8
+    python -m scripts.bench_reranker --data-dir /app/data/xlsx/public-admisiones
+
+Cada backend corre en un proceso aparte (RSS limpio). Se compara contra
+"torch" (el comportamiento actual): diferencia máxima de score, correlación de
+Spearman y coincidencia del top-k por consulta. Sólo CPU.
+"""
+import argparse, multiprocessing as mp, os, resource, statistics, time
+
+QUERIES = [
+    "cuánto sale la matrícula de Medicina",
+    "qué becas hay para ingresantes",
+    "cuándo cierran las inscripciones 2025",
+    "la carrera de abogacía es presencial o a distancia",
+    "cuántas cuotas tiene el plan de pagos de arquitectura",
+    "requisitos de ingreso para ingeniería en sistemas",
+]
+
+SYNTH_DOCS = [
+    "CARRERA: Medicina | FACULTAD: Ciencias de la Salud | MATRICULA_GENERAL: $ 350.000,00 | ARANCEL_MENSUAL: $ 420.000,00 | PERIODO: 2025",
+    "CARRERA: Abogacía | MODALIDAD: Presencial | FACULTAD: Derecho y Ciencias Sociales | DURACION: 5 años",
+    "BECA: Beca al Mérito | COBERTURA: 50% | REQUISITOS: promedio mayor a 8 en el secundario",
+    "FECHA: Cierre de inscripciones | PERIODO: 2025 | DETALLE: hasta el 28 de febrero",
+    "CARRERA: Arquitectura | CANT_CUOTAS_PLAN_PAGOS: 10 | TIENE_PLAN_PAGOS: Si | ARANCEL_MENSUAL: $ 310.000",
+    "CARRERA: Ingeniería en Sistemas | REQUISITOS: título secundario, curso de ingreso de matemática",
+    "REGLAMENTO: Condiciones de regularidad | DETALLE: 75% de asistencia a clases prácticas",
+    "CARRERA: Psicología | FACULTAD: Filosofía y Humanidades | MODALIDAD: Presencial | PERIODO: 2025",
+]
+
+def _docs(data_dir: str | None, n: int) -> list[str]:
+    if not data_dir:
+        return (SYNTH_DOCS * (n // len(SYNTH_DOCS) + 1))[:n]
+    from app.rag.chunking import load_xlsx_dir
+    texts = [r["texto"] for r in load_xlsx_dir(data_dir)]
+    return texts[:n] or SYNTH_DOCS
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _run(backend: str, docs: list[str], repeats: int, threads: int, out):
+    import torch
+    if threads > 0:
+        torch.set_num_threads(threads)
+    from app.rag.reranker import load_model
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    model = load_model(backend)
+    load_s = time.perf_counter() - t0
+
+    scores = {}
+    lat = []
+    model.predict([(QUERIES[0], docs[0])])  # warm-up
+    for _ in range(repeats):
+        for q in QUERIES:
+            pairs = [(q, d) for d in docs]
+            t = time.perf_counter()
+            scores[q] = [float(x) for x in model.predict(pairs, batch_size=32)]
+            lat.append((time.perf_counter() - t) * 1000)
+    out.put({
+        "backend": backend, "load_s": load_s, "scores": scores,
+        "p50_ms": statistics.median(lat),
+        "p95_ms": sorted(lat)[max(0, int(len(lat) * 0.95) - 1)],
+        "rss_mb": _rss_mb(), "rss_model_mb": _rss_mb() - rss0,
+    })
+
+def _spearman(a: list[float], b: list[float]) -> float:
+    def ranks(x):
+        order = sorted(range(len(x)), key=lambda i: x[i])
+        r = [0] * len(x)
+        for pos, i in enumerate(order):
+            r[i] = pos
+        return r
+    ra, rb = ranks(a), ranks(b)
+    n = len(a)
+    if n < 2:
+        return 1.0
+    d2 = sum((x - y) ** 2 for x, y in zip(ra, rb))
+    return 1 - 6 * d2 / (n * (n * n - 1))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    ap.add_argument("--data-dir", default=None)
+    ap.add_argument("--docs", type=int, default=30, help="docs por consulta (≈ RAG_TOP_K)")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--top-k", type=int, default=5)
+    args = ap.parse_args()
+
+    docs = _docs(args.data_dir, args.docs)
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    ctx = mp.get_context("spawn")
+    results = {}
+    for b in backends:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run, args=(b, docs, args.repeats, args.threads, q))
+        p.start()
+        try:
+            results[b] = q.get()
+        except Exception as e:
+            print(f"{b}: falló ({e})")
+        p.join()
+        if p.exitcode and b not in results:
+            print(f"{b}: el proceso terminó con código {p.exitcode}")
+
+    ref = results.get("torch")
+    print(f"{'backend':<12}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}{'max|Δ|':>9}{'spearman':>10}{'top-k':>7}")
+    for b, r in results.items():
+        diffs, rhos, topk = [], [], []
+        if ref:
+            for qq, s in r["scores"].items():
+                s0 = ref["scores"][qq]
+                diffs.append(max(abs(x - y) for x, y in zip(s, s0)))
+                rhos.append(_spearman(s, s0))
+                k = min(args.top_k, len(s))
+                top = lambda xs: set(sorted(range(len(xs)), key=lambda i: -xs[i])[:k])
+                topk.append(len(top(s) & top(s0)) / k)
+        print(f"{b:<12}{r['load_s']:>8.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['rss_mb']:>9.0f}"
+              f"{max(diffs, default=0):>9.4f}{min(rhos, default=1):>10.3f}{min(topk, default=1):>7.2f}")
+
+if __name__ == "__main__":
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark y chequeo de paridad del índice vectorial en proceso (RETRIEVAL_BACKEND=local)
+contra Qdrant.
+
+    cd back
+    python -m scripts.bench_retrieval                      # colección sintética de 5k puntos
+    python -m scripts.bench_retrieval --points 20000 --dim 768
+    python -m scripts.bench_retrieval --collection admisiones --bot-id public-admisiones
+
+Con --collection usa una colección existente (consultas con vectores de la propia
+colección); si no, crea una sintética y la borra al final. Las mismas QueryRequest
+(con filtro por bot_id + dominio, como la pasada estricta de `search`) van a
+`QdrantClient.query_batch_points` y a `local_index.search_batch`; se reportan latencias y
+la coincidencia del top-k. Necesita Qdrant en QDRANT_URL.
+"""
+import argparse, random, statistics, tempfile, time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance, FieldCondition, Filter, MatchAny, MatchValue, PointStruct, QueryRequest, VectorParams,
+)
+from app.config import settings
+from app.rag import local_index
+from app.rag.retriever import ensure_payload_indexes
+from app.rag.schema import SEARCH_PAYLOAD_FIELDS
+
+DOMAINS = ["carreras", "aranceles", "becas", "fechas", "oferta"]
+BOTS = ["public-admisiones", "interno-academico"]
+
+def _synthetic(client: QdrantClient, coll: str, n: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    client.recreate_collection(coll, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    for j in range(0, n, 1000):
+        vecs = rng.standard_normal((min(1000, n - j), dim)).astype(np.float32)
+        client.upsert(coll, points=[PointStruct(
+            id=j + i, vector=v.tolist(),
+            payload={"bot_id": BOTS[(j + i) % len(BOTS)], "domain": DOMAINS[(j + i) % len(DOMAINS)],
+                     "chunk_id": f"c{j + i}", "texto": f"chunk {j + i}"},
+        ) for i, v in enumerate(vecs)])
+    ensure_payload_indexes(client, coll)
+
+def _requests(client: QdrantClient, coll: str, n_queries: int, top_k: int, bot_id: str | None, seed: int):
+    rnd = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    pts, _ = client.scroll(coll, limit=max(n_queries * 4, 64), with_vectors=True, with_payload=["bot_id"])
+    reqs = []
+    for p in rnd.sample(pts, min(n_queries, len(pts))):
+        # ruido para que la consulta no sea exactamente un punto de la colección
+        q = np.asarray(p.vector, dtype=np.float32)
+        q += noise.normal(0, 0.05, q.shape).astype(np.float32)
+        must = [FieldCondition(key="bot_id", match=MatchValue(value=bot_id or p.payload.get("bot_id")))]
+        if rnd.random() < 0.5:
+            must.append(FieldCondition(key="domain", match=MatchAny(any=rnd.sample(DOMAINS, 2))))
+        reqs.append(QueryRequest(query=q.tolist(), filter=Filter(must=must), limit=top_k,
+                                 with_payload=SEARCH_PAYLOAD_FIELDS))
+    return reqs
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[max(0, int(len(xs) * p) - 1)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--collection", default=None)
+    ap.add_argument("--bot-id", default=None)
+    ap.add_argument("--points", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=settings.RAG_TOP_K)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    client = QdrantClient(url=settings.QDRANT_URL, timeout=60)
+    coll = args.collection or f"bench_local_{args.points}_{args.dim}"
+    settings.LOCAL_INDEX_DIR = tempfile.mkdtemp(prefix="bench_local_")
+    try:
+        if not args.collection:
+            t = time.perf_counter()
+            _synthetic(client, coll, args.points, args.dim, args.seed)
+            print(f"colección sintética {coll}: {args.points} puntos dim={args.dim} ({time.perf_counter() - t:.1f}s)")
+
+        t = time.perf_counter()
+        n = local_index.write_snapshot(client, coll)
+        snap_s = time.perf_counter() - t
+        t = time.perf_counter()
+        local_index.get_index(coll)
+        load_s = time.perf_counter() - t
+        print(f"snapshot: {n} puntos en {snap_s:.1f}s; carga (mmap + bitmaps) {load_s * 1000:.0f} ms")
+
+        reqs = _requests(client, coll, args.queries, args.top_k, args.bot_id, args.seed)
+        client.query_batch_points(coll, requests=reqs[:1])  # warm-up
+        lat = {"qdrant": [], "local": []}
+        overlap = []
+        for r in reqs:
+            t = time.perf_counter()
+            rq = client.query_batch_points(coll, requests=[r])[0].points
+            lat["qdrant"].append((time.perf_counter() - t) * 1000)
+            t = time.perf_counter()
+            rl = local_index.search_batch(coll, [r])[0]
+            lat["local"].append((time.perf_counter() - t) * 1000)
+            a = {(p.payload or {}).get("chunk_id") for p in rq}
+            b = {(p.payload or {}).get("chunk_id") for p in rl}
+            overlap.append(len(a & b) / max(1, len(a)))
+
+        print(f"{'backend':<10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+        for name, xs in lat.items():
+            print(f"{name:<10}{statistics.median(xs):>9.2f}{_pct(xs, 0.95):>9.2f}{max(xs):>9.2f}")
+        print(f"top-{args.top_k} coincidente con Qdrant: media {statistics.mean(overlap):.3f}, mínimo {min(overlap):.3f}")
+    finally:
+        if not args.collection:
+            client.delete_collection(coll)
+        local_index.delete_snapshot(coll)
+
+if __name__ == "__main__":
+    main()
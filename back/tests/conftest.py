@@ -0,0 +1,10 @@
+import os, tempfile
+
+# bases SQLite y archivos de estado en un directorio temporal: varios módulos leen el
+# path de os.environ al importarse, así que tiene que estar antes de importar `app`
+_tmp = tempfile.mkdtemp(prefix="chatbot-tests-")
+for var, name in [("CATALOG_DB_PATH", "catalog.db"), ("LEXICAL_DB_PATH", "lexical.db"),
+                  ("CONV_DB_PATH", "conversations.db"), ("INGEST_MANIFEST_PATH", "ingest_manifest.db")]:
+    os.environ.setdefault(var, os.path.join(_tmp, name))
+os.environ.setdefault("LOCAL_INDEX_DIR", os.path.join(_tmp, "local_index"))
+os.environ.setdefault("WARMUP_ENABLED", "false")
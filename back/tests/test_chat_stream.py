@@ -0,0 +1,87 @@
+import importlib, json, sys, types
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.deps import get_async_qdrant
+from app.models import gemini_stream
+from app.schemas.chat import ChatMeta
+
+DOCS = [{"texto": "Medicina: cuota $ 500.000", "score": 0.9,
+         "metadata": {"chunk_id": "c1", "domain": "aranceles", "titulo": "Medicina",
+                      "fuente_archivo": "aranceles.xlsx", "fuente_hoja": "Hoja1", "fuente_fila": 3}}]
+
+def _turn():
+    return {
+        "bot_id": "public-admisiones", "profile": {}, "session_id": "s1", "user_text": "¿cuánto sale medicina?",
+        "ctx": {}, "history": [], "det": None, "meta": ChatMeta(), "timings": {},
+        "final_docs": list(DOCS), "prompt": "PROMPT", "cache_key": ("test", object()), "cache_hit": False,
+        "fast_answer": None, "fast_path": None,
+    }
+
+def _chat_routes(monkeypatch):
+    # app.routes.chat importa app.models.gemini_client, que no está en este árbol: se
+    # reemplaza por un módulo vacío (el stream va por gemini_stream, que sí se fakea)
+    gemini_client = types.ModuleType("app.models.gemini_client")
+    gemini_client.generate_answer = lambda *a, **kw: pytest.fail("el stream no debería llamar a generate_answer")
+    monkeypatch.setitem(sys.modules, "app.models.gemini_client", gemini_client)
+    monkeypatch.delitem(sys.modules, "app.routes.chat", raising=False)
+    return importlib.import_module("app.routes.chat")
+
+@pytest.fixture
+def client(monkeypatch):
+    chat_routes = _chat_routes(monkeypatch)
+
+    async def prepare_turn(req, client):
+        return _turn()
+
+    saved = []
+    async def save_ctx(session_id, bot_id, ctx, history):
+        saved.append(history)
+
+    monkeypatch.setattr(chat_routes, "_prepare_turn", prepare_turn)
+    monkeypatch.setattr(chat_routes, "save_ctx", save_ctx)
+    app = FastAPI()
+    app.include_router(chat_routes.router, prefix="/chat")
+    app.dependency_overrides[get_async_qdrant] = lambda: None
+    with TestClient(app) as c:
+        c.saved = saved
+        yield c
+    gemini_stream.set_stream_backend(None)
+
+def _events(resp):
+    out = []
+    for block in resp.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+def _post(client):
+    return client.post("/chat/stream", json={"message": "¿cuánto sale medicina?", "bot_id": "public-admisiones",
+                                              "session_id": "s1"})
+
+def test_stream_events_in_order(client):
+    async def fake_stream(prompt, system_instruction=None):
+        for piece in ["La cuota ", "es de ", "$ 500.000 [1]"]:
+            yield piece
+    gemini_stream.set_stream_backend(fake_stream)
+
+    resp = _post(client)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp)
+    assert [e for e, _ in events] == ["sources", "token", "token", "token", "done"]
+    assert events[0][1][0]["fuente_archivo"] == "aranceles.xlsx"
+    assert "".join(d["text"] for e, d in events if e == "token") == "La cuota es de $ 500.000 [1]"
+    assert events[-1][1]["answer"] == "La cuota es de $ 500.000 [1]"
+    assert client.saved  # el historial se guarda al terminar el stream
+
+def test_stream_error_midway(client):
+    async def failing_stream(prompt, system_instruction=None):
+        yield "La cuota "
+        raise RuntimeError("se cortó el modelo")
+    gemini_stream.set_stream_backend(failing_stream)
+
+    events = _events(_post(client))
+    assert [e for e, _ in events] == ["sources", "token", "error"]
+    assert "se cortó el modelo" in events[-1][1]["detail"]
+    assert not client.saved  # un turno que falló no se guarda
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.rag.chunking import _sheet_records, load_schema_config, parse_money_series
+from app.rag.schema import parse_money_to_float
+from scripts.bench_chunking import _synthetic, legacy_sheet_records
+
+# La extracción columnar (`_sheet_records`) tiene que dar exactamente los mismos records
+# que la versión fila a fila con iterrows (referencia en scripts/bench_chunking.py).
+
+CFG = load_schema_config("/nonexistent")
+
+def _df(columns, rows):
+    return pd.DataFrame(rows, columns=columns)
+
+CASES = {
+    "nans": ("aranceles_2025.xlsx", _df(
+        ["Carrera", "Identificador Carrera", "Matrícula General", "Arancel Mensual", "Cant Cuotas Plan Pagos"],
+        [["Medicina", "C1", "$ 350.000,00", np.nan, "12"],
+         [np.nan, np.nan, np.nan, np.nan, np.nan],          # fila vacía: se descarta
+         ["Abogacía", None, None, "$ 420.000", None],
+         [np.nan, "C3", "", "1.234,5", "x"]])),
+    "mixed_types": ("carreras.xlsx", _df(
+        ["Carrera", "Año", "Modalidad", "Fecha Inicio", "Tiene Plan Pagos", "Cuota Extra"],
+        [["Psicología", 2025, "Presencial", pd.Timestamp("2025-03-10"), "Si", 10000],
+         ["Arquitectura", 2024.0, None, pd.NaT, True, "$ 10.000"],
+         [123, "2026", 1, "marzo", 0, 3.5],
+         ["Contador Público", None, "Distancia", None, "no", None]])),
+    "missing_canonical": ("info general.xlsx", _df(
+        ["Observaciones", "Contacto"],
+        [["Ingreso 2026", "admisiones@ucc.edu.ar"],
+         ["Vigente", ""],
+         [None, "0351 4938000"]])),
+    "no_money_aliases": ("aranceles.xlsx", _df(
+        ["Nombre Programa", "Valor Cuota", "Total Carrera", "Inscripcion"],
+        [["Medicina", "$ 500.000", "$ 6.000.000", "$ 80.000"],
+         ["Derecho", "consultar", None, "62.000"]])),
+    # read_excel renombra los encabezados repetidos a "X.1", "X.2"...
+    "duplicate_headers": ("oferta.xlsx", _df(
+        ["Carrera", "Carrera.1", "Facultad", "Facultad.1"],
+        [["Medicina", "Medicina (ciclo)", "Ciencias de la Salud", "Salud"],
+         ["", "Abogacía", None, "Derecho"],
+         [None, None, "", ""]])),
+    "only_empty_rows": ("becas.xlsx", _df(["Beca", "Cobertura"], [[None, np.nan], ["", None]])),
+    "synthetic": ("aranceles_2025.xlsx", _synthetic(2000)),
+}
+
+def _strip(records):
+    out = []
+    for r in records:
+        md = dict(r["metadata"])
+        md.pop("inserted_at", None)
+        out.append((r["texto"], md))
+    return out
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_sheet_records_matches_row_wise(case):
+    fname, df = CASES[case]
+    kw = dict(bot_id="test", aliases=CFG["aliases"], defaults=CFG["defaults"])
+    new = _sheet_records(fname, f"/data/{fname}", "Hoja1", df, **kw)
+    old = legacy_sheet_records(fname, f"/data/{fname}", "Hoja1", df, **kw)
+    assert _strip(new) == _strip(old)
+
+def test_sheet_records_headers_colliding_after_normalization():
+    # "Carrera" y "carrera " son la misma columna una vez slugificadas: la versión fila a
+    # fila fallaba (row[k] devolvía una Series); la columnar se queda con la primera
+    df = _df(["Carrera", "carrera ", "Facultad"], [["Medicina", "Medicina (ciclo)", "Ciencias de la Salud"]])
+    kw = dict(bot_id="test", aliases=CFG["aliases"], defaults=CFG["defaults"])
+    with pytest.raises(ValueError):
+        legacy_sheet_records("oferta.xlsx", "/data/oferta.xlsx", "Hoja1", df, **kw)
+    [rec] = _sheet_records("oferta.xlsx", "/data/oferta.xlsx", "Hoja1", df, **kw)
+    assert rec["metadata"]["carrera"] == "Medicina"
+    assert rec["texto"] == "CARRERA: Medicina | FACULTAD: Ciencias de la Salud"
+
+MONEY = [
+    ("$ 420.000", 420000.0), ("$ 1.234.567", 1234567.0), ("$ 1.234.567,50", 1234567.5),
+    ("$ 350.000,00", 350000.0), ("120000", 120000.0), ("1.234,5", 1234.5), ("1234.50", 1234.5),
+    ("1.5", 1.5), ("420000.0", 420000.0), ("consultar", None),
+]
+
+@pytest.mark.parametrize("raw, expected", MONEY)
+def test_parse_money(raw, expected):
+    assert parse_money_to_float(raw) == expected
+
+def test_parse_money_series_matches_scalar():
+    got = parse_money_series(pd.Series([raw for raw, _ in MONEY])).tolist()
+    assert [None if np.isnan(v) else v for v in got] == [expected for _, expected in MONEY]
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from app.config import settings
+from app.rag import embedder
+
+def _vec(text):
+    # enteros chicos: sobreviven sin pérdida al round-trip float32 de la caché
+    return [float(len(text)), float(sum(map(ord, text)) % 1000)]
+
+class FakeBackend:
+    """Backend de embeddings que registra cada request; `fail` son excepciones a levantar primero."""
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = list(fail)
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, model, task_type):
+        with self._lock:
+            self.calls.append(list(texts))
+            if self.fail:
+                raise self.fail.pop(0)
+        return [_vec(t) for t in texts]
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedder, "DB_PATH", str(tmp_path / "embeddings.sqlite"))
+    monkeypatch.setattr(settings, "EMBED_BACKOFF_BASE", 0.0)
+    fake = FakeBackend()
+    embedder.set_embed_backend(fake)
+    yield fake
+    embedder.set_embed_backend(None)
+
+def test_misses_are_batched(backend):
+    texts = [f"texto {i}" for i in range(250)]
+    out = embedder.embed_texts(texts, model="m", batch_size=100, concurrency=3)
+    assert sorted(len(c) for c in backend.calls) == [50, 100, 100]
+    assert sorted(t for c in backend.calls for t in c) == sorted(texts)
+    assert out == [_vec(t) for t in texts]
+
+def test_duplicates_are_embedded_once(backend):
+    texts = ["medicina", "abogacía", "medicina", "medicina", "abogacía"]
+    out = embedder.embed_texts(texts, model="m", batch_size=10)
+    assert backend.calls == [["medicina", "abogacía"]]
+    assert out == [_vec(t) for t in texts]
+
+def test_cached_texts_are_not_embedded_again(backend):
+    embedder.embed_texts(["a", "b"], model="m")
+    backend.calls.clear()
+    out = embedder.embed_texts(["b", "c", "a"], model="m")
+    assert backend.calls == [["c"]]
+    assert out == [_vec("b"), _vec("c"), _vec("a")]
+
+def test_transient_error_is_retried_once(backend):
+    backend.fail = [TimeoutError("deadline")]
+    out = embedder.embed_texts(["x", "y"], model="m")
+    assert backend.calls == [["x", "y"], ["x", "y"]]
+    assert out == [_vec("x"), _vec("y")]
+
+def test_non_retryable_error_is_raised(backend):
+    backend.fail = [ValueError("bad request")]
+    with pytest.raises(ValueError):
+        embedder.embed_texts(["x"], model="m")
+    assert len(backend.calls) == 1
+
+def test_gives_up_after_max_retries(backend, monkeypatch):
+    monkeypatch.setattr(settings, "EMBED_MAX_RETRIES", 2)
+    backend.fail = [ConnectionError("reset")] * 3
+    with pytest.raises(ConnectionError):
+        embedder.embed_texts(["x"], model="m")
+    assert len(backend.calls) == 3  # intento original + 2 reintentos
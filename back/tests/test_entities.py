@@ -0,0 +1,24 @@
+import json
+from app.catalog.entities import _CatalogIndex
+
+def _index(names):
+    return _CatalogIndex([{"carrera_id": str(i), "nombre": n, "carrera_slug": n, "facultad": None,
+                           "nivel": None, "aliases": json.dumps([n])} for i, n in enumerate(names)])
+
+def _catalog():
+    # catálogo por encima de PREFILTER_MIN, con mucho vocabulario compartido ("en", "de", ...)
+    pref = ["licenciatura en", "ingeniería en", "profesorado de", "maestría en"]
+    return [f"{p} {a} {b}" for p in pref for a in range(25) for b in range(25)] + ["medicina", "odontología"]
+
+def test_prefilter_keeps_matches_and_drops_unrelated():
+    idx = _index(_catalog())
+    assert idx.min_hits is not None
+    q = "cuánto sale medicna en 2026?"
+    sel = idx._candidates(q)
+    assert idx.choices.index("medicina") in sel
+    assert len(sel) < len(idx.choices) // 10
+
+    top = idx.search(q, 1)[0]
+    idx.min_hits = None  # sin prefiltro: cdist contra todo el catálogo
+    assert idx.search(q, 1)[0] == top
+    assert top["nombre"] == "medicina"
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from app.catalog import fees
+from app.rag.chunking import _sheet_records, load_schema_config
+
+CFG = load_schema_config("/nonexistent")
+
+@pytest.fixture
+def bot():
+    fees.reset("test-fees")
+    yield "test-fees"
+    fees.reset("test-fees")
+
+def _ingest(bot_id, rows, fname="aranceles_2026.xlsx"):
+    df = pd.DataFrame(rows, columns=["Carrera", "Identificador Carrera", "Año", "Matrícula General",
+                                     "Arancel Mensual", "Cant Cuotas Plan Pagos"])
+    records = _sheet_records(fname, f"/data/{fname}", "Hoja1", df, bot_id=bot_id,
+                             aliases=CFG["aliases"], defaults=CFG["defaults"])
+    fees.upsert_from_records(records, bot_id)
+
+def test_lookup_keeps_thousands(bot):
+    _ingest(bot, [["Medicina", "10", "2026", "$ 360.000", "$ 420.000", "10"],
+                  ["Abogacía", "20", "2026", "$ 1.234.567,50", "$ 98.500,25", ""]])
+    [med] = fees.lookup(bot, carrera_id="10", carrera=None, periodo=None)
+    assert med["numbers"]["matricula_general"] == 360000.0
+    assert med["numbers"]["arancel_mensual"] == 420000.0
+    assert med["numbers"]["arancel_total_estimado"] == 4200000.0
+    [abo] = fees.lookup(bot, carrera_id=None, carrera="abogacia", periodo="2026")
+    assert abo["numbers"]["matricula_general"] == 1234567.5
+
+def test_format_answer_amounts(bot):
+    _ingest(bot, [["Medicina", "10", "2026", "$ 1.234.567,50", "$ 420.000", "10"]])
+    answer = fees.format_answer(fees.lookup(bot, carrera_id="10", carrera=None, periodo=None))
+    assert answer.splitlines() == [
+        "Aranceles de Medicina (período 2026):",
+        "- Matrícula: $ 1.234.567,50 [1]",
+        "- Cuota mensual: $ 420.000 [1]",
+        "- Arancel total estimado: $ 4.200.000 [1]",
+        "- Plan de pagos: 10 cuotas [1]",
+    ]
+
+def test_lookup_prefers_latest_year(bot):
+    _ingest(bot, [["Medicina", "10", "general", "$ 100.000", "", ""],
+                  ["Medicina", "10", "2026", "$ 360.000", "", ""],
+                  ["Medicina", "10", "2025", "$ 300.000", "", ""]])
+    [row] = fees.lookup(bot, carrera_id="10", carrera=None, periodo=None)
+    assert row["periodo"] == "2026"
+
+@pytest.mark.parametrize("text", [
+    "¿Cuánto sale Medicina?",
+    "¿Cuánto cuesta la carrera?",
+    "¿Cuál es el precio de Abogacía?",
+    "¿Qué valor tiene la matrícula?",
+    "¿Cuánto es la matrícula de ingreso?",
+    "¿De cuánto es la cuota mensual?",
+    "Arancel 2026 de Psicología",
+    "¿Cuál es el costo de la inscripción?",
+    "¿Cuánto hay que pagar para inscribirse?",
+])
+def test_fee_questions(text):
+    assert fees.is_fee_question(text)
+
+@pytest.mark.parametrize("text", [
+    "¿Cuándo cierran las inscripciones de Medicina?",
+    "¿Cómo es el proceso de inscripción a Abogacía?",
+    "¿Qué requisitos de inscripción pide Psicología?",
+    "¿Cómo me matriculo?",
+    "¿Cuánto dura Medicina?",
+    "¿Qué formas de pago aceptan?",
+    "¿El cursado es mensual o cuatrimestral?",
+    "¿Cuál es el plan de estudios de Arquitectura?",
+    "Aprecio la respuesta",
+])
+def test_not_fee_questions(text):
+    assert not fees.is_fee_question(text)
@@ -0,0 +1,87 @@
+import json, threading
+import pandas as pd
+import pytest
+from qdrant_client import QdrantClient
+from app.config import settings
+from app.catalog import fees
+from app.rag import embedder, lexical, manifest
+from app.rag.incremental import ingest_incremental
+from app.rag.ingest import ingest_full
+from app.rag.retriever import IngestCancelled
+
+BOT = "test-ingest"
+COLUMNS = ["Carrera", "Identificador Carrera", "Año", "Matrícula General", "Arancel Mensual"]
+
+def _embed(texts, model, task_type):
+    return [[float(len(t)), 1.0] for t in texts]
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedder, "DB_PATH", str(tmp_path / "embeddings.sqlite"))
+    monkeypatch.setattr(settings, "EMBED_DIM", 2)
+    monkeypatch.setattr(settings, "INGEST_WORKERS", 1)
+    embedder.set_embed_backend(_embed)
+    for reset in (fees.reset, lexical.reset, manifest.reset):
+        reset(BOT)
+    data = tmp_path / "data"
+    data.mkdir()
+    yield QdrantClient(":memory:"), data
+    embedder.set_embed_backend(None)
+    for reset in (fees.reset, lexical.reset, manifest.reset):
+        reset(BOT)
+
+def _write(data, rows, fname="aranceles.csv"):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(data / fname, sep=";", index=False)
+
+def _carreras():
+    return [cid for cid in ("10", "20") if fees.lookup(BOT, carrera_id=cid, carrera=None, periodo="2026")]
+
+def _lexical():
+    return len(lexical.chunk_ids(BOT))
+
+def test_full_ingest_prunes_dropped_rows(env):
+    client, data = env
+    _write(data, [["Medicina", "10", "2026", "$ 360.000", "$ 420.000"],
+                  ["Abogacía", "20", "2026", "$ 300.000", "$ 350.000"]])
+    ingest_full(client, str(data), BOT, "test_ingest")
+    assert _carreras() == ["10", "20"]
+    assert _lexical() == 2
+
+    _write(data, [["Medicina", "10", "2026", "$ 360.000", "$ 420.000"]])
+    ingest_full(client, str(data), BOT, "test_ingest")
+    assert _carreras() == ["10"]
+    assert lexical.chunk_ids(BOT) == set(manifest.get_rows(BOT, "aranceles.csv"))
+
+def test_cancelled_full_ingest_keeps_rows(env):
+    client, data = env
+    _write(data, [["Medicina", "10", "2026", "$ 360.000", "$ 420.000"],
+                  ["Abogacía", "20", "2026", "$ 300.000", "$ 350.000"]])
+    ingest_full(client, str(data), BOT, "test_ingest")
+    rows = manifest.get_rows(BOT, "aranceles.csv")
+
+    _write(data, [["Medicina", "10", "2026", "$ 360.000", "$ 420.000"]])
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(IngestCancelled):
+        ingest_full(client, str(data), BOT, "test_ingest", cancel=cancel)
+    assert _carreras() == ["10", "20"]
+    assert _lexical() == 2
+    assert manifest.get_rows(BOT, "aranceles.csv") == rows
+
+def test_incremental_reupserts_rows_when_schema_map_changes(env):
+    client, data = env
+    pd.DataFrame([["Medicina", "10", "2026", "Ciencias Médicas"]],
+                 columns=["Carrera", "Identificador Carrera", "Año", "Dependencia"]
+                 ).to_csv(data / "carreras.csv", sep=";", index=False)
+    ingest_full(client, str(data), BOT, "test_ingest")
+
+    def facultades():
+        points, _ = client.scroll("test_ingest", with_payload=True)
+        return [p.payload.get("facultad") for p in points]
+    assert facultades() != ["Ciencias Médicas"]
+
+    (data / "_schema_map.json").write_text(json.dumps({"aliases": {"facultad": ["Dependencia"]}}), encoding="utf-8")
+    stats = ingest_incremental(client, str(data), BOT, "test_ingest")
+    assert stats["files_changed"] == ["carreras.csv"]
+    assert stats["rows_upserted"] == 1
+    assert facultades() == ["Ciencias Médicas"]
@@ -0,0 +1,77 @@
+import asyncio, time
+import fakeredis
+import pytest
+from app.config import settings
+from app.session import redis_store, sqlite_store, store
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_store, "_client", None)
+    redis_store.init(client=client)
+    yield client
+    redis_store.close()
+
+@pytest.fixture
+def facade(monkeypatch):
+    # el facade cachea el backend elegido: cada test arranca sin elegir
+    monkeypatch.setattr(store, "_backend", None)
+    return store
+
+def test_redis_save_and_load(redis_client):
+    redis_store.save("s1", "bot-a", {"carrera": "Medicina"}, [{"role": "user", "content": str(i)} for i in range(12)])
+    ctx, history = redis_store.load("s1", "bot-a")
+    assert ctx == {"carrera": "Medicina"}
+    assert [h["content"] for h in history] == [str(i) for i in range(4, 12)]  # últimas 8
+    assert redis_store.load("s1", "bot-b") == ({}, [])  # la clave incluye el bot
+    assert redis_store.load("otra", "bot-a") == ({}, [])
+
+def test_redis_save_sets_ttl(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_TTL_SECONDS", 600)
+    redis_store.save("s1", "bot-a", {}, [])
+    assert 590 < redis_client.ttl(redis_store._key("s1", "bot-a")) <= 600
+
+def test_redis_load_renews_ttl(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_TTL_SECONDS", 600)
+    key = redis_store._key("s1", "bot-a")
+    redis_store.save("s1", "bot-a", {"x": 1}, [])
+    redis_client.expire(key, 5)
+    assert redis_store.load("s1", "bot-a")[0] == {"x": 1}
+    assert redis_client.ttl(key) > 590
+
+def test_redis_session_expires(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_TTL_SECONDS", 600)
+    redis_store.save("s1", "bot-a", {"x": 1}, [])
+    redis_client.pexpire(redis_store._key("s1", "bot-a"), 1)
+    time.sleep(0.01)
+    assert redis_store.load("s1", "bot-a") == ({}, [])
+
+def test_redis_ttl_zero_never_expires(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_TTL_SECONDS", 0)
+    redis_store.save("s1", "bot-a", {"x": 1}, [])
+    redis_store.load("s1", "bot-a")
+    assert redis_client.ttl(redis_store._key("s1", "bot-a")) == -1
+
+@pytest.mark.parametrize("name, module", [("redis", redis_store), ("sqlite", sqlite_store)])
+def test_backend_from_settings(facade, monkeypatch, name, module):
+    monkeypatch.setattr(settings, "SESSION_BACKEND", name)
+    assert facade._get_backend() is module
+
+def test_unknown_backend(facade, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_BACKEND", "memcached")
+    with pytest.raises(ValueError):
+        facade._get_backend()
+
+def test_facade_delegates_to_redis(facade, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_BACKEND", "redis")
+    facade.save("s1", "bot-a", {"periodo": "2026"}, [{"role": "user", "content": "hola"}])
+    assert redis_client.exists(redis_store._key("s1", "bot-a"))
+    assert facade.load("s1", "bot-a") == ({"periodo": "2026"}, [{"role": "user", "content": "hola"}])
+
+async def _roundtrip(facade):
+    await facade.save_async("s2", "bot-a", {"a": 1}, [])
+    return await facade.load_async("s2", "bot-a")
+
+def test_facade_async_with_injected_backend(facade, redis_client):
+    facade.set_backend(redis_store)
+    assert asyncio.run(_roundtrip(facade)) == ({"a": 1}, [])
@@ -2,7 +2,7 @@
 import { useState } from "react";
 import ChatList from "./components/chat/ChatList";
 import ChatInput from "./components/chat/ChatInput";
-import { chat as chatApi } from "./lib/api";
+import { chatStream } from "./lib/api";
 
 export default function Chat() {
   const [messages, setMessages] = useState([]);
@@ -16,17 +16,33 @@ export default function Chat() {
     setMessages((prev) => [...prev, userMsg]);
     setPending(true);
 
+    // El mensaje del asistente se crea con el primer token y se va completando
+    // a medida que llegan los tokens.
+    const asstId = genId();
+    const upsertAsst = (patch) =>
+      setMessages((prev) => {
+        const exists = prev.some((m) => m.id === asstId);
+        if (!exists) return [...prev, { id: asstId, role: "assistant", text: "", sources: [], ...patch(null) }];
+        return prev.map((m) => (m.id === asstId ? { ...m, ...patch(m) } : m));
+      });
+
     try {
       // Si querés pasar filtros: { periodo: "2025", facultad: "Ciencias sociales" }
-      const data = await chatApi(text /* , { periodo, facultad, carrera, modalidad } */);
+      let sources = [];
+      const data = await chatStream(text, null /* { periodo, facultad, carrera, modalidad } */, {
+        onSources: (s) => {
+          sources = s;
+        },
+        onToken: (t) => {
+          setPending(false);
+          upsertAsst((m) => ({ text: (m?.text || "") + t, sources }));
+        },
+      });
 
-      const asstMsg = {
-        id: genId(),
-        role: "assistant",
+      upsertAsst(() => ({
         text: data?.answer || "No pude generar una respuesta.",
         sources: Array.isArray(data?.sources) ? data.sources : [],
-      };
-      setMessages((prev) => [...prev, asstMsg]);
+      }));
     } catch (e) {
       const errMsg = {
         id: genId(),
@@ -35,7 +51,7 @@ export default function Chat() {
           "Hubo un problema al conectar con el backend. Revisá que el API esté en http://localhost:8000 y probá de nuevo.",
         sources: [],
       };
-      setMessages((prev) => [...prev, errMsg]);
+      setMessages((prev) => [...prev.filter((m) => m.id !== asstId), errMsg]);
       // opcional: console.error(e)
     } finally {
       setPending(false);
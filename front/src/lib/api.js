@@ -21,3 +21,68 @@ export async function chat(message, meta = null, { timeoutMs = 30000 } = {}) {
     clearTimeout(to);
   }
 }
+
+// Igual que chat() pero por SSE: onSources(sources) llega apenas termina el
+// retrieve, onToken(text) por cada fragmento de la respuesta. Resuelve con
+// { answer, sources } cuando el backend emite "done".
+export async function chatStream(
+  message,
+  meta = null,
+  { onSources, onToken, timeoutMs = 60000 } = {}
+) {
+  const ctrl = new AbortController();
+  const to = setTimeout(() => ctrl.abort(), timeoutMs);
+
+  try {
+    const res = await fetch(`${API_URL}/chat/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+      body: JSON.stringify({ message, meta }),
+      signal: ctrl.signal,
+    });
+
+    if (!res.ok || !res.body) {
+      const text = await res.text().catch(() => "");
+      throw new Error(`HTTP ${res.status}: ${text || res.statusText}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let sources = [];
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const raw = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+
+        let event = "message";
+        let data = "";
+        for (const line of raw.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        }
+        const payload = data ? JSON.parse(data) : null;
+
+        if (event === "sources") {
+          sources = Array.isArray(payload) ? payload : [];
+          onSources?.(sources);
+        } else if (event === "token") {
+          onToken?.(payload?.text || "");
+        } else if (event === "done") {
+          return { ...payload, sources };
+        } else if (event === "error") {
+          throw new Error(payload?.detail || "Error en el stream");
+        }
+      }
+    }
+    throw new Error("El stream terminó sin respuesta completa");
+  } finally {
+    clearTimeout(to);
+  }
+}